@@ -0,0 +1,48 @@
+"""Background jobs table
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    
+    # Check if the table exists before creating it (idempotent migration)
+    inspector = sa.inspect(connection)
+    existing_tables = inspector.get_table_names()
+    
+    # Create jobs table
+    if 'jobs' not in existing_tables:
+        op.create_table('jobs',
+            sa.Column('job_id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('job_type', sa.String(30), nullable=False),
+            sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+            sa.Column('status', sa.String(20), nullable=False, server_default='queued'),
+            sa.Column('checkpoint', sa.Integer(), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('locked_at', sa.TIMESTAMP(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('job_id')
+        )
+        op.create_index('ix_jobs_status_created_at', 'jobs', ['status', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_status_created_at', table_name='jobs')
+    op.drop_table('jobs')
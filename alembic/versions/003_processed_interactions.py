@@ -0,0 +1,41 @@
+"""Processed interactions table
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    
+    # Check if the table exists before creating it (idempotent migration)
+    inspector = sa.inspect(connection)
+    existing_tables = inspector.get_table_names()
+    
+    # Create processed_interactions table
+    if 'processed_interactions' not in existing_tables:
+        op.create_table('processed_interactions',
+            sa.Column('interaction_id', sa.BigInteger(), nullable=False),
+            sa.Column('command', sa.String(30), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('interaction_id')
+        )
+        op.create_index('ix_processed_interactions_created_at', 'processed_interactions', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_processed_interactions_created_at', table_name='processed_interactions')
+    op.drop_table('processed_interactions')
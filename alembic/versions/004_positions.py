@@ -0,0 +1,65 @@
+"""Positions table
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '004'
+down_revision: Union[str, None] = '003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    
+    # Check if the table exists before creating it (idempotent migration)
+    inspector = sa.inspect(connection)
+    existing_tables = inspector.get_table_names()
+    
+    op.execute("CREATE SEQUENCE IF NOT EXISTS position_bet_seq")
+    
+    # Create positions table
+    if 'positions' not in existing_tables:
+        op.create_table('positions',
+            sa.Column('position_id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('wager_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('option_index', sa.Integer(), nullable=False),
+            sa.Column('amount', sa.Integer(), nullable=False),
+            sa.Column('bet_count', sa.Integer(), nullable=False, server_default='1'),
+            sa.Column('last_bet_seq', sa.BigInteger(), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+            sa.ForeignKeyConstraint(['wager_id'], ['wagers.wager_id'], ),
+            sa.PrimaryKeyConstraint('position_id'),
+            sa.UniqueConstraint('wager_id', 'user_id', 'option_index', name='uq_positions_wager_user_option'),
+            sa.CheckConstraint('amount > 0', name='check_position_positive_amount'),
+            sa.CheckConstraint('option_index >= 0', name='check_position_valid_option_index')
+        )
+        op.create_index('ix_positions_user_id', 'positions', ['user_id'])
+    
+    # Fold existing bets into positions, oldest first so position IDs follow bet order
+    op.execute("""
+        INSERT INTO positions (wager_id, user_id, option_index, amount, bet_count, last_bet_seq, created_at, updated_at)
+        SELECT wager_id, user_id, option_index, SUM(amount), COUNT(*), nextval('position_bet_seq'),
+               MIN(created_at), MAX(created_at)
+        FROM bets
+        GROUP BY wager_id, user_id, option_index
+        ORDER BY MIN(bet_id)
+        ON CONFLICT (wager_id, user_id, option_index) DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_positions_user_id', table_name='positions')
+    op.drop_table('positions')
+    op.execute("DROP SEQUENCE IF EXISTS position_bet_seq")
@@ -0,0 +1,89 @@
+"""Wager summaries and archive tables
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '005'
+down_revision: Union[str, None] = '004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    
+    # Check if tables exist before creating them (idempotent migration)
+    inspector = sa.inspect(connection)
+    existing_tables = inspector.get_table_names()
+    
+    # Create wager_summaries table
+    if 'wager_summaries' not in existing_tables:
+        op.create_table('wager_summaries',
+            sa.Column('wager_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('creator_id', sa.BigInteger(), nullable=False),
+            sa.Column('title', sa.Text(), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('options', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+            sa.Column('status', sa.String(20), nullable=False),
+            sa.Column('winning_option', sa.Integer(), nullable=True),
+            sa.Column('total_pool', sa.BigInteger(), nullable=False),
+            sa.Column('option_totals', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+            sa.Column('option_counts', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+            sa.Column('winners', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+            sa.Column('resolved_at', sa.TIMESTAMP(), nullable=True),
+            sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('wager_id')
+        )
+    
+    # Create archived_positions table
+    if 'archived_positions' not in existing_tables:
+        op.create_table('archived_positions',
+            sa.Column('position_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('wager_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('option_index', sa.Integer(), nullable=False),
+            sa.Column('amount', sa.Integer(), nullable=False),
+            sa.Column('bet_count', sa.Integer(), nullable=False),
+            sa.Column('last_bet_seq', sa.BigInteger(), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+            sa.Column('updated_at', sa.TIMESTAMP(), nullable=False),
+            sa.PrimaryKeyConstraint('position_id')
+        )
+        op.create_index('ix_archived_positions_wager_id', 'archived_positions', ['wager_id'])
+    
+    # Create archived_bets table
+    if 'archived_bets' not in existing_tables:
+        op.create_table('archived_bets',
+            sa.Column('bet_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('wager_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('option_index', sa.Integer(), nullable=False),
+            sa.Column('amount', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+            sa.PrimaryKeyConstraint('bet_id')
+        )
+        op.create_index('ix_archived_bets_wager_id', 'archived_bets', ['wager_id'])
+    
+    # Speeds up finding wagers old enough to archive
+    existing_indexes = {index['name'] for index in inspector.get_indexes('wagers')}
+    if 'ix_wagers_status_resolved_at' not in existing_indexes:
+        op.create_index('ix_wagers_status_resolved_at', 'wagers', ['status', 'resolved_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_wagers_status_resolved_at', table_name='wagers')
+    op.drop_index('ix_archived_bets_wager_id', table_name='archived_bets')
+    op.drop_table('archived_bets')
+    op.drop_index('ix_archived_positions_wager_id', table_name='archived_positions')
+    op.drop_table('archived_positions')
+    op.drop_table('wager_summaries')
@@ -0,0 +1,70 @@
+"""Statistics rollup tables
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rollup_columns():
+    return [
+        sa.Column('bets_placed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_wagered', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('wins', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_won', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('biggest_win', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('total_refunded', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('daily_rewards', sa.BigInteger(), nullable=False, server_default='0'),
+    ]
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    
+    # Check if tables exist before creating them (idempotent migration)
+    inspector = sa.inspect(connection)
+    existing_tables = inspector.get_table_names()
+    
+    # Create user_stats table
+    if 'user_stats' not in existing_tables:
+        op.create_table('user_stats',
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            *_rollup_columns(),
+            sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('user_id')
+        )
+    
+    # Create daily_user_stats table
+    if 'daily_user_stats' not in existing_tables:
+        op.create_table('daily_user_stats',
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            *_rollup_columns(),
+            sa.PrimaryKeyConstraint('user_id', 'day')
+        )
+    
+    # Create stats_watermarks table
+    if 'stats_watermarks' not in existing_tables:
+        op.create_table('stats_watermarks',
+            sa.Column('name', sa.String(30), nullable=False),
+            sa.Column('last_transaction_id', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('stats_watermarks')
+    op.drop_table('daily_user_stats')
+    op.drop_table('user_stats')
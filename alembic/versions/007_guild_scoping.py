@@ -0,0 +1,230 @@
+"""Scope wagers, bets, positions, balances and transactions to guilds
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 00:00:00.000000
+
+Adds ``guild_id`` to every per-guild table and makes it lead the users key
+and the hot indexes. The migration is written to run against a live
+database without long locks:
+
+- columns are added nullable (a catalog-only change),
+- existing rows are back-filled in short keyset batches, each committed on
+  its own,
+- NOT NULL is set through a validated CHECK constraint, so it doesn't scan
+  under an exclusive lock,
+- indexes are built CONCURRENTLY, the users key is swapped onto the
+  prebuilt unique index, and foreign keys are added NOT VALID and then
+  validated.
+
+Rows that exist before this migration belong to the bot's original server.
+Set LEGACY_GUILD_ID to that server's ID; when it is unset and exactly one
+guild has settings stored, that guild is used.
+"""
+import logging
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Rows back-filled per transaction
+BATCH_SIZE = 10000
+
+# Tables that get a guild_id, with the leading key column used to walk them in batches
+GUILD_TABLES = {
+    'users': 'user_id',
+    'wagers': 'wager_id',
+    'bets': 'bet_id',
+    'positions': 'position_id',
+    'transactions': 'transaction_id',
+    'wager_summaries': 'wager_id',
+    'archived_positions': 'position_id',
+    'archived_bets': 'bet_id',
+    'user_stats': 'user_id',
+    'daily_user_stats': 'user_id',
+}
+
+# (index name, table, columns, unique)
+GUILD_INDEXES = [
+    ('users_guild_user_key', 'users', ['guild_id', 'user_id'], True),
+    ('ix_wagers_guild_status_created_at', 'wagers', ['guild_id', 'status', 'created_at'], False),
+    ('ix_bets_guild_user', 'bets', ['guild_id', 'user_id'], False),
+    ('ix_positions_guild_user', 'positions', ['guild_id', 'user_id'], False),
+    ('ix_transactions_guild_user_created_at', 'transactions', ['guild_id', 'user_id', 'created_at'], False),
+    ('user_stats_guild_user_key', 'user_stats', ['guild_id', 'user_id'], True),
+    ('daily_user_stats_guild_user_day_key', 'daily_user_stats', ['guild_id', 'user_id', 'day'], True),
+]
+
+# Primary keys moved onto a prebuilt unique index: table -> (index name, columns)
+GUILD_PRIMARY_KEYS = {
+    'users': ('users_guild_user_key', ['guild_id', 'user_id']),
+    'user_stats': ('user_stats_guild_user_key', ['guild_id', 'user_id']),
+    'daily_user_stats': ('daily_user_stats_guild_user_day_key', ['guild_id', 'user_id', 'day']),
+}
+
+# (constraint name, table, user column) for foreign keys onto users (guild_id, user_id)
+GUILD_USER_FKS = [
+    ('fk_wagers_guild_creator', 'wagers', 'creator_id'),
+    ('fk_bets_guild_user', 'bets', 'user_id'),
+    ('fk_positions_guild_user', 'positions', 'user_id'),
+    ('fk_transactions_guild_user', 'transactions', 'user_id'),
+]
+
+
+def _legacy_guild_id(connection):
+    """Work out which guild pre-existing rows belong to, or None if there are none."""
+    has_rows = connection.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM users WHERE guild_id IS NULL) "
+        "OR EXISTS (SELECT 1 FROM wagers WHERE guild_id IS NULL)"
+    )).scalar()
+    if not has_rows:
+        return None
+
+    if os.getenv('LEGACY_GUILD_ID'):
+        return int(os.getenv('LEGACY_GUILD_ID'))
+
+    guild_ids = connection.execute(sa.text("SELECT guild_id FROM guild_settings")).scalars().all()
+    if len(guild_ids) == 1:
+        return guild_ids[0]
+    raise RuntimeError(
+        "Existing balances and wagers need a guild. Set LEGACY_GUILD_ID to the ID of the "
+        "server the bot was used in before guild scoping and run the migration again."
+    )
+
+
+def _backfill(connection, table, key, guild_id):
+    """Set guild_id on a table's existing rows, one committed key range at a time."""
+    next_range = sa.text(
+        f"SELECT max({key}) FROM (SELECT {key} FROM {table} WHERE {key} > :after ORDER BY {key} LIMIT :batch) AS batch"
+    )
+    fill_range = sa.text(
+        f"UPDATE {table} SET guild_id = :guild_id WHERE {key} > :after AND {key} <= :upper AND guild_id IS NULL"
+    )
+    after = connection.execute(sa.text(f"SELECT min({key}) FROM {table}")).scalar()
+    if after is None:
+        return
+    # Start just below the smallest key; keys are integers
+    after -= 1
+    filled = 0
+    while True:
+        upper = connection.execute(next_range, {"after": after, "batch": BATCH_SIZE}).scalar()
+        if upper is None:
+            break
+        result = connection.execute(fill_range, {"guild_id": guild_id, "after": after, "upper": upper})
+        filled += result.rowcount
+        after = upper
+
+    # Catch rows written behind the cursor while the batches ran
+    result = connection.execute(
+        sa.text(f"UPDATE {table} SET guild_id = :guild_id WHERE guild_id IS NULL"),
+        {"guild_id": guild_id}
+    )
+    filled += result.rowcount
+    if filled:
+        logger.info(f"Assigned {filled} {table} row(s) to guild {guild_id}")
+
+
+def _set_not_null(table):
+    """SET NOT NULL on guild_id using a pre-validated CHECK, so the ALTER doesn't scan."""
+    constraint = f"{table}_guild_id_not_null"
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} CHECK (guild_id IS NOT NULL) NOT VALID")
+    op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN guild_id SET NOT NULL")
+    op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+
+    # Check what exists before changing it (idempotent migration)
+    inspector = sa.inspect(connection)
+    existing_tables = inspector.get_table_names()
+    tables = [table for table in GUILD_TABLES if table in existing_tables]
+
+    # Nullable columns are a catalog-only change
+    for table in tables:
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if 'guild_id' not in columns:
+            op.add_column(table, sa.Column('guild_id', sa.BigInteger(), nullable=True))
+
+    guild_id = _legacy_guild_id(connection)
+    # Tables whose key was already swapped on an earlier run don't need the index to swap onto
+    swapped = {
+        table for table, (_, columns) in GUILD_PRIMARY_KEYS.items()
+        if table in existing_tables and inspector.get_pk_constraint(table)['constrained_columns'] == columns
+    }
+
+    with op.get_context().autocommit_block():
+        for table in tables:
+            if guild_id is not None:
+                _backfill(connection, table, GUILD_TABLES[table], guild_id)
+            nullable = {column['name']: column['nullable'] for column in sa.inspect(connection).get_columns(table)}
+            if nullable['guild_id']:
+                _set_not_null(table)
+
+        for name, table, columns, unique in GUILD_INDEXES:
+            if table in existing_tables and table not in swapped:
+                op.execute(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                    f"ON {table} ({', '.join(columns)})"
+                )
+
+    # Swap the keys in one short transaction: no scans, only catalog changes
+    inspector = sa.inspect(connection)
+    for _, table, _ in GUILD_USER_FKS:
+        for foreign_key in inspector.get_foreign_keys(table):
+            if foreign_key['referred_table'] == 'users' and foreign_key['referred_columns'] == ['user_id']:
+                op.drop_constraint(foreign_key['name'], table, type_='foreignkey')
+
+    for table, (index_name, columns) in GUILD_PRIMARY_KEYS.items():
+        primary_key = inspector.get_pk_constraint(table)
+        if primary_key['constrained_columns'] != columns:
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {primary_key['name']}")
+            op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY USING INDEX {index_name}")
+
+    added_fks = []
+    for name, table, user_column in GUILD_USER_FKS:
+        if name not in {foreign_key['name'] for foreign_key in inspector.get_foreign_keys(table)}:
+            op.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY (guild_id, {user_column}) "
+                f"REFERENCES users (guild_id, user_id) NOT VALID"
+            )
+            added_fks.append((name, table))
+
+    # Superseded by ix_positions_guild_user
+    if 'ix_positions_user_id' in {index['name'] for index in inspector.get_indexes('positions')}:
+        op.drop_index('ix_positions_user_id', table_name='positions')
+
+    # Validation scans but only takes a lock that lets reads and writes continue
+    with op.get_context().autocommit_block():
+        for name, table in added_fks:
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def downgrade() -> None:
+    # Fails if any user has a balance in more than one guild
+    for name, table, _ in GUILD_USER_FKS:
+        op.drop_constraint(name, table, type_='foreignkey')
+
+    op.create_index('ix_positions_user_id', 'positions', ['user_id'])
+    for table, (_, columns) in GUILD_PRIMARY_KEYS.items():
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {table}_pkey")
+        op.create_primary_key(f"{table}_pkey", table, [column for column in columns if column != 'guild_id'])
+
+    for _, table, user_column in GUILD_USER_FKS:
+        op.create_foreign_key(None, table, 'users', [user_column], ['user_id'])
+
+    for name, table, _, _ in GUILD_INDEXES:
+        if table not in GUILD_PRIMARY_KEYS:
+            op.drop_index(name, table_name=table)
+    for table in GUILD_TABLES:
+        op.drop_column(table, 'guild_id')
@@ -0,0 +1,51 @@
+"""Balance ledger for write-behind balances
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    
+    # Check if the table exists before creating it (idempotent migration)
+    inspector = sa.inspect(connection)
+    existing_tables = inspector.get_table_names()
+    
+    # Create balance_ledger table
+    if 'balance_ledger' not in existing_tables:
+        op.create_table('balance_ledger',
+            sa.Column('entry_id', sa.BigInteger(), autoincrement=True, nullable=False),
+            sa.Column('guild_id', sa.BigInteger(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('amount', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+            sa.ForeignKeyConstraint(
+                ['guild_id', 'user_id'], ['users.guild_id', 'users.user_id'], name='fk_balance_ledger_guild_user'
+            ),
+            sa.PrimaryKeyConstraint('entry_id')
+        )
+        op.create_index('ix_balance_ledger_guild_user', 'balance_ledger', ['guild_id', 'user_id'])
+
+
+def downgrade() -> None:
+    # Fold anything still pending back into the balances before dropping the ledger
+    op.execute(
+        "UPDATE users SET bits_balance = users.bits_balance + pending.amount "
+        "FROM (SELECT guild_id, user_id, sum(amount) AS amount FROM balance_ledger GROUP BY guild_id, user_id) AS pending "
+        "WHERE users.guild_id = pending.guild_id AND users.user_id = pending.user_id"
+    )
+    op.drop_index('ix_balance_ledger_guild_user', table_name='balance_ledger')
+    op.drop_table('balance_ledger')
@@ -0,0 +1,114 @@
+"""Typed wager options with running totals
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 00:00:00.000000
+
+Adds ``wager_options``: one row per element of ``wagers.options``, carrying
+the staked total, position count and latest bet sequence of the positions on
+that option. The bot keeps the totals current on every bet, so rendering a
+wager or loading its odds reads a few rows by primary key instead of
+aggregating every position.
+
+Existing wagers are back-filled in short keyset batches over ``wager_id``,
+each committed on its own, so the migration can run against a live
+database. Stop the bot before upgrading: bets placed by the old version
+while the back-fill runs would not reach the new totals. The totals of open
+wagers are recomputed once more at the end to catch any that did.
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '009'
+down_revision: Union[str, None] = '008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Wagers back-filled per transaction
+BATCH_SIZE = 1000
+
+# Option rows for wagers in (after, upper], with their totals summed from positions
+BACKFILL = sa.text(
+    "INSERT INTO wager_options (wager_id, idx, label, total_staked, position_count, last_bet_seq) "
+    "SELECT w.wager_id, o.ordinality - 1, o.label, "
+    "       coalesce(p.total, 0), coalesce(p.count, 0), coalesce(p.last_bet_seq, 0) "
+    "FROM wagers AS w "
+    "CROSS JOIN LATERAL jsonb_array_elements_text(w.options) WITH ORDINALITY AS o(label, ordinality) "
+    "LEFT JOIN ("
+    "    SELECT wager_id, option_index, sum(amount) AS total, count(*) AS count, max(last_bet_seq) AS last_bet_seq "
+    "    FROM positions WHERE wager_id > :after AND wager_id <= :upper "
+    "    GROUP BY wager_id, option_index"
+    ") AS p ON p.wager_id = w.wager_id AND p.option_index = o.ordinality - 1 "
+    "WHERE w.wager_id > :after AND w.wager_id <= :upper "
+    "ON CONFLICT (wager_id, idx) DO NOTHING"
+)
+
+NEXT_RANGE = sa.text(
+    "SELECT max(wager_id) FROM (SELECT wager_id FROM wagers WHERE wager_id > :after "
+    "ORDER BY wager_id LIMIT :batch) AS batch"
+)
+
+# Recompute the totals of open wagers from their positions
+RESYNC_OPEN = sa.text(
+    "UPDATE wager_options AS wo "
+    "SET (total_staked, position_count, last_bet_seq) = ("
+    "    SELECT coalesce(sum(amount), 0), count(*), coalesce(max(last_bet_seq), 0) "
+    "    FROM positions WHERE positions.wager_id = wo.wager_id AND positions.option_index = wo.idx"
+    ") "
+    "FROM wagers AS w "
+    "WHERE w.wager_id = wo.wager_id AND w.status = 'open'"
+)
+
+
+def _backfill(connection):
+    """Create the option rows of existing wagers, one committed wager_id range at a time."""
+    after = connection.execute(sa.text("SELECT min(wager_id) FROM wagers")).scalar()
+    if after is None:
+        return
+    # Start just below the smallest key; keys are integers
+    after -= 1
+    filled = 0
+    while True:
+        upper = connection.execute(NEXT_RANGE, {"after": after, "batch": BATCH_SIZE}).scalar()
+        if upper is None:
+            break
+        filled += connection.execute(BACKFILL, {"after": after, "upper": upper}).rowcount
+        after = upper
+    if filled:
+        logger.info(f"Back-filled {filled} wager option row(s)")
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+
+    # Check if the table exists before creating it (idempotent migration)
+    inspector = sa.inspect(connection)
+    existing_tables = inspector.get_table_names()
+
+    # Create wager_options table
+    if 'wager_options' not in existing_tables:
+        op.create_table('wager_options',
+            sa.Column('wager_id', sa.Integer(), nullable=False),
+            sa.Column('idx', sa.Integer(), nullable=False),
+            sa.Column('label', sa.Text(), nullable=False),
+            sa.Column('total_staked', sa.BigInteger(), server_default='0', nullable=False),
+            sa.Column('position_count', sa.Integer(), server_default='0', nullable=False),
+            sa.Column('last_bet_seq', sa.BigInteger(), server_default='0', nullable=False),
+            sa.CheckConstraint('idx >= 0', name='check_wager_option_valid_idx'),
+            sa.ForeignKeyConstraint(['wager_id'], ['wagers.wager_id']),
+            sa.PrimaryKeyConstraint('wager_id', 'idx')
+        )
+
+    with op.get_context().autocommit_block():
+        _backfill(connection)
+        connection.execute(RESYNC_OPEN)
+
+
+def downgrade() -> None:
+    op.drop_table('wager_options')
@@ -0,0 +1,59 @@
+"""Count positions in the statistics rollups
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19 00:00:00.000000
+
+Adds ``positions`` to ``user_stats`` and ``daily_user_stats``: the bets that
+opened a position, leaving out top-ups of it, so the win rate divides wins
+by the positions that could have won. A partial index on the bet
+transactions lets the aggregator find a position's earlier bets.
+
+The rollups are emptied and their watermark reset, and the aggregator
+refolds the whole transaction log into them over its next runs. Until it
+has caught up, ``/stats`` shows partial figures.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '010'
+down_revision: Union[str, None] = '009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_TABLES = ('user_stats', 'daily_user_stats')
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+
+    # Check what exists before changing it (idempotent migration)
+    inspector = sa.inspect(connection)
+    added = False
+    for table in ROLLUP_TABLES:
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if 'positions' not in columns:
+            op.add_column(table, sa.Column('positions', sa.Integer(), nullable=False, server_default='0'))
+            added = True
+
+    # Rows folded before the column existed count no positions; fold everything again,
+    # committed together with the new columns
+    if added:
+        for table in ROLLUP_TABLES:
+            op.execute(f"DELETE FROM {table}")
+        op.execute("UPDATE stats_watermarks SET last_transaction_id = 0, updated_at = now() WHERE name = 'user_stats'")
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_bet_reference "
+            "ON transactions (reference_id, transaction_id) WHERE transaction_type = 'bet_placed'"
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transactions_bet_reference', table_name='transactions')
+    for table in ROLLUP_TABLES:
+        op.drop_column(table, 'positions')
@@ -0,0 +1,114 @@
+"""Compare balance-update contention in row mode and ledger mode.
+
+Runs the same workload twice against the configured database: many
+concurrent workers crediting and debiting a handful of hot users through
+``update_balance``, first updating users.bits_balance in place and then
+appending to the ledger. Prints throughput and latency percentiles for
+each mode and checks that every balance comes out as expected.
+
+All rows are written under a dedicated guild ID and deleted afterwards.
+Raise DB_POOL_SIZE / DB_MAX_OVERFLOW to at least --workers, or the pool
+becomes the bottleneck instead of the row locks.
+
+    python benchmark-ledger.py --hot-users 5 --workers 32 --operations 5000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from sqlalchemy import delete, select
+from src import config
+from src.database.database import engine, get_session, get_balance, update_balance
+from src.database.ledger import ledger_balances, run_ledger_compactor
+from src.database.models import User, Transaction, LedgerEntry, TRANSACTION_TYPE_ADMIN_ADJUSTMENT
+
+
+async def _clean_up(guild_id: int):
+    async with get_session() as session:
+        for model in (LedgerEntry, Transaction, User):
+            await session.execute(delete(model).where(model.guild_id == guild_id))
+        await session.commit()
+    ledger_balances.clear()
+
+
+async def _run_mode(ledger: bool, args) -> dict:
+    config.BALANCE_LEDGER_MODE = ledger
+    await _clean_up(args.guild_id)
+    user_ids = list(range(1, args.hot_users + 1))
+    async with get_session() as session:
+        for user_id in user_ids:
+            await get_balance(session, args.guild_id, user_id)
+
+    rng = random.Random(args.seed)
+    # Alternate one-bit credits and debits, so no balance runs low however the work is spread
+    work = [(rng.choice(user_ids), 1 if i % 2 else -1) for i in range(args.operations)]
+    queue = asyncio.Queue()
+    for item in work:
+        queue.put_nowait(item)
+    latencies = []
+
+    async def worker():
+        while True:
+            try:
+                user_id, amount = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            async with get_session() as session:
+                await update_balance(session, args.guild_id, user_id, amount, TRANSACTION_TYPE_ADMIN_ADJUSTMENT)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.workers)))
+    elapsed = time.perf_counter() - started
+
+    if ledger:
+        await run_ledger_compactor()
+    async with get_session() as session:
+        result = await session.execute(
+            select(User.user_id, User.bits_balance).where(User.guild_id == args.guild_id).order_by(User.user_id)
+        )
+        balances = dict(result.all())
+
+    expected = {user_id: config.STARTING_BALANCE for user_id in user_ids}
+    for user_id, amount in work:
+        expected[user_id] += amount
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[max(int(len(latencies) * 0.99) - 1, 0)],
+        "wrong": sum(1 for user_id in user_ids if balances.get(user_id) != expected[user_id]),
+    }
+
+
+async def main(args) -> int:
+    results = {}
+    try:
+        for name, ledger in (("row", False), ("ledger", True)):
+            results[name] = await _run_mode(ledger, args)
+    finally:
+        await _clean_up(args.guild_id)
+        await engine.dispose()
+
+    print(f"{args.operations} updates, {args.workers} workers, {args.hot_users} hot user(s)")
+    print(f"{'mode':<8} {'updates/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'wrong balances':>15}")
+    for name, result in results.items():
+        print(
+            f"{name:<8} {result['throughput']:>10.0f} {result['p50'] * 1000:>8.1f} "
+            f"{result['p99'] * 1000:>8.1f} {result['wrong']:>15}"
+        )
+    return 1 if any(result["wrong"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hot-users", type=int, default=5, help="users every update is spread over")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent sessions")
+    parser.add_argument("--operations", type=int, default=5000, help="balance updates per mode")
+    parser.add_argument("--guild-id", type=int, default=1, help="guild ID the benchmark rows are written under")
+    parser.add_argument("--seed", type=int, default=0)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,51 @@
+"""Time the payout allocator on a wager with a million winning stakes.
+
+Allocates a pool (less the house rake) across --bets random stakes with
+apply_rake and allocate_payouts, --repeat times, checks every run pays out
+exactly the pool, and prints the best and median time. Fails if the best
+time exceeds --max-seconds. Needs no database.
+
+    python benchmark-payouts.py --bets 1000000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from src.utils.payouts import allocate_payouts, apply_rake
+
+
+def main(args) -> int:
+    rng = random.Random(args.seed)
+    stakes = [rng.randint(1, args.max_stake) for _ in range(args.bets)]
+    # Losing stakes make up the rest of the pool
+    pool = sum(stakes) * 3
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        rake = apply_rake(pool, args.rake_bps)
+        payouts = allocate_payouts(stakes, pool - rake)
+        timings.append(time.perf_counter() - started)
+        if rake + sum(payouts) != pool:
+            print(f"Pool not conserved: {rake} rake + {sum(payouts)} paid != {pool}")
+            return 1
+
+    best = min(timings)
+    print(
+        f"{args.bets:,} stakes, {args.rake_bps} bps rake: best {best:.3f}s, "
+        f"median {statistics.median(timings):.3f}s over {args.repeat} run(s) "
+        f"({args.bets / best / 1e6:.2f}M stakes/s)"
+    )
+    return 1 if best > args.max_seconds else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bets", type=int, default=1_000_000, help="winning stakes to allocate")
+    parser.add_argument("--max-stake", type=int, default=100_000, help="largest random stake")
+    parser.add_argument("--rake-bps", type=int, default=250, help="house rake in basis points")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random stakes")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="fail if the best run is slower")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,142 @@
+"""Compare full ORM entity reads with the repository's column-only rows.
+
+Creates --wagers open wagers in the configured database, one of them with
+--positions positions, and runs each read path both ways: loading whole
+entities, as the cogs used to, and through the NamedTuple projections in
+src.database.repository. Prints the time per read and the peak memory
+traced while reading, and fails if a projection peaks higher than the
+entity read it replaces.
+
+All rows are written under a dedicated guild ID and deleted afterwards.
+
+    python benchmark-projections.py --positions 20000 --wagers 20
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from sqlalchemy import delete, insert, select
+from src.database.database import engine, get_session
+from src.database.models import User, Wager, WagerOption, Position, WAGER_STATUS_OPEN
+from src.database.repository import get_wager_stakes, get_wager_status, list_open_wager_titles
+
+INSERT_BATCH = 5000
+
+
+async def _clean_up(guild_id: int):
+    guild_wagers = select(Wager.wager_id).where(Wager.guild_id == guild_id)
+    async with get_session() as session:
+        await session.execute(delete(WagerOption).where(WagerOption.wager_id.in_(guild_wagers)))
+        for model in (Position, Wager, User):
+            await session.execute(delete(model).where(model.guild_id == guild_id))
+        await session.commit()
+
+
+async def _create_wagers(guild_id: int, wagers: int, positions: int) -> int:
+    """Create the open wagers and the big wager's positions; returns the big wager's ID."""
+    async with get_session() as session:
+        rows = [{"guild_id": guild_id, "user_id": user_id} for user_id in range(1, positions + 1)]
+        for start in range(0, positions, INSERT_BATCH):
+            await session.execute(insert(User), rows[start:start + INSERT_BATCH])
+
+        created = [
+            Wager(
+                guild_id=guild_id, creator_id=1, title=f"Benchmark {index}",
+                description="A description the listing never shows. " * 10,
+                options=[f"Option {option}" for option in range(8)], status=WAGER_STATUS_OPEN
+            )
+            for index in range(wagers)
+        ]
+        session.add_all(created)
+        await session.flush()
+        wager_id = created[0].wager_id
+
+        rows = [
+            {
+                "guild_id": guild_id, "wager_id": wager_id, "user_id": user_id,
+                "option_index": user_id % 8, "amount": 1 + user_id % 97, "bet_count": 1, "last_bet_seq": user_id
+            }
+            for user_id in range(1, positions + 1)
+        ]
+        for start in range(0, positions, INSERT_BATCH):
+            await session.execute(insert(Position), rows[start:start + INSERT_BATCH])
+        await session.commit()
+        return wager_id
+
+
+def _read_paths(guild_id: int, wager_id: int):
+    """(name, entity read, projection) for each read path the repository replaced."""
+    async def stake_entities(session):
+        result = await session.execute(
+            select(Position).where(Position.wager_id == wager_id).order_by(Position.position_id)
+        )
+        return result.scalars().all()
+
+    async def title_entities(session):
+        result = await session.execute(
+            select(Wager).where(Wager.guild_id == guild_id).where(Wager.status == WAGER_STATUS_OPEN)
+            .order_by(Wager.created_at.desc()).limit(20)
+        )
+        return result.scalars().all()
+
+    async def status_entity(session):
+        result = await session.execute(
+            select(Wager).where(Wager.wager_id == wager_id).where(Wager.guild_id == guild_id)
+        )
+        return result.scalar_one_or_none()
+
+    return (
+        ("wager stakes (resolve)", stake_entities, lambda session: get_wager_stakes(session, wager_id)),
+        ("open wager titles", title_entities, lambda session: list_open_wager_titles(session, guild_id)),
+        ("wager status (bet button)", status_entity, lambda session: get_wager_status(session, guild_id, wager_id)),
+    )
+
+
+async def _measure(read, repeat: int) -> dict:
+    async with get_session() as session:
+        await read(session)  # Warm the compiled cache and the connection
+
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        async with get_session() as session:
+            tracemalloc.start()
+            started = time.perf_counter()
+            rows = await read(session)
+            timings.append(time.perf_counter() - started)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return {"seconds": min(timings), "peak": peak, "rows": len(rows) if isinstance(rows, list) else 1}
+
+
+async def main(args) -> int:
+    results = []
+    try:
+        await _clean_up(args.guild_id)
+        wager_id = await _create_wagers(args.guild_id, args.wagers, args.positions)
+        for name, entities, projection in _read_paths(args.guild_id, wager_id):
+            results.append((name, await _measure(entities, args.repeat), await _measure(projection, args.repeat)))
+    finally:
+        await _clean_up(args.guild_id)
+        await engine.dispose()
+
+    print(f"Best of {args.repeat} read(s) each, traced under tracemalloc")
+    print(f"{'read path':<26} {'rows':>6} {'entities ms':>12} {'rows ms':>8} {'entities KiB':>13} {'rows KiB':>9}")
+    worse = 0
+    for name, entities, projection in results:
+        print(
+            f"{name:<26} {projection['rows']:>6} {entities['seconds'] * 1000:>12.2f} "
+            f"{projection['seconds'] * 1000:>8.2f} {entities['peak'] / 1024:>13.0f} {projection['peak'] / 1024:>9.0f}"
+        )
+        worse += projection["peak"] > entities["peak"]
+    return 1 if worse else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--positions", type=int, default=20000, help="positions on the wager whose stakes are read")
+    parser.add_argument("--wagers", type=int, default=20, help="open wagers in the listing")
+    parser.add_argument("--repeat", type=int, default=5, help="timed reads per variant")
+    parser.add_argument("--guild-id", type=int, default=4, help="guild ID the benchmark rows are written under")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,106 @@
+"""Time the hot wager lookup built the ways the cogs could build it.
+
+Looks up one wager by ID --runs times per variant, a fresh session per
+lookup as a command would: with select() rebuilt on every call, with
+lambda_stmt, with the prebuilt statement from src.database.repository, and
+with the prebuilt statement on a NullPool engine, where asyncpg's prepared
+statements die with each connection. Prints the time per lookup and how
+often each variant hit SQLAlchemy's compiled cache, and fails if the
+prebuilt statement still misses the cache once warmed up.
+
+The wager is written under a dedicated guild ID and deleted afterwards.
+
+    python benchmark-queries.py --runs 5000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from sqlalchemy import delete, lambda_stmt, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from src.database.database import AsyncSessionLocal, async_database_url, engine
+from src.database.economy import create_wager
+from src.database.models import User, Wager, WagerOption
+from src.database.repository import compile_cache_stats, get_wager, track_compile_cache
+
+
+async def _rebuilt(session, wager_id: int, guild_id: int):
+    result = await session.execute(select(Wager).where(Wager.wager_id == wager_id).where(Wager.guild_id == guild_id))
+    return result.scalar_one_or_none()
+
+
+async def _lambda(session, wager_id: int, guild_id: int):
+    result = await session.execute(
+        lambda_stmt(lambda: select(Wager).where(Wager.wager_id == wager_id).where(Wager.guild_id == guild_id))
+    )
+    return result.scalar_one_or_none()
+
+
+async def _time_variant(session_factory, lookup, wager_id: int, guild_id: int, runs: int) -> dict:
+    # One untimed lookup compiles the statement, as the first command after start-up would
+    async with session_factory() as session:
+        await lookup(session, wager_id, guild_id)
+
+    cache_before = compile_cache_stats.copy()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        async with session_factory() as session:
+            wager = await lookup(session, wager_id, guild_id)
+        timings.append(time.perf_counter() - started)
+        if wager is None:
+            raise RuntimeError(f"Wager {wager_id} not found")
+    cache = compile_cache_stats - cache_before
+    return {
+        "mean": statistics.fmean(timings),
+        "p50": statistics.median(timings),
+        "hits": cache["cache_hit"],
+        "misses": cache["cache_miss"],
+    }
+
+
+async def main(args) -> int:
+    unpooled = create_async_engine(async_database_url, poolclass=NullPool)
+    track_compile_cache(unpooled)
+    UnpooledSession = sessionmaker(unpooled, class_=AsyncSession, expire_on_commit=False)
+
+    async with AsyncSessionLocal() as session:
+        wager = await create_wager(session, args.guild_id, 1, "Benchmark", None, ["Yes", "No"])
+
+    variants = (
+        ("select() per call", AsyncSessionLocal, _rebuilt),
+        ("lambda_stmt", AsyncSessionLocal, _lambda),
+        ("prebuilt", AsyncSessionLocal, get_wager),
+        ("prebuilt, NullPool", UnpooledSession, get_wager),
+    )
+    results = {}
+    try:
+        for name, session_factory, lookup in variants:
+            results[name] = await _time_variant(session_factory, lookup, wager.wager_id, args.guild_id, args.runs)
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(WagerOption).where(WagerOption.wager_id == wager.wager_id))
+            await session.execute(delete(Wager).where(Wager.wager_id == wager.wager_id))
+            await session.execute(delete(User).where(User.guild_id == args.guild_id))
+            await session.commit()
+        await unpooled.dispose()
+        await engine.dispose()
+
+    print(f"{args.runs} lookups of one wager per variant, a session each")
+    print(f"{'variant':<20} {'mean us':>9} {'p50 us':>9} {'cache hits':>11} {'misses':>7}")
+    for name, result in results.items():
+        print(
+            f"{name:<20} {result['mean'] * 1e6:>9.0f} {result['p50'] * 1e6:>9.0f} "
+            f"{result['hits']:>11} {result['misses']:>7}"
+        )
+    return 1 if results["prebuilt"]["misses"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5000, help="timed lookups per variant")
+    parser.add_argument("--guild-id", type=int, default=3, help="guild ID the benchmark wager is written under")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,129 @@
+"""Measure peak Python memory of resolving wagers of growing size.
+
+For each size, creates a wager with that many positions (one per user) in
+the configured database, runs its resolution job under tracemalloc and
+prints the time taken and the peak traced memory. Payouts are streamed a
+chunk at a time, so the peak should stay flat as the wager grows; the
+script fails if the largest wager's peak exceeds the smallest's by more
+than --max-growth.
+
+All rows are written under a dedicated guild ID and deleted afterwards.
+
+    python benchmark-resolve-memory.py --bets 10000 100000
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from sqlalchemy import delete, insert, select
+from src import config
+from src.database.database import engine, get_session
+from src.database.jobs import run_resolve_job
+from src.database.ledger import ledger_balances
+from src.database.models import (
+    User, Wager, WagerOption, Position, Transaction, LedgerEntry, Job,
+    WAGER_STATUS_RESOLVING, JOB_STATUS_RUNNING, JOB_TYPE_RESOLVE_WAGER
+)
+
+# Rows per INSERT while setting up a wager
+INSERT_BATCH = 5000
+
+
+async def _clean_up(guild_id: int):
+    guild_wagers = select(Wager.wager_id).where(Wager.guild_id == guild_id)
+    async with get_session() as session:
+        await session.execute(delete(Job).where(Job.payload["wager_id"].as_integer().in_(guild_wagers)))
+        await session.execute(delete(WagerOption).where(WagerOption.wager_id.in_(guild_wagers)))
+        for model in (Position, LedgerEntry, Transaction, Wager, User):
+            await session.execute(delete(model).where(model.guild_id == guild_id))
+        await session.commit()
+    ledger_balances.clear()
+
+
+async def _create_wager(guild_id: int, bets: int) -> Job:
+    """Create a wager with ``bets`` positions spread over two options, and a claimed job to resolve it."""
+    async with get_session() as session:
+        user_rows = [
+            {"guild_id": guild_id, "user_id": user_id, "bits_balance": config.STARTING_BALANCE}
+            for user_id in range(1, bets + 1)
+        ]
+        for start in range(0, bets, INSERT_BATCH):
+            await session.execute(insert(User), user_rows[start:start + INSERT_BATCH])
+
+        wager = Wager(
+            guild_id=guild_id, creator_id=1, title=f"Benchmark {bets}",
+            options=["A", "B"], status=WAGER_STATUS_RESOLVING
+        )
+        session.add(wager)
+        await session.flush()
+
+        position_rows = [
+            {
+                "guild_id": guild_id, "wager_id": wager.wager_id, "user_id": user_id,
+                "option_index": user_id % 2, "amount": 1 + user_id % 97, "bet_count": 1, "last_bet_seq": user_id
+            }
+            for user_id in range(1, bets + 1)
+        ]
+        for start in range(0, bets, INSERT_BATCH):
+            await session.execute(insert(Position), position_rows[start:start + INSERT_BATCH])
+        session.add_all([
+            WagerOption(
+                wager_id=wager.wager_id, idx=idx, label=label,
+                total_staked=sum(row["amount"] for row in position_rows if row["option_index"] == idx),
+                position_count=sum(1 for row in position_rows if row["option_index"] == idx)
+            )
+            for idx, label in enumerate(wager.options)
+        ])
+
+        job = Job(
+            job_type=JOB_TYPE_RESOLVE_WAGER,
+            payload={"wager_id": wager.wager_id, "winning_option": 0},
+            status=JOB_STATUS_RUNNING,
+            attempts=1
+        )
+        session.add(job)
+        await session.commit()
+        return job
+
+
+async def _measure(guild_id: int, bets: int) -> dict:
+    await _clean_up(guild_id)
+    job = await _create_wager(guild_id, bets)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = await run_resolve_job(job)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await _clean_up(guild_id)
+    return {"bets": bets, "winners": result.winners, "seconds": elapsed, "peak": peak}
+
+
+async def main(args) -> int:
+    results = []
+    try:
+        for bets in sorted(args.bets):
+            results.append(await _measure(args.guild_id, bets))
+    finally:
+        await _clean_up(args.guild_id)
+        await engine.dispose()
+
+    print(f"JOB_CHUNK_SIZE={config.JOB_CHUNK_SIZE}")
+    print(f"{'bets':>10} {'winners':>10} {'seconds':>9} {'peak KiB':>10}")
+    for result in results:
+        print(f"{result['bets']:>10} {result['winners']:>10} {result['seconds']:>9.2f} {result['peak'] / 1024:>10.0f}")
+
+    growth = results[-1]["peak"] / max(results[0]["peak"], 1)
+    print(f"Peak memory grew {growth:.2f}x from {results[0]['bets']} to {results[-1]['bets']} bets")
+    return 1 if growth > args.max_growth else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bets", type=int, nargs="+", default=[10000, 100000], help="wager sizes to resolve")
+    parser.add_argument("--max-growth", type=float, default=2.0, help="allowed ratio of the largest to the smallest peak")
+    parser.add_argument("--guild-id", type=int, default=2, help="guild ID the benchmark rows are written under")
+    sys.exit(asyncio.run(main(parser.parse_args())))
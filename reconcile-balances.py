@@ -0,0 +1,54 @@
+"""Check every balance against the transaction log, and optionally repair drift.
+
+    python reconcile-balances.py            # report only
+    python reconcile-balances.py --repair   # move drifted balances back in line
+
+Exits with status 1 when mismatched balances were found and left unrepaired.
+In ledger mode --repair is refused: the running bot caches balances in
+memory and wouldn't see a repair made from here. Let the bot repair them
+with RECONCILE_REPAIR=true instead.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from src import config
+from src.database.database import engine
+from src.database.reconcile import reconcile_balances
+
+
+async def main(args) -> int:
+    try:
+        report = await reconcile_balances(args.repair, args.chunk_size, args.concurrency)
+    finally:
+        await engine.dispose()
+
+    print(f"Checked {report.users} balance(s) in {report.chunks} chunk(s) in {report.seconds:.1f}s")
+    for discrepancy in report.discrepancies:
+        print(
+            f"  guild {discrepancy.guild_id} user {discrepancy.user_id}: balance {discrepancy.balance}, "
+            f"transactions say {discrepancy.expected} ({discrepancy.drift:+d})"
+        )
+    if not report.discrepancies:
+        print("Every balance matches its transactions.")
+        return 0
+    if args.repair:
+        print(f"Repaired {report.repaired} balance(s).")
+        return 0
+    print(f"{len(report.discrepancies)} balance(s) drifted; run again with --repair to fix them.")
+    return 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repair", action="store_true", help="move drifted balances back in line with their transactions")
+    parser.add_argument("--chunk-size", type=int, default=config.RECONCILE_CHUNK_SIZE, help="users per aggregate query")
+    parser.add_argument("--concurrency", type=int, default=config.RECONCILE_CONCURRENCY, help="chunks checked at once")
+    args = parser.parse_args()
+    if args.repair and config.BALANCE_LEDGER_MODE:
+        parser.error(
+            "--repair is unavailable in ledger mode, since the bot's cached balances wouldn't see it. "
+            "Set RECONCILE_REPAIR=true to let the bot repair drift itself."
+        )
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,302 @@
+"""Replay a recorded event log against a local database.
+
+Feeds the events recorded with EVENT_LOG_PATH back through the same
+functions the cogs call (src.database.economy), at --speed times the
+recorded pace (0 replays as fast as possible). Resolutions run their payout
+job inline. Prints throughput, per-command latency and a checksum of every
+final balance, so two builds replayed from the same log and the same empty
+database can be compared.
+
+The replay is deterministic. Daily claims are judged at the recorded time,
+and events only run concurrently when their order can't change the outcome:
+a user's commands run in order, the bets on a wager run in order between
+its create and close, and a resolve waits for everything before it. Bets on
+one wager are never concurrent because their order sets the order of the
+positions, and that order breaks ties when resolution rounds the payouts.
+
+Point DATABASE_URL at a scratch database: the recorded guilds' rows are
+written there. --reset deletes them first; without it the replay refuses to
+run over existing users of those guilds.
+
+    python replay-events.py events.ndjson --speed 10
+    python replay-events.py events.ndjson --dry-run
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import delete, func, select
+from src import config
+from src.database.database import engine, get_session
+from src.database.economy import Rejected, place_wager_bet, claim_daily, create_wager, close_wager, request_resolution
+from src.database.jobs import claim_job, run_resolve_job
+from src.database.ledger import ledger_balances, run_ledger_compactor
+from src.database.models import (
+    User, Wager, WagerOption, Position, Bet, Transaction, LedgerEntry, Job
+)
+from src.utils.events import (
+    EVENT_BET, EVENT_DAILY, EVENT_CREATE_WAGER, EVENT_CLOSE, EVENT_RESOLVE, EVENT_TYPES, read_events
+)
+
+# Dependency key every event reads and only a resolve writes, so resolves are barriers
+_EVERYTHING = ("all",)
+
+
+def _dependency_keys(event: dict):
+    """(key, writes) pairs: an event waits for earlier writers of its keys, and a writer for earlier readers too."""
+    user = ("user", event["guild"], event["user"])
+    keys = [(_EVERYTHING, event["type"] == EVENT_RESOLVE)]
+    if event["type"] == EVENT_BET:
+        # Positions are numbered in the order their first bets land, so bets on a wager take turns
+        keys += [(user, True), (("wager", event["wager"]), True)]
+    elif event["type"] == EVENT_DAILY:
+        keys.append((user, True))
+    elif event["type"] == EVENT_CREATE_WAGER:
+        keys += [(user, True), (("wager", event["wager"]), True)]
+    elif event["type"] == EVENT_CLOSE:
+        keys.append((("wager", event["wager"]), True))
+    return keys
+
+
+class Replay:
+    """Runs a log's events as tasks ordered by their dependencies and records how each went."""
+
+    def __init__(self, speed: float):
+        self.speed = speed
+        self.wager_ids = {}  # recorded wager_id -> replayed wager_id
+        self.outcomes = Counter()  # (type, "ok" | "rejected" | "skipped" | "error")
+        self.latencies = defaultdict(list)  # type -> seconds
+        self.errors = []
+        self._writers = {}
+        self._readers = defaultdict(list)
+        self._slots = asyncio.Semaphore(max(config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW, 1))
+
+    def schedule(self, event: dict, origin: float, started: float) -> asyncio.Task:
+        """Create the task for an event, after the tasks it depends on."""
+        waits = []
+        keys = _dependency_keys(event)
+        for key, writes in keys:
+            if key in self._writers:
+                waits.append(self._writers[key])
+            if writes:
+                waits.extend(self._readers[key])
+        due = started + (event["ts"] - origin) / self.speed if self.speed > 0 else 0
+        task = asyncio.create_task(self._run(event, waits, due))
+        for key, writes in keys:
+            if writes:
+                self._writers[key] = task
+                self._readers[key] = []
+            else:
+                readers = self._readers[key]
+                readers.append(task)
+                if len(readers) > 1000:
+                    readers[:] = [reader for reader in readers if not reader.done()]
+        return task
+
+    async def _run(self, event: dict, waits, due: float):
+        if waits:
+            await asyncio.wait(waits)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        kind = event["type"]
+        async with self._slots:
+            started = time.perf_counter()
+            try:
+                outcome = await self._execute(event)
+            except Rejected:
+                outcome = "rejected"
+            except Exception as e:
+                outcome = "error"
+                self.errors.append(f"{kind} {json.dumps(event)}: {e}")
+            self.latencies[kind].append(time.perf_counter() - started)
+        self.outcomes[(kind, outcome)] += 1
+
+    async def _execute(self, event: dict) -> str:
+        kind, guild_id, user_id = event["type"], event["guild"], event["user"]
+        if kind == EVENT_CREATE_WAGER:
+            async with get_session() as session:
+                wager = await create_wager(
+                    session, guild_id, user_id, event["title"], event.get("description"), event["options"]
+                )
+            self.wager_ids[event["wager"]] = wager.wager_id
+            return "ok"
+        if kind == EVENT_DAILY:
+            async with get_session() as session:
+                await claim_daily(session, guild_id, user_id, now=datetime.utcfromtimestamp(event["ts"]))
+            return "ok"
+
+        # Wagers created before recording started can't be replayed
+        wager_id = self.wager_ids.get(event["wager"])
+        if wager_id is None:
+            return "skipped"
+        async with get_session() as session:
+            if kind == EVENT_BET:
+                await place_wager_bet(session, guild_id, wager_id, user_id, event["option"], event["amount"])
+            elif kind == EVENT_CLOSE:
+                await close_wager(session, guild_id, wager_id)
+            elif kind == EVENT_RESOLVE:
+                await request_resolution(session, guild_id, wager_id, event["option"], requested_by=user_id)
+        if kind == EVENT_RESOLVE:
+            await _run_jobs()
+        return "ok"
+
+
+async def _run_jobs():
+    """Run queued payout jobs to completion, as the job worker would."""
+    while True:
+        async with get_session() as session:
+            job = await claim_job(session)
+        if job is None:
+            return
+        await run_resolve_job(job)
+
+
+async def _reset(guild_ids):
+    """Delete every row the replay writes for the recorded guilds."""
+    guild_wagers = select(Wager.wager_id).where(Wager.guild_id.in_(guild_ids))
+    async with get_session() as session:
+        await session.execute(delete(Job).where(Job.payload["wager_id"].as_integer().in_(guild_wagers)))
+        await session.execute(delete(WagerOption).where(WagerOption.wager_id.in_(guild_wagers)))
+        for model in (Position, Bet, LedgerEntry, Transaction, Wager, User):
+            await session.execute(delete(model).where(model.guild_id.in_(guild_ids)))
+        await session.commit()
+    ledger_balances.clear()
+
+
+async def _balance_checksum(guild_ids) -> dict:
+    """Hash every final balance of the recorded guilds, in key order."""
+    if config.BALANCE_LEDGER_MODE:
+        await run_ledger_compactor()
+    digest = hashlib.sha256()
+    users = total = 0
+    async with get_session() as session:
+        result = await session.execute(
+            select(User.guild_id, User.user_id, User.bits_balance)
+            .where(User.guild_id.in_(guild_ids))
+            .order_by(User.guild_id, User.user_id)
+        )
+        for guild_id, user_id, balance in result:
+            digest.update(f"{guild_id}:{user_id}:{balance}\n".encode())
+            users += 1
+            total += balance
+    return {"users": users, "total_bits": total, "checksum": digest.hexdigest()}
+
+
+def _percentile(values, fraction: float) -> float:
+    return values[max(int(len(values) * fraction + 0.5) - 1, 0)]
+
+
+def _summarize(events) -> dict:
+    counts = Counter(event["type"] for event in events)
+    span = events[-1]["ts"] - events[0]["ts"] if events else 0.0
+    return {
+        "events": len(events),
+        "by_type": {kind: counts[kind] for kind in EVENT_TYPES if counts[kind]},
+        "guilds": len({event["guild"] for event in events}),
+        "users": len({(event["guild"], event["user"]) for event in events}),
+        "recorded_seconds": round(span, 1),
+    }
+
+
+async def replay(args, events) -> dict:
+    guild_ids = sorted({event["guild"] for event in events})
+    if args.reset:
+        await _reset(guild_ids)
+    else:
+        async with get_session() as session:
+            existing = (await session.execute(
+                select(func.count()).select_from(User).where(User.guild_id.in_(guild_ids))
+            )).scalar_one()
+        if existing:
+            raise SystemExit(
+                f"{existing} user(s) of the recorded guilds already exist. Replay into an empty database, "
+                f"or pass --reset to delete the recorded guilds' rows first."
+            )
+
+    runner = Replay(args.speed)
+    origin = events[0]["ts"]
+    started = time.perf_counter()
+    tasks = [runner.schedule(event, origin, started) for event in events]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    latency = {}
+    for kind in EVENT_TYPES:
+        values = sorted(runner.latencies.get(kind, []))
+        if values:
+            latency[kind] = {
+                **{outcome: runner.outcomes[(kind, outcome)] for outcome in ("ok", "rejected", "skipped", "error")},
+                "p50_ms": round(statistics.median(values) * 1000, 2),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+            }
+    return {
+        **_summarize(events),
+        "speed": args.speed,
+        "ledger_mode": config.BALANCE_LEDGER_MODE,
+        "seconds": round(elapsed, 2),
+        "events_per_second": round(len(events) / elapsed, 1) if elapsed else None,
+        "commands": latency,
+        "errors": runner.errors[:20],
+        "balances": await _balance_checksum(guild_ids),
+    }
+
+
+def _print_report(report: dict):
+    print(
+        f"{report['events']} events from {report['users']} user(s) in {report['guilds']} guild(s), "
+        f"{report['recorded_seconds']}s recorded"
+    )
+    if "seconds" not in report:
+        for kind, count in report["by_type"].items():
+            print(f"  {kind:<12} {count:>8}")
+        return
+
+    print(f"Replayed at {report['speed']}x in {report['seconds']}s: {report['events_per_second']} events/s")
+    print(f"{'command':<12} {'ok':>8} {'rejected':>9} {'skipped':>8} {'error':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for kind, row in report["commands"].items():
+        print(
+            f"{kind:<12} {row['ok']:>8} {row['rejected']:>9} {row['skipped']:>8} {row['error']:>6} "
+            f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+        )
+    for error in report["errors"]:
+        print(f"error: {error}")
+    balances = report["balances"]
+    print(f"Balances: {balances['users']} user(s), {balances['total_bits']:,} bits, sha256 {balances['checksum']}")
+
+
+async def main(args) -> int:
+    events = sorted(read_events(args.log), key=lambda event: event["ts"])
+    if not events:
+        print(f"No events in {args.log}")
+        return 1
+
+    if args.dry_run:
+        report = _summarize(events)
+    else:
+        try:
+            report = await replay(args, events)
+        finally:
+            await engine.dispose()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 1 if report.get("errors") else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log", help="NDJSON event log recorded with EVENT_LOG_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiple of the recorded pace (0 = as fast as possible)")
+    parser.add_argument("--reset", action="store_true", help="delete the recorded guilds' rows before replaying")
+    parser.add_argument("--dry-run", action="store_true", help="only summarize the log, without touching the database")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,9 +1,24 @@
-"""Main bot entry point for Discord Bits Wagering Bot."""
+"""Main bot entry point for Discord Bits Wagering Bot.
+
+Run with ``--profile-startup`` to load every cog without connecting to
+Discord and print how long the imports and each cog took.
+"""
+import time
+
+# Taken before the heavy imports so start-up profiling can include them
+_PROCESS_STARTED = time.perf_counter()
+
+import argparse
 import asyncio
+import importlib
 import logging
+import sys
+from contextlib import contextmanager
 import discord
 from discord.ext import commands
 from src import config
+from src.utils.health import readiness, start_health_server
+from src.utils.ratelimit import RateLimitedCommandTree
 
 # Set up logging
 logging.basicConfig(
@@ -21,80 +36,159 @@ intents.members = True
 bot = commands.Bot(
     command_prefix=config.COMMAND_PREFIX,
     intents=intents,
-    help_command=None  # We'll create a custom help command
+    help_command=None,  # We'll create a custom help command
+    tree_cls=RateLimitedCommandTree
 )
 
+COGS = [
+    'src.cogs.balance',
+    'src.cogs.wagers',
+    'src.cogs.betting',
+    'src.cogs.admin',
+    'src.cogs.jobs',
+    'src.cogs.stats',
+    'src.cogs.help'
+]
+
+# Start-up phase -> seconds it took
+startup_timings = {"imports": time.perf_counter() - _PROCESS_STARTED}
+# on_ready fires again after every reconnect; persistent views only need registering once
+_views_registered = False
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Record how long a start-up phase takes."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - started
+
+
+async def load_cogs() -> dict:
+    """Load every cog, returning the seconds each took (its imports included)."""
+    cog_timings = {}
+    for cog in COGS:
+        started = time.perf_counter()
+        try:
+            await bot.load_extension(cog)
+            logger.info(f"Loaded cog: {cog}")
+        except Exception as e:
+            logger.error(f"Failed to load cog {cog}: {e}")
+        cog_timings[cog] = time.perf_counter() - started
+    return cog_timings
+
+
+async def setup_hook():
+    """Warm the database, load cogs and sync slash commands once, before connecting to the gateway."""
+    from src.database.warmup import warm_up
+    
+    # Up first, so the container's health check sees start-up progress
+    with startup_phase("health server"):
+        await start_health_server()
+    
+    # A database that never comes up fails start-up here, and the container restarts
+    with startup_phase("database warm-up"):
+        await warm_up()
+    
+    with startup_phase("cogs"):
+        await load_cogs()
+    
+    with startup_phase("command sync"):
+        try:
+            synced = await bot.tree.sync()
+            logger.info(f"Synced {len(synced)} command(s)")
+        except Exception as e:
+            logger.error(f"Failed to sync commands: {e}")
+
+bot.setup_hook = setup_hook
+
 
 @bot.event
 async def on_ready():
     """Called when the bot is ready."""
+    global _views_registered
+    
     logger.info(f'{bot.user} has connected to Discord!')
     logger.info(f'Bot is in {len(bot.guilds)} guild(s)')
     
-    # Load cogs
-    cogs_to_load = [
-        'src.cogs.balance',
-        'src.cogs.wagers',
-        'src.cogs.betting',
-        'src.cogs.admin',
-        'src.cogs.help'
-    ]
-    
-    for cog in cogs_to_load:
-        try:
-            await bot.load_extension(cog)
-            logger.info(f"Loaded cog: {cog}")
-        except Exception as e:
-            logger.error(f"Failed to load cog {cog}: {e}")
+    if _views_registered:
+        readiness.set("gateway", True, f"{len(bot.guilds)} guild(s)")
+        return
+    _views_registered = True
     
-    # Sync slash commands
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        logger.error(f"Failed to sync commands: {e}")
+    with startup_phase("persistent views"):
+        await register_persistent_views()
+    readiness.set("gateway", True, f"{len(bot.guilds)} guild(s)")
     
-    # Register persistent views for existing wagers
+    phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items())
+    logger.info(f"Ready {time.perf_counter() - _PROCESS_STARTED:.2f}s after start ({phases})")
+
+
+@bot.event
+async def on_disconnect():
+    """Report not ready while the gateway connection is down."""
+    readiness.set("gateway", False, "disconnected")
+
+
+@bot.event
+async def on_resumed():
+    """Report ready again once the gateway session resumes."""
+    readiness.set("gateway", True, "resumed")
+
+
+async def register_persistent_views():
+    """Register persistent views for existing wagers."""
     try:
         from src.database.database import get_session
-        from src.database.models import Wager, WAGER_STATUS_OPEN
-        from sqlalchemy import select
+        from src.database.repository import list_open_wager_messages
+        from src.database.models import Wager
+        from sqlalchemy import update
         from src.cogs.betting import WagerOptionView
+        from src.utils.rest import rest_scheduler, PRIORITY_LOW
         
-        async with get_session() as session:
+        # The scan is read-only, so it can be served by the replica
+        async with get_session(readonly=True) as session:
             # Get all open wagers with pinned messages
-            result = await session.execute(
-                select(Wager)
-                .where(Wager.status == WAGER_STATUS_OPEN)
-                .where(Wager.message_id.isnot(None))
-                .where(Wager.channel_id.isnot(None))
-            )
-            wagers = result.scalars().all()
-            
-            registered_count = 0
-            for wager in wagers:
-                try:
-                    # Verify message still exists
-                    channel = bot.get_channel(wager.channel_id)
-                    if channel:
-                        try:
-                            message = await channel.fetch_message(wager.message_id)
-                            # Recreate and register the view
-                            view = WagerOptionView(wager.wager_id, wager.options, bot)
-                            bot.add_view(view, message_id=wager.message_id)
-                            registered_count += 1
-                        except discord.NotFound:
-                            logger.warning(f"Wager {wager.wager_id} message {wager.message_id} not found, clearing from database")
-                            wager.message_id = None
-                            wager.channel_id = None
-                            await session.commit()
-                        except discord.Forbidden:
-                            logger.warning(f"No permission to fetch message {wager.message_id} for wager {wager.wager_id}")
-                except Exception as e:
-                    logger.error(f"Error registering view for wager {wager.wager_id}: {e}")
-            
-            if registered_count > 0:
-                logger.info(f"Registered {registered_count} persistent view(s) for active wagers")
+            wagers = await list_open_wager_messages(session)
+        
+        registered_count = 0
+        stale_wager_ids = []
+        for wager in wagers:
+            try:
+                # Verify message still exists
+                channel = bot.get_channel(wager.channel_id)
+                if channel:
+                    try:
+                        message = await rest_scheduler.call(
+                            ("channel", channel.id),
+                            lambda: channel.fetch_message(wager.message_id),
+                            priority=PRIORITY_LOW
+                        )
+                        # Recreate and register the view
+                        view = WagerOptionView(wager.wager_id, wager.options, bot)
+                        bot.add_view(view, message_id=wager.message_id)
+                        registered_count += 1
+                    except discord.NotFound:
+                        logger.warning(f"Wager {wager.wager_id} message {wager.message_id} not found, clearing from database")
+                        stale_wager_ids.append(wager.wager_id)
+                    except discord.Forbidden:
+                        logger.warning(f"No permission to fetch message {wager.message_id} for wager {wager.wager_id}")
+            except Exception as e:
+                logger.error(f"Error registering view for wager {wager.wager_id}: {e}")
+        
+        if stale_wager_ids:
+            async with get_session() as session:
+                await session.execute(
+                    update(Wager)
+                    .where(Wager.wager_id.in_(stale_wager_ids))
+                    .values(message_id=None, channel_id=None)
+                )
+                await session.commit()
+        
+        if registered_count > 0:
+            logger.info(f"Registered {registered_count} persistent view(s) for active wagers")
     except Exception as e:
         logger.error(f"Failed to register persistent views: {e}", exc_info=True)
 
@@ -143,8 +237,56 @@ async def on_application_command_error(ctx, error):
         await ctx.response.send_message("❌ An unexpected error occurred. Please try again later.", ephemeral=True)
 
 
+async def profile_startup(max_seconds: float = None) -> int:
+    """Load every cog without connecting and print where start-up time goes.
+
+    The database layer is imported on its own first, so its cost isn't
+    charged to whichever cog happens to load first. Returns a non-zero exit
+    code when start-up took longer than ``max_seconds``.
+    """
+    async with bot:
+        modules_before = len(sys.modules)
+        with startup_phase("database layer"):
+            importlib.import_module("src.database.database")
+        with startup_phase("cogs"):
+            cog_timings = await load_cogs()
+        new_modules = len(sys.modules) - modules_before
+    
+    rows = [
+        ("imports (discord, config)", startup_timings["imports"]),
+        ("database layer (SQLAlchemy)", startup_timings["database layer"]),
+    ] + sorted(cog_timings.items(), key=lambda item: item[1], reverse=True)
+    total = sum(seconds for _, seconds in rows)
+    
+    print("Start-up profile (no gateway connection):")
+    for name, seconds in rows:
+        print(f"  {name:<30} {seconds * 1000:8.1f} ms")
+    print(f"  {'total':<30} {total * 1000:8.1f} ms ({new_modules} module(s) imported after the bot)")
+    
+    if max_seconds is not None and total > max_seconds:
+        print(f"Start-up took longer than the {max_seconds:.2f}s budget")
+        return 1
+    return 0
+
+
 def main():
     """Main entry point."""
+    parser = argparse.ArgumentParser(description="Discord Bits Wagering Bot")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="load every cog without connecting, print import and load timings, then exit"
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        help="with --profile-startup, exit with status 1 if start-up takes longer than this"
+    )
+    args = parser.parse_args()
+    
+    if args.profile_startup:
+        sys.exit(asyncio.run(profile_startup(args.max_seconds)))
+    
     if not config.DISCORD_TOKEN:
         logger.error("DISCORD_TOKEN not set in environment variables")
         return
@@ -3,18 +3,27 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import func
 from datetime import datetime
+import time
 from src import config
-from src.database.database import get_session, get_user, update_balance
+from src.database.database import get_session, get_balance, update_balance, bulk_update_balances
+from src.database.repository import get_wager, get_guild_settings, get_compile_cache_stats
+from src.database.economy import Rejected, close_wager, request_resolution
+from src.database.idempotency import idempotency_stats
 from src.database.models import (
-    Wager, Bet, WAGER_STATUS_OPEN, WAGER_STATUS_CLOSED, WAGER_STATUS_RESOLVED,
-    TRANSACTION_TYPE_BET_REFUNDED, TRANSACTION_TYPE_BET_WON, TRANSACTION_TYPE_ADMIN_ADJUSTMENT,
-    GuildSettings
+    Position, WAGER_STATUS_RESOLVING, WAGER_STATUS_RESOLVED,
+    WAGER_STATUS_VOIDED, TRANSACTION_TYPE_BET_REFUNDED, TRANSACTION_TYPE_ADMIN_ADJUSTMENT, GuildSettings
 )
-from src.utils.formatters import format_bits, format_wager_embed
-from src.cogs.betting import update_wager_message
-from sqlalchemy import select
+from src.utils.formatters import format_bits, format_bulk_operation_embed, render_stats
+from src.utils.validators import parse_balance_csv
+from src.utils.rest import rest_scheduler, send_followup
+from src.utils.responses import BudgetedResponder, response_stats
+from src.utils.ratelimit import rate_limit_stats
+from src.utils.odds import odds_book
+from src.utils.events import EVENT_CLOSE, EVENT_RESOLVE, record_event
+from src.cogs.betting import schedule_wager_refresh
+from src.cogs.wagers import get_creation_timings
 
 
 def is_admin(interaction: discord.Interaction) -> bool:
@@ -34,6 +43,7 @@ class AdminCog(commands.Cog):
         self.bot = bot
     
     @app_commands.command(name="resolve", description="Resolve a wager and distribute winnings (Admin only)")
+    @app_commands.guild_only()
     @app_commands.describe(
         wager_id="The ID of the wager to resolve",
         winning_option="The winning option number (1-based index)"
@@ -45,193 +55,61 @@ class AdminCog(commands.Cog):
         winning_option: int
     ):
         """Resolve a wager and distribute winnings."""
-        if not is_admin(interaction):
-            await interaction.response.send_message(
-                "❌ You don't have permission to use this command.",
-                ephemeral=True
-            )
-            return
+        async with BudgetedResponder(interaction, "resolve") as responder:
+            if not is_admin(interaction):
+                await responder.send(
+                    "❌ You don't have permission to use this command.",
+                    ephemeral=True
+                )
+                return
         
-        # Convert to 0-based index
-        option_index = winning_option - 1
-        if option_index < 0:
-            await interaction.response.send_message(
-                "❌ Option number must be at least 1.",
-                ephemeral=True
+            # Convert to 0-based index
+            option_index = winning_option - 1
+            record_event(
+                EVENT_RESOLVE, interaction.guild_id, interaction.user.id, wager=wager_id, option=option_index
             )
-            return
         
-        async with get_session() as session:
-            try:
-                # Get wager with bets
-                result = await session.execute(
-                    select(Wager)
-                    .options(selectinload(Wager.bets))
-                    .where(Wager.wager_id == wager_id)
-                )
-                wager = result.scalar_one_or_none()
-                
-                if not wager:
-                    await interaction.response.send_message(
-                        f"❌ Wager with ID {wager_id} not found.",
-                        ephemeral=True
-                    )
-                    return
-                
-                if wager.status == WAGER_STATUS_RESOLVED:
-                    await interaction.response.send_message(
-                        "❌ This wager has already been resolved.",
-                        ephemeral=True
-                    )
-                    return
-                
-                # Validate option index
-                if option_index >= len(wager.options):
-                    await interaction.response.send_message(
-                        f"❌ Invalid option. This wager has {len(wager.options)} option(s).",
-                        ephemeral=True
-                    )
-                    return
-                
-                # Check if there are any bets
-                if not wager.bets:
-                    await interaction.response.send_message(
-                        "❌ This wager has no bets. Cannot resolve.",
-                        ephemeral=True
-                    )
-                    return
-                
-                # Calculate pools
-                total_pool = sum(bet.amount for bet in wager.bets)
-                winning_bets = [bet for bet in wager.bets if bet.option_index == option_index]
-                losing_bets = [bet for bet in wager.bets if bet.option_index != option_index]
-                
-                if not winning_bets:
-                    # No winners - refund all bets
-                    await interaction.response.defer()
-                    
-                    for bet in wager.bets:
-                        await update_balance(
-                            session,
-                            bet.user_id,
-                            bet.amount,
-                            TRANSACTION_TYPE_BET_REFUNDED,
-                            reference_id=bet.bet_id
+            async with get_session() as session:
+                try:
+                    try:
+                        request = await request_resolution(
+                            session, interaction.guild_id, wager_id, option_index,
+                            channel_id=interaction.channel_id, requested_by=interaction.user.id
                         )
-                    
-                    wager.status = WAGER_STATUS_RESOLVED
-                    wager.winning_option = option_index
-                    wager.resolved_at = datetime.utcnow()
-                    await session.commit()
-                    
-                    # Update pinned message if it exists
-                    await update_wager_message(self.bot, wager_id)
-                    
-                    embed = discord.Embed(
-                        title="🎲 Wager Resolved",
-                        description=f"**{wager.title}**\n\nNo one bet on the winning option. All bets have been refunded.",
-                        color=discord.Color.orange()
-                    )
-                    embed.add_field(
-                        name="Winning Option",
-                        value=f"Option {winning_option}: {wager.options[option_index]}",
-                        inline=False
-                    )
-                    await interaction.followup.send(embed=embed)
-                    return
-                
-                # Calculate winning pool
-                winning_pool = sum(bet.amount for bet in winning_bets)
-                
-                # Distribute winnings proportionally
-                await interaction.response.defer()
+                    except Rejected as e:
+                        await session.rollback()
+                        await responder.send(str(e), ephemeral=True)
+                        return
                 
-                winners_info = []
-                for bet in winning_bets:
-                    # Calculate payout: (bet_amount / winning_pool) * total_pool
-                    payout = int((bet.amount / winning_pool) * total_pool)
-                    
-                    # Update balance
-                    new_balance = await update_balance(
-                        session,
-                        bet.user_id,
-                        payout,
-                        TRANSACTION_TYPE_BET_WON,
-                        reference_id=bet.bet_id
-                    )
-                    
-                    winners_info.append({
-                        "user_id": bet.user_id,
-                        "bet_amount": bet.amount,
-                        "payout": payout
-                    })
-                
-                # Update wager status
-                wager.status = WAGER_STATUS_RESOLVED
-                wager.winning_option = option_index
-                wager.resolved_at = datetime.utcnow()
-                await session.commit()
-                
-                # Update pinned message if it exists
-                await update_wager_message(self.bot, wager_id)
-                
-                # Create result embed
-                embed = discord.Embed(
-                    title="🎉 Wager Resolved!",
-                    description=f"**{wager.title}**",
-                    color=discord.Color.gold()
-                )
-                embed.add_field(
-                    name="🏆 Winning Option",
-                    value=f"Option {winning_option}: {wager.options[option_index]}",
-                    inline=False
-                )
-                embed.add_field(
-                    name="💰 Total Pool",
-                    value=format_bits(total_pool),
-                    inline=True
-                )
-                embed.add_field(
-                    name="👥 Winners",
-                    value=str(len(winning_bets)),
-                    inline=True
-                )
-                
-                # Add winner details (limit to first 10)
-                winners_text = ""
-                for winner in winners_info[:10]:
-                    user = self.bot.get_user(winner["user_id"])
-                    username = user.mention if user else f"User {winner['user_id']}"
-                    winners_text += (
-                        f"{username}: {format_bits(winner['bet_amount'])} bet → "
-                        f"{format_bits(winner['payout'])} won\n"
-                    )
+                    self._wake_job_worker()
+                    if request.resumed:
+                        await responder.send(
+                            f"⏳ Resuming resolution of wager #{wager_id} as job #{request.job.job_id}. "
+                            f"Progress will be posted here."
+                        )
+                        return
                 
-                if len(winners_info) > 10:
-                    winners_text += f"\n... and {len(winners_info) - 10} more winner(s)"
+                    schedule_wager_refresh(self.bot, wager_id)
                 
-                if winners_text:
-                    embed.add_field(
-                        name="🎯 Winners",
-                        value=winners_text,
-                        inline=False
+                    await responder.send(
+                        f"⏳ Resolution of wager #{wager_id} queued as job #{request.job.job_id} "
+                        f"(winning option {winning_option}: {request.wager.options[option_index]}). "
+                        f"Progress will be posted here."
                     )
                 
-                await interaction.followup.send(embed=embed)
-                
-            except Exception as e:
-                await session.rollback()
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(
-                        f"❌ Error resolving wager: {str(e)}",
-                        ephemeral=True
-                    )
-                else:
-                    await interaction.followup.send(
+                except Exception as e:
+                    await session.rollback()
+                    await responder.send(
                         f"❌ Error resolving wager: {str(e)}",
                         ephemeral=True
                     )
     
+    def _wake_job_worker(self):
+        """Tell the job worker there is work, if it's loaded."""
+        jobs_cog = self.bot.get_cog("JobsCog")
+        if jobs_cog is not None:
+            jobs_cog.wake()
+    
     @app_commands.command(name="admin", description="Admin commands")
     async def admin(self, interaction: discord.Interaction):
         """Admin command group placeholder."""
@@ -241,6 +119,7 @@ class AdminCog(commands.Cog):
         )
     
     @app_commands.command(name="admin_balance", description="Adjust a user's balance (Admin only)")
+    @app_commands.guild_only()
     @app_commands.describe(
         user="The user whose balance to adjust",
         amount="The amount to add (positive) or subtract (negative)"
@@ -268,16 +147,16 @@ class AdminCog(commands.Cog):
         
         async with get_session() as session:
             try:
-                target_user = await get_user(session, user.id)
-                old_balance = target_user.bits_balance
+                old_balance = await get_balance(session, interaction.guild_id, user.id)
                 
-                new_balance = await update_balance(
+                new_balance = (await update_balance(
                     session,
+                    interaction.guild_id,
                     user.id,
                     amount,
                     TRANSACTION_TYPE_ADMIN_ADJUSTMENT,
                     reference_id=None
-                )
+                )).balance
                 
                 embed = discord.Embed(
                     title="💰 Balance Adjusted",
@@ -297,10 +176,19 @@ class AdminCog(commands.Cog):
                     ephemeral=True
                 )
     
-    @app_commands.command(name="admin_close", description="Close a wager to prevent new bets (Admin only)")
-    @app_commands.describe(wager_id="The ID of the wager to close")
-    async def admin_close(self, interaction: discord.Interaction, wager_id: int):
-        """Close a wager to prevent new bets."""
+    @app_commands.command(name="admin_balance_role", description="Adjust the balance of every member of a role (Admin only)")
+    @app_commands.guild_only()
+    @app_commands.describe(
+        role="The role whose members' balances to adjust",
+        amount="The amount to add (positive) or subtract (negative) for each member"
+    )
+    async def admin_balance_role(
+        self,
+        interaction: discord.Interaction,
+        role: discord.Role,
+        amount: int
+    ):
+        """Adjust the balance of every member of a role."""
         if not is_admin(interaction):
             await interaction.response.send_message(
                 "❌ You don't have permission to use this command.",
@@ -308,12 +196,130 @@ class AdminCog(commands.Cog):
             )
             return
         
+        if amount == 0:
+            await interaction.response.send_message(
+                "❌ Amount cannot be zero.",
+                ephemeral=True
+            )
+            return
+        
+        adjustments = {member.id: amount for member in role.members if not member.bot}
+        if not adjustments:
+            await interaction.response.send_message(
+                f"❌ {role.mention} has no members to adjust.",
+                ephemeral=True
+            )
+            return
+        
+        await interaction.response.defer()
+        
         async with get_session() as session:
             try:
-                result = await session.execute(
-                    select(Wager).where(Wager.wager_id == wager_id)
+                started = time.perf_counter()
+                rows = await bulk_update_balances(
+                    session,
+                    interaction.guild_id,
+                    adjustments,
+                    TRANSACTION_TYPE_ADMIN_ADJUSTMENT
                 )
-                wager = result.scalar_one_or_none()
+                elapsed = time.perf_counter() - started
+                
+                embed = format_bulk_operation_embed("💰 Role Balances Adjusted", rows, amount * rows, elapsed)
+                embed.add_field(name="Role", value=role.mention, inline=False)
+                embed.set_footer(text=f"Adjusted by {interaction.user.name}")
+                await send_followup(interaction, embed=embed)
+                
+            except Exception as e:
+                await session.rollback()
+                await interaction.followup.send(
+                    f"❌ Error adjusting balances: {str(e)}",
+                    ephemeral=True
+                )
+    
+    @app_commands.command(name="admin_balance_csv", description="Adjust balances from a user_id,amount CSV file (Admin only)")
+    @app_commands.guild_only()
+    @app_commands.describe(file="A CSV file with user_id,amount rows")
+    async def admin_balance_csv(
+        self,
+        interaction: discord.Interaction,
+        file: discord.Attachment
+    ):
+        """Adjust balances from an attached CSV file."""
+        if not is_admin(interaction):
+            await interaction.response.send_message(
+                "❌ You don't have permission to use this command.",
+                ephemeral=True
+            )
+            return
+        
+        await interaction.response.defer()
+        
+        try:
+            content = (await file.read()).decode("utf-8-sig")
+        except (discord.HTTPException, UnicodeDecodeError) as e:
+            await interaction.followup.send(
+                f"❌ Could not read {file.filename}: {str(e)}",
+                ephemeral=True
+            )
+            return
+        
+        adjustments, errors = parse_balance_csv(content)
+        if errors:
+            error_text = "\n".join(errors[:10])
+            if len(errors) > 10:
+                error_text += f"\n... and {len(errors) - 10} more error(s)"
+            await interaction.followup.send(
+                f"❌ {file.filename} contains invalid rows. No balances were changed.\n{error_text}",
+                ephemeral=True
+            )
+            return
+        
+        if not any(adjustments.values()):
+            await interaction.followup.send(
+                f"❌ {file.filename} contains no non-zero adjustments.",
+                ephemeral=True
+            )
+            return
+        
+        async with get_session() as session:
+            try:
+                started = time.perf_counter()
+                rows = await bulk_update_balances(
+                    session,
+                    interaction.guild_id,
+                    adjustments,
+                    TRANSACTION_TYPE_ADMIN_ADJUSTMENT
+                )
+                elapsed = time.perf_counter() - started
+                
+                embed = format_bulk_operation_embed("💰 Balances Adjusted from CSV", rows, sum(adjustments.values()), elapsed)
+                embed.add_field(name="File", value=file.filename, inline=False)
+                embed.set_footer(text=f"Adjusted by {interaction.user.name}")
+                await send_followup(interaction, embed=embed)
+                
+            except Exception as e:
+                await session.rollback()
+                await interaction.followup.send(
+                    f"❌ Error adjusting balances: {str(e)}",
+                    ephemeral=True
+                )
+    
+    @app_commands.command(name="admin_void", description="Void a wager and refund all bets (Admin only)")
+    @app_commands.guild_only()
+    @app_commands.describe(wager_id="The ID of the wager to void")
+    async def admin_void(self, interaction: discord.Interaction, wager_id: int):
+        """Void a wager and refund every bet in one transaction."""
+        if not is_admin(interaction):
+            await interaction.response.send_message(
+                "❌ You don't have permission to use this command.",
+                ephemeral=True
+            )
+            return
+        
+        async with get_session() as session:
+            try:
+                # Lock the wager so it can't be resolved or voided concurrently
+                wager = await get_wager(session, wager_id, interaction.guild_id, for_update=True)
                 
                 if not wager:
                     await interaction.response.send_message(
@@ -322,18 +328,88 @@ class AdminCog(commands.Cog):
                     )
                     return
                 
-                if wager.status != WAGER_STATUS_OPEN:
+                if wager.status in (WAGER_STATUS_RESOLVING, WAGER_STATUS_RESOLVED, WAGER_STATUS_VOIDED):
                     await interaction.response.send_message(
                         f"❌ This wager is already {wager.status}.",
                         ephemeral=True
                     )
                     return
                 
-                wager.status = WAGER_STATUS_CLOSED
-                await session.commit()
+                await interaction.response.defer()
+                
+                # Refund each user's total stake
+                refunds_result = await session.execute(
+                    select(Position.user_id, func.sum(Position.amount))
+                    .where(Position.wager_id == wager_id)
+                    .group_by(Position.user_id)
+                )
+                refunds = {user_id: int(total) for user_id, total in refunds_result.all()}
+                
+                wager.status = WAGER_STATUS_VOIDED
+                wager.resolved_at = datetime.utcnow()
+                
+                started = time.perf_counter()
+                if refunds:
+                    rows = await bulk_update_balances(
+                        session,
+                        wager.guild_id,
+                        refunds,
+                        TRANSACTION_TYPE_BET_REFUNDED,
+                        reference_id=wager_id
+                    )
+                else:
+                    rows = 0
+                    await session.commit()
+                elapsed = time.perf_counter() - started
+                # Only drop the cached pools once the void is committed; the
+                # wager lock kept bets out until then
+                odds_book.discard(wager_id)
+                
+                # Refresh the pinned message in the background, off the response path
+                schedule_wager_refresh(self.bot, wager_id)
                 
-                # Update pinned message if it exists
-                await update_wager_message(self.bot, wager_id)
+                embed = format_bulk_operation_embed("🚫 Wager Voided", rows, sum(refunds.values()), elapsed)
+                embed.description = f"**{wager.title}**\n\nThis wager has been voided and all bets have been refunded."
+                embed.color = discord.Color.orange()
+                await send_followup(interaction, embed=embed)
+                
+            except Exception as e:
+                await session.rollback()
+                if not interaction.response.is_done():
+                    await interaction.response.send_message(
+                        f"❌ Error voiding wager: {str(e)}",
+                        ephemeral=True
+                    )
+                else:
+                    await interaction.followup.send(
+                        f"❌ Error voiding wager: {str(e)}",
+                        ephemeral=True
+                    )
+    
+    @app_commands.command(name="admin_close", description="Close a wager to prevent new bets (Admin only)")
+    @app_commands.guild_only()
+    @app_commands.describe(wager_id="The ID of the wager to close")
+    async def admin_close(self, interaction: discord.Interaction, wager_id: int):
+        """Close a wager to prevent new bets."""
+        if not is_admin(interaction):
+            await interaction.response.send_message(
+                "❌ You don't have permission to use this command.",
+                ephemeral=True
+            )
+            return
+        
+        record_event(EVENT_CLOSE, interaction.guild_id, interaction.user.id, wager=wager_id)
+        async with get_session() as session:
+            try:
+                try:
+                    wager = await close_wager(session, interaction.guild_id, wager_id)
+                except Rejected as e:
+                    await session.rollback()
+                    await interaction.response.send_message(str(e), ephemeral=True)
+                    return
+                
+                # Refresh the pinned message in the background, off the response path
+                schedule_wager_refresh(self.bot, wager_id)
                 
                 embed = discord.Embed(
                     title="🔒 Wager Closed",
@@ -349,7 +425,115 @@ class AdminCog(commands.Cog):
                     ephemeral=True
                 )
     
+    @app_commands.command(name="admin_stats", description="Show bot performance counters (Admin only)")
+    async def admin_stats(self, interaction: discord.Interaction):
+        """Show bot performance counters."""
+        if not is_admin(interaction):
+            await interaction.response.send_message(
+                "❌ You don't have permission to use this command.",
+                ephemeral=True
+            )
+            return
+        
+        embed = discord.Embed(
+            title="📈 Bot Statistics",
+            color=discord.Color.blue()
+        )
+        
+        cache_stats = get_compile_cache_stats()
+        embed.add_field(
+            name="SQL Compile Cache",
+            value=(
+                f"Hits: {cache_stats.get('cache_hit', 0):,}\n"
+                f"Misses: {cache_stats.get('cache_miss', 0):,}\n"
+                f"Hit Ratio: {cache_stats['hit_ratio']:.1%}"
+            ),
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Wager Embeds",
+            value=(
+                f"Renders: {render_stats['renders']:,}\n"
+                f"Render Cache Misses: {render_stats['cache_misses']:,}\n"
+                f"Edits: {render_stats['edits']:,}\n"
+                f"Skipped Edits: {render_stats['skipped_edits']:,}"
+            ),
+            inline=True
+        )
+        
+        rest_metrics = rest_scheduler.get_metrics()
+        embed.add_field(
+            name="Discord REST Queue",
+            value=(
+                f"Depth: {rest_metrics['depth_high']} high / {rest_metrics['depth_low']} low\n"
+                f"Wait p95: {rest_metrics['wait_p95_high'] * 1000:.0f}ms high / {rest_metrics['wait_p95_low'] * 1000:.0f}ms low\n"
+                f"Coalesced: {rest_metrics.get('coalesced', 0):,}\n"
+                f"Rate Limited: {rest_metrics.get('rate_limited', 0):,}"
+            ),
+            inline=False
+        )
+        
+        creation_lines = [
+            f"{stage}: p50 {timing['p50'] * 1000:.0f}ms / p95 {timing['p95'] * 1000:.0f}ms"
+            for stage, timing in get_creation_timings().items()
+            if timing["count"]
+        ]
+        embed.add_field(
+            name="Wager Creation",
+            value="\n".join(creation_lines) or "No wagers created yet",
+            inline=False
+        )
+        
+        embed.add_field(
+            name="Idempotency",
+            value=(
+                f"Claimed: {idempotency_stats['claimed']:,}\n"
+                f"Duplicates: {idempotency_stats['duplicates_memory']:,} memory / {idempotency_stats['duplicates_db']:,} db\n"
+                f"Purged: {idempotency_stats['purged']:,}"
+            ),
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Odds Cache",
+            value=(
+                f"Hits: {odds_book.stats['hits']:,}\n"
+                f"Misses: {odds_book.stats['misses']:,}\n"
+                f"Bets Recorded: {odds_book.stats['bets_recorded']:,}"
+            ),
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Rate Limits",
+            value=(
+                f"Allowed: {rate_limit_stats['allowed']:,}\n"
+                f"Rejected: {rate_limit_stats['rejected_user']:,} user / "
+                f"{rate_limit_stats['rejected_guild']:,} guild / {rate_limit_stats['rejected_wager']:,} wager"
+            ),
+            inline=True
+        )
+        
+        overrun_lines = []
+        for key, count in sorted(response_stats.items()):
+            command, _, counter = key.rpartition(".")
+            if counter == "responses":
+                overrun_lines.append(
+                    f"/{command}: {count:,} responses, "
+                    f"{response_stats[f'{command}.deferred']:,} deferred, "
+                    f"{response_stats[f'{command}.overruns']:,} over budget"
+                )
+        embed.add_field(
+            name="Response Budget",
+            value="\n".join(overrun_lines) or "No budgeted responses yet",
+            inline=False
+        )
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
     @app_commands.command(name="set_wager_channel", description="View or set the wager channel (Admin only)")
+    @app_commands.guild_only()
     @app_commands.describe(channel="The channel where wagers will be posted (optional - leave empty to view current)")
     async def set_wager_channel(
         self,
@@ -384,10 +568,7 @@ class AdminCog(commands.Cog):
             # Store in database
             async with get_session() as session:
                 try:
-                    result = await session.execute(
-                        select(GuildSettings).where(GuildSettings.guild_id == interaction.guild.id)
-                    )
-                    guild_settings = result.scalar_one_or_none()
+                    guild_settings = await get_guild_settings(session, interaction.guild.id)
                     
                     if not guild_settings:
                         guild_settings = GuildSettings(
@@ -433,10 +614,7 @@ class AdminCog(commands.Cog):
             async with get_session() as session:
                 try:
                     # Check database first
-                    result = await session.execute(
-                        select(GuildSettings).where(GuildSettings.guild_id == interaction.guild.id)
-                    )
-                    guild_settings = result.scalar_one_or_none()
+                    guild_settings = await get_guild_settings(session, interaction.guild.id)
                     
                     current_channel = None
                     channel_source = None
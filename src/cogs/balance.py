@@ -1,68 +1,168 @@
 """Balance management cog for Discord Bits Wagering Bot."""
+import logging
 import discord
 from discord.ext import commands
 from discord import app_commands
-from datetime import datetime, timedelta
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+import asyncio
 from src import config
-from src.database.database import get_session, get_user, update_balance
-from src.database.models import TRANSACTION_TYPE_DAILY_REWARD
+from src.database.database import get_session, get_balance
+from src.database.economy import Rejected, claim_daily
+from src.database.idempotency import claim_interaction, purge_processed_interactions
+from src.utils.events import EVENT_DAILY, record_event
 from src.utils.formatters import format_bits, format_balance_embed
 
+logger = logging.getLogger(__name__)
+
 
 class BalanceCog(commands.Cog):
     """Cog for managing user balances and daily rewards."""
     
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.scheduler = None
+        self._scheduler_start = None
+    
+    async def cog_load(self):
+        # Maintenance jobs aren't needed to answer commands, so start them once connected
+        self._scheduler_start = asyncio.create_task(self._start_scheduler())
+    
+    async def cog_unload(self):
+        if self._scheduler_start:
+            self._scheduler_start.cancel()
+        if self.scheduler:
+            self.scheduler.shutdown(wait=False)
+    
+    async def _start_scheduler(self):
+        """Import APScheduler and schedule the maintenance jobs after the bot is ready."""
+        await self.bot.wait_until_ready()
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        from apscheduler.triggers.cron import CronTrigger
+        from apscheduler.triggers.interval import IntervalTrigger
+        
         self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_job(
+            self.purge_processed_interactions,
+            IntervalTrigger(hours=1),
+            id="purge_processed_interactions",
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            self.archive_settled_wagers,
+            CronTrigger(hour=4, minute=0),
+            id="archive_settled_wagers",
+            replace_existing=True,
+            max_instances=1
+        )
+        self.scheduler.add_job(
+            self.aggregate_stats,
+            IntervalTrigger(seconds=config.STATS_AGGREGATE_SECONDS),
+            id="aggregate_stats",
+            replace_existing=True,
+            max_instances=1
+        )
+        # Runs in both balance modes, so entries left behind after ledger mode is switched off still drain
+        self.scheduler.add_job(
+            self.compact_ledger,
+            IntervalTrigger(seconds=config.LEDGER_COMPACT_SECONDS),
+            id="compact_ledger",
+            replace_existing=True,
+            max_instances=1
+        )
+        if config.RECONCILE_INTERVAL_HOURS > 0:
+            self.scheduler.add_job(
+                self.reconcile_balances,
+                IntervalTrigger(hours=config.RECONCILE_INTERVAL_HOURS),
+                id="reconcile_balances",
+                replace_existing=True,
+                max_instances=1
+            )
         self.scheduler.start()
     
+    async def purge_processed_interactions(self):
+        """Drop expired idempotency records."""
+        try:
+            async with get_session() as session:
+                purged = await purge_processed_interactions(session)
+            if purged:
+                logger.info(f"Purged {purged} expired processed interaction(s)")
+        except Exception as e:
+            logger.error(f"Failed to purge processed interactions: {e}")
+    
+    async def archive_settled_wagers(self):
+        """Move long-settled wagers out of the hot tables."""
+        from src.database.archive import archive_settled_wagers
+        try:
+            await archive_settled_wagers()
+        except Exception as e:
+            logger.error(f"Failed to archive settled wagers: {e}")
+    
+    async def aggregate_stats(self):
+        """Fold new transactions into the statistics rollups."""
+        from src.database.stats import run_stats_aggregator
+        try:
+            await run_stats_aggregator()
+        except Exception as e:
+            logger.error(f"Failed to aggregate statistics: {e}")
+    
+    async def compact_ledger(self):
+        """Fold pending ledger entries into the balance snapshots."""
+        from src.database.ledger import run_ledger_compactor
+        try:
+            await run_ledger_compactor()
+        except Exception as e:
+            logger.error(f"Failed to compact the balance ledger: {e}")
+    
+    async def reconcile_balances(self):
+        """Check balances against the transaction log, repairing drift if configured to."""
+        from src.database.reconcile import reconcile_balances
+        try:
+            await reconcile_balances(repair_drift=config.RECONCILE_REPAIR)
+        except Exception as e:
+            logger.error(f"Failed to reconcile balances: {e}")
+    
     @app_commands.command(name="balance", description="Check your bits balance")
+    @app_commands.guild_only()
     async def balance(self, interaction: discord.Interaction):
         """Check user's bits balance."""
-        async with get_session() as session:
-            try:
-                user = await get_user(session, interaction.user.id)
-                embed = format_balance_embed(user, user.bits_balance)
-                await interaction.response.send_message(embed=embed)
-            except Exception as e:
-                await interaction.response.send_message(
-                    f"❌ Error retrieving balance: {str(e)}",
-                    ephemeral=True
-                )
+        try:
+            async with get_session(readonly=True, user_id=interaction.user.id) as session:
+                balance = await get_balance(session, interaction.guild_id, interaction.user.id, create=False)
+            
+            if balance is None:
+                # First visit: create the user on the primary
+                async with get_session() as session:
+                    balance = await get_balance(session, interaction.guild_id, interaction.user.id)
+            
+            embed = format_balance_embed(interaction.user.id, balance)
+            await interaction.response.send_message(embed=embed)
+        except Exception as e:
+            await interaction.response.send_message(
+                f"❌ Error retrieving balance: {str(e)}",
+                ephemeral=True
+            )
     
     @app_commands.command(name="daily", description="Claim your daily reward of bits")
+    @app_commands.guild_only()
     async def daily(self, interaction: discord.Interaction):
         """Claim daily reward."""
         async with get_session() as session:
             try:
-                user = await get_user(session, interaction.user.id)
+                # Reject a redelivered command before touching balances
+                if not await claim_interaction(session, interaction.id, "daily", interaction.user.id):
+                    await interaction.response.send_message(
+                        "⚠️ This daily reward claim was already processed.",
+                        ephemeral=True
+                    )
+                    return
                 
-                # Check if user can claim daily reward
-                now = datetime.utcnow()
-                if user.last_daily_reward:
-                    time_since_last = now - user.last_daily_reward
-                    if time_since_last < timedelta(days=1):
-                        hours_remaining = 24 - (time_since_last.total_seconds() / 3600)
-                        await interaction.response.send_message(
-                            f"⏰ You've already claimed your daily reward today! "
-                            f"Come back in {int(hours_remaining)} hours.",
-                            ephemeral=True
-                        )
-                        return
+                record_event(EVENT_DAILY, interaction.guild_id, interaction.user.id)
                 
-                # Update last daily reward time
-                user.last_daily_reward = now
-                
-                # Add daily reward
-                new_balance = await update_balance(
-                    session,
-                    interaction.user.id,
-                    config.DAILY_REWARD_AMOUNT,
-                    TRANSACTION_TYPE_DAILY_REWARD
-                )
+                try:
+                    new_balance = await claim_daily(session, interaction.guild_id, interaction.user.id)
+                except Rejected as e:
+                    await session.rollback()
+                    await interaction.response.send_message(str(e), ephemeral=True)
+                    return
                 
                 embed = discord.Embed(
                     title="🎁 Daily Reward Claimed!",
@@ -1,18 +1,27 @@
 """Betting cog for Discord Bits Wagering Bot."""
+import asyncio
+import copy
+from collections import OrderedDict
 import discord
 from discord.ext import commands
 from discord import app_commands
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 from src import config
 import logging
-from src.database.database import get_session, get_user, update_balance
-from src.database.models import (
-    Wager, Bet, WAGER_STATUS_OPEN, WAGER_STATUS_RESOLVED,
-    TRANSACTION_TYPE_BET_PLACED, TRANSACTION_TYPE_BET_WON, TRANSACTION_TYPE_BET_REFUNDED
+from src.database.database import get_session
+from src.database.economy import Rejected, place_wager_bet
+from src.database.idempotency import claim_interaction
+from src.database.repository import (
+    get_wager, get_wager_status, get_wager_options, get_option_totals, list_user_open_bets
+)
+from src.database.models import WAGER_STATUS_OPEN
+from src.utils.events import EVENT_BET, record_event
+from src.utils.rest import rest_scheduler, PRIORITY_LOW
+from src.utils.ratelimit import check_rate_limit
+from src.utils.odds import WagerPools, odds_book
+from src.utils.responses import BudgetedResponder
+from src.utils.formatters import (
+    format_bet_embed, format_bits, format_odds_embed, render_wager_embed, render_stats, wager_render_state
 )
-from src.utils.validators import validate_bet_amount
-from src.utils.formatters import format_bet_embed, format_bits, format_wager_embed
 
 logger = logging.getLogger(__name__)
 
@@ -20,11 +29,18 @@ logger = logging.getLogger(__name__)
 class BetAmountModal(discord.ui.Modal, title="Place Your Bet"):
     """Modal for entering bet amount."""
     
-    def __init__(self, wager_id: int, option_index: int, bot: commands.Bot):
+    def __init__(self, wager_id: int, option_index: int, bot: commands.Bot, pools: WagerPools = None):
         super().__init__()
         self.wager_id = wager_id
         self.option_index = option_index
         self.bot = bot
+        if pools is not None:
+            # Show what a typical bet would win at the current odds
+            example = max(config.MIN_BET_AMOUNT, 100)
+            payout = pools.preview(option_index, example, config.HOUSE_RAKE_BPS)
+            self.amount.placeholder = (
+                f"Minimum {config.MIN_BET_AMOUNT}. Right now {example:,} bits would win {payout:,} bits"
+            )
     
     amount = discord.ui.TextInput(
         label="Bet Amount",
@@ -34,130 +50,74 @@ class BetAmountModal(discord.ui.Modal, title="Place Your Bet"):
         max_length=10
     )
     
+    # Not rate-limited: the button press that opened the modal already paid for the bet
+
     async def on_submit(self, interaction: discord.Interaction):
         """Handle modal submission."""
-        try:
-            amount = int(self.amount.value)
-        except ValueError:
-            await interaction.response.send_message(
-                "❌ Invalid amount. Please enter a number.",
-                ephemeral=True
-            )
-            return
-        
-        # Validate bet amount
-        is_valid, error_msg = validate_bet_amount(amount)
-        if not is_valid:
-            await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
-            return
-        
-        # Place the bet
-        async with get_session() as session:
+        async with BudgetedResponder(interaction, "bet_modal") as responder:
             try:
-                # Get wager
-                result = await session.execute(
-                    select(Wager)
-                    .where(Wager.wager_id == self.wager_id)
+                amount = int(self.amount.value)
+            except ValueError:
+                await responder.send(
+                    "❌ Invalid amount. Please enter a number.",
+                    ephemeral=True
                 )
-                wager = result.scalar_one_or_none()
-                
-                if not wager:
-                    await interaction.response.send_message(
-                        f"❌ Wager not found.",
-                        ephemeral=True
+                return
+        
+            # Place the bet
+            async with get_session() as session:
+                try:
+                    # Reject a redelivered submission before touching balances
+                    if not await claim_interaction(session, interaction.id, "bet_modal", interaction.user.id):
+                        await responder.send(
+                            "⚠️ This bet submission was already processed.",
+                            ephemeral=True
+                        )
+                        return
+                    record_event(
+                        EVENT_BET, interaction.guild_id, interaction.user.id,
+                        wager=self.wager_id, option=self.option_index, amount=amount
                     )
-                    return
                 
-                # Check wager status
-                if wager.status != WAGER_STATUS_OPEN:
-                    await interaction.response.send_message(
-                        f"❌ This wager is {wager.status}. You cannot place bets on it.",
-                        ephemeral=True
+                    try:
+                        bet = await place_wager_bet(
+                            session, interaction.guild_id, self.wager_id, interaction.user.id, self.option_index, amount
+                        )
+                    except Rejected as e:
+                        await session.rollback()
+                        await responder.send(str(e), ephemeral=True)
+                        return
+                    position = bet.position
+                
+                    # Refresh the pinned message in the background, off the response path
+                    schedule_wager_refresh(self.bot, self.wager_id)
+                
+                    embed = format_bet_embed(position, bet.wager, amount)
+                    embed.add_field(
+                        name="New Balance",
+                        value=format_bits(bet.balance),
+                        inline=False
                     )
-                    return
-                
-                # Get user and check balance
-                user = await get_user(session, interaction.user.id)
-                if user.bits_balance < amount:
-                    await interaction.response.send_message(
-                        f"❌ Insufficient balance. You have {format_bits(user.bits_balance)}, but need {format_bits(amount)}.",
+                    pools = odds_book.get(bet.wager.wager_id)
+                    if pools is not None:
+                        embed.add_field(
+                            name="Payout If It Wins Now",
+                            value=format_bits(pools.preview(position.option_index, position.amount, config.HOUSE_RAKE_BPS, included=True)),
+                            inline=False
+                        )
+                    await responder.send(
+                        "✅ Bet placed successfully!" if position.bet_count == 1 else "✅ Bet topped up!",
+                        embed=embed,
                         ephemeral=True
                     )
-                    return
                 
-                # Check if user already bet on this wager
-                existing_bet_result = await session.execute(
-                    select(Bet)
-                    .where(Bet.wager_id == self.wager_id)
-                    .where(Bet.user_id == interaction.user.id)
-                )
-                existing_bet = existing_bet_result.scalar_one_or_none()
-                
-                if existing_bet:
-                    await interaction.response.send_message(
-                        f"❌ You've already placed a bet on this wager (Option {existing_bet.option_index + 1}, {format_bits(existing_bet.amount)}).",
+                except Exception as e:
+                    await session.rollback()
+                    logger.error(f"Error placing bet: {e}", exc_info=True)
+                    await responder.send(
+                        f"❌ Error placing bet: {str(e)}",
                         ephemeral=True
                     )
-                    return
-                
-                # Deduct balance
-                await update_balance(
-                    session,
-                    interaction.user.id,
-                    -amount,
-                    TRANSACTION_TYPE_BET_PLACED,
-                    reference_id=None
-                )
-                
-                # Create bet
-                bet = Bet(
-                    wager_id=self.wager_id,
-                    user_id=interaction.user.id,
-                    option_index=self.option_index,
-                    amount=amount
-                )
-                session.add(bet)
-                await session.commit()
-                await session.refresh(bet)
-                
-                # Update transaction reference
-                from src.database.models import Transaction
-                transaction_result = await session.execute(
-                    select(Transaction)
-                    .where(Transaction.user_id == interaction.user.id)
-                    .where(Transaction.transaction_type == TRANSACTION_TYPE_BET_PLACED)
-                    .order_by(Transaction.created_at.desc())
-                    .limit(1)
-                )
-                transaction = transaction_result.scalar_one()
-                transaction.reference_id = bet.bet_id
-                await session.commit()
-                
-                # Get updated balance
-                user = await get_user(session, interaction.user.id)
-                
-                # Update pinned message if it exists
-                await update_wager_message(self.bot, self.wager_id)
-                
-                embed = format_bet_embed(bet, wager)
-                embed.add_field(
-                    name="New Balance",
-                    value=format_bits(user.bits_balance),
-                    inline=False
-                )
-                await interaction.response.send_message(
-                    f"✅ Bet placed successfully!",
-                    embed=embed,
-                    ephemeral=True
-                )
-                
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"Error placing bet: {e}", exc_info=True)
-                await interaction.response.send_message(
-                    f"❌ Error placing bet: {str(e)}",
-                    ephemeral=True
-                )
 
 
 class WagerOptionView(discord.ui.View):
@@ -181,16 +141,16 @@ class WagerOptionView(discord.ui.View):
             button.callback = self.create_option_callback(idx)
             self.add_item(button)
     
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Rate-limit button presses before any database work."""
+        return await check_rate_limit(interaction, self.wager_id)
+    
     def create_option_callback(self, option_index: int):
         """Create a callback function for an option button."""
         async def callback(interaction: discord.Interaction):
-            # Check if wager is still open
+            # Check if wager is still open (status only, no full row)
             async with get_session() as session:
-                result = await session.execute(
-                    select(Wager)
-                    .where(Wager.wager_id == self.wager_id)
-                )
-                wager = result.scalar_one_or_none()
+                wager = await get_wager_status(session, interaction.guild_id, self.wager_id)
                 
                 if not wager:
                     await interaction.response.send_message(
@@ -206,28 +166,77 @@ class WagerOptionView(discord.ui.View):
                     )
                     return
                 
-                # Show modal for bet amount
-                modal = BetAmountModal(self.wager_id, option_index, self.bot)
+                # Show modal for bet amount, with a payout preview from the live pools
+                pools = await get_wager_pools(self.wager_id, len(self.options), session)
+                modal = BetAmountModal(self.wager_id, option_index, self.bot, pools)
                 await interaction.response.send_modal(modal)
         
         return callback
 
 
+async def get_wager_pools(wager_id: int, option_count: int, session=None) -> WagerPools:
+    """Get a wager's live pools, loading them from the database on a cache miss."""
+    pools = odds_book.get(wager_id)
+    if pools is not None:
+        return pools
+    
+    odds_book.begin_warm(wager_id)
+    try:
+        if session is None:
+            async with get_session() as session:
+                rows = await get_option_totals(session, wager_id)
+        else:
+            rows = await get_option_totals(session, wager_id)
+    except Exception:
+        odds_book.cancel_warm(wager_id)
+        raise
+    return odds_book.finish_warm(wager_id, option_count, rows)
+
+
+# Messages whose last edit is remembered; a forgotten one costs one redundant edit
+EDIT_DIGESTS_KEPT = 5000
+
+# message_id -> digest of the embed and button state last sent to that message,
+# least recently used first
+_last_edit_digests = OrderedDict()
+
+
+def _remember_edit(message_id: int, digest):
+    """Record what a message now shows, forgetting the least recently used messages."""
+    _last_edit_digests[message_id] = digest
+    _last_edit_digests.move_to_end(message_id)
+    while len(_last_edit_digests) > EDIT_DIGESTS_KEPT:
+        _last_edit_digests.popitem(last=False)
+
+
 async def update_wager_message(bot: commands.Bot, wager_id: int):
-    """Update the pinned wager message with latest betting statistics."""
+    """Update the pinned wager message with latest betting statistics.
+
+    The edit (and the message fetch before it) is skipped when the rendered
+    embed and button state are identical to what the message already shows.
+    """
     async with get_session() as session:
         try:
-            # Get wager with bets
-            result = await session.execute(
-                select(Wager)
-                .options(selectinload(Wager.bets))
-                .where(Wager.wager_id == wager_id)
-            )
-            wager = result.scalar_one_or_none()
+            wager = await get_wager(session, wager_id)
             
             if not wager or not wager.message_id or not wager.channel_id:
                 return  # No pinned message to update
             
+            # Per-option totals are kept on the option rows, so this is one indexed read
+            options = await get_wager_options(session, wager_id)
+            
+            # Render (cached by state) and skip the edit if nothing visible changed
+            buttons_enabled = wager.status == WAGER_STATUS_OPEN
+            embed_dict, embed_digest = render_wager_embed(
+                wager_render_state(wager, options, show_stats=True)
+            )
+            render_stats["renders"] += 1
+            digest = (embed_digest, buttons_enabled)
+            if _last_edit_digests.get(wager.message_id) == digest:
+                _last_edit_digests.move_to_end(wager.message_id)
+                render_stats["skipped_edits"] += 1
+                return
+            
             # Get channel and message
             channel = bot.get_channel(wager.channel_id)
             if not channel:
@@ -235,9 +244,14 @@ async def update_wager_message(bot: commands.Bot, wager_id: int):
                 return
             
             try:
-                message = await channel.fetch_message(wager.message_id)
+                message = await rest_scheduler.call(
+                    ("channel", channel.id),
+                    lambda: channel.fetch_message(wager.message_id),
+                    priority=PRIORITY_LOW
+                )
             except discord.NotFound:
                 logger.warning(f"Message {wager.message_id} not found for wager {wager_id}")
+                _last_edit_digests.pop(wager.message_id, None)
                 # Clear message_id from database
                 wager.message_id = None
                 wager.channel_id = None
@@ -247,30 +261,54 @@ async def update_wager_message(bot: commands.Bot, wager_id: int):
                 logger.warning(f"No permission to fetch message {wager.message_id} for wager {wager_id}")
                 return
             
-            # Organize bets by option
-            bets_by_option = {}
-            for bet in wager.bets:
-                if bet.option_index not in bets_by_option:
-                    bets_by_option[bet.option_index] = []
-                bets_by_option[bet.option_index].append(bet)
-            
-            # Create updated embed
-            embed = format_wager_embed(wager, bets_by_option, show_stats=True)
+            embed = discord.Embed.from_dict(copy.deepcopy(embed_dict))
             
             # Create view with buttons (always create, but disable if closed/resolved)
             view = WagerOptionView(wager.wager_id, wager.options, bot)
-            if wager.status != WAGER_STATUS_OPEN:
+            if not buttons_enabled:
                 # Disable all buttons if wager is not open
                 for item in view.children:
                     item.disabled = True
             
             # Update message
-            await message.edit(embed=embed, view=view)
+            await rest_scheduler.call(
+                ("channel", channel.id),
+                lambda: message.edit(embed=embed, view=view),
+                priority=PRIORITY_LOW
+            )
+            _remember_edit(message.id, digest)
+            render_stats["edits"] += 1
             
         except Exception as e:
             logger.error(f"Error updating wager message {wager_id}: {e}", exc_info=True)
 
 
+# Wagers whose pinned message needs a refresh, and the task doing it
+_dirty_wagers = set()
+_refresh_tasks = {}
+
+
+def schedule_wager_refresh(bot: commands.Bot, wager_id: int):
+    """Refresh a wager's pinned message in the background.
+
+    Requests that arrive while a refresh is running are folded into a single
+    follow-up refresh, so a burst of bets costs at most two edits.
+    """
+    _dirty_wagers.add(wager_id)
+    if wager_id not in _refresh_tasks:
+        _refresh_tasks[wager_id] = asyncio.create_task(_run_wager_refresh(bot, wager_id))
+
+
+async def _run_wager_refresh(bot: commands.Bot, wager_id: int):
+    """Refresh a wager's pinned message until no new refresh has been requested."""
+    try:
+        while wager_id in _dirty_wagers:
+            _dirty_wagers.discard(wager_id)
+            await update_wager_message(bot, wager_id)
+    finally:
+        _refresh_tasks.pop(wager_id, None)
+
+
 class BettingCog(commands.Cog):
     """Cog for placing bets on wagers."""
     
@@ -278,6 +316,7 @@ class BettingCog(commands.Cog):
         self.bot = bot
     
     @app_commands.command(name="bet", description="Place a bet on a wager")
+    @app_commands.guild_only()
     @app_commands.describe(
         wager_id="The ID of the wager to bet on",
         option="The option number to bet on (1-based index)",
@@ -291,146 +330,62 @@ class BettingCog(commands.Cog):
         amount: int
     ):
         """Place a bet on a wager."""
-        # Validate bet amount
-        is_valid, error_msg = validate_bet_amount(amount)
-        if not is_valid:
-            await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
-            return
-        
-        # Validate option (convert to 0-based index)
-        option_index = option - 1
-        if option_index < 0:
-            await interaction.response.send_message(
-                "❌ Option number must be at least 1.",
-                ephemeral=True
+        async with BudgetedResponder(interaction, "bet") as responder:
+            # Convert to 0-based index
+            option_index = option - 1
+            record_event(
+                EVENT_BET, interaction.guild_id, interaction.user.id,
+                wager=wager_id, option=option_index, amount=amount
             )
-            return
         
-        async with get_session() as session:
-            try:
-                # Get wager
-                result = await session.execute(
-                    select(Wager)
-                    .where(Wager.wager_id == wager_id)
-                )
-                wager = result.scalar_one_or_none()
-                
-                if not wager:
-                    await interaction.response.send_message(
-                        f"❌ Wager with ID {wager_id} not found.",
-                        ephemeral=True
-                    )
-                    return
-                
-                # Check wager status
-                if wager.status != WAGER_STATUS_OPEN:
-                    await interaction.response.send_message(
-                        f"❌ This wager is {wager.status}. You cannot place bets on it.",
-                        ephemeral=True
-                    )
-                    return
-                
-                # Validate option index
-                if option_index >= len(wager.options):
-                    await interaction.response.send_message(
-                        f"❌ Invalid option. This wager has {len(wager.options)} option(s).",
-                        ephemeral=True
+            async with get_session() as session:
+                try:
+                    try:
+                        bet = await place_wager_bet(
+                            session, interaction.guild_id, wager_id, interaction.user.id, option_index, amount
+                        )
+                    except Rejected as e:
+                        await session.rollback()
+                        await responder.send(str(e), ephemeral=True)
+                        return
+                    position = bet.position
+                
+                    # Refresh the pinned message in the background, off the response path
+                    schedule_wager_refresh(self.bot, wager_id)
+                
+                    embed = format_bet_embed(position, bet.wager, amount)
+                    embed.add_field(
+                        name="New Balance",
+                        value=format_bits(bet.balance),
+                        inline=False
                     )
-                    return
-                
-                # Get user and check balance
-                user = await get_user(session, interaction.user.id)
-                if user.bits_balance < amount:
-                    await interaction.response.send_message(
-                        f"❌ Insufficient balance. You have {format_bits(user.bits_balance)}, but need {format_bits(amount)}.",
-                        ephemeral=True
+                    pools = odds_book.get(bet.wager.wager_id)
+                    if pools is not None:
+                        embed.add_field(
+                            name="Payout If It Wins Now",
+                            value=format_bits(pools.preview(position.option_index, position.amount, config.HOUSE_RAKE_BPS, included=True)),
+                            inline=False
+                        )
+                    await responder.send(
+                        None if position.bet_count == 1 else "✅ Bet topped up!",
+                        embed=embed
                     )
-                    return
-                
-                # Check if user already bet on this wager
-                existing_bet_result = await session.execute(
-                    select(Bet)
-                    .where(Bet.wager_id == wager_id)
-                    .where(Bet.user_id == interaction.user.id)
-                )
-                existing_bet = existing_bet_result.scalar_one_or_none()
                 
-                if existing_bet:
-                    await interaction.response.send_message(
-                        f"❌ You've already placed a bet on this wager (Option {existing_bet.option_index + 1}, {format_bits(existing_bet.amount)}).",
+                except Exception as e:
+                    await session.rollback()
+                    await responder.send(
+                        f"❌ Error placing bet: {str(e)}",
                         ephemeral=True
                     )
-                    return
-                
-                # Deduct balance
-                await update_balance(
-                    session,
-                    interaction.user.id,
-                    -amount,
-                    TRANSACTION_TYPE_BET_PLACED,
-                    reference_id=None  # Will be updated after bet is created
-                )
-                
-                # Create bet
-                bet = Bet(
-                    wager_id=wager_id,
-                    user_id=interaction.user.id,
-                    option_index=option_index,
-                    amount=amount
-                )
-                session.add(bet)
-                await session.commit()
-                await session.refresh(bet)
-                
-                # Update transaction reference
-                from src.database.models import Transaction
-                transaction_result = await session.execute(
-                    select(Transaction)
-                    .where(Transaction.user_id == interaction.user.id)
-                    .where(Transaction.transaction_type == TRANSACTION_TYPE_BET_PLACED)
-                    .order_by(Transaction.created_at.desc())
-                    .limit(1)
-                )
-                transaction = transaction_result.scalar_one()
-                transaction.reference_id = bet.bet_id
-                await session.commit()
-                
-                # Get updated balance
-                user = await get_user(session, interaction.user.id)
-                
-                # Update pinned message if it exists
-                await update_wager_message(self.bot, wager_id)
-                
-                embed = format_bet_embed(bet, wager)
-                embed.add_field(
-                    name="New Balance",
-                    value=format_bits(user.bits_balance),
-                    inline=False
-                )
-                await interaction.response.send_message(embed=embed)
-                
-            except Exception as e:
-                await session.rollback()
-                await interaction.response.send_message(
-                    f"❌ Error placing bet: {str(e)}",
-                    ephemeral=True
-                )
     
     @app_commands.command(name="mybets", description="View your active bets")
+    @app_commands.guild_only()
     async def mybets(self, interaction: discord.Interaction):
         """View user's active bets."""
-        async with get_session() as session:
+        async with get_session(readonly=True, user_id=interaction.user.id) as session:
             try:
                 # Get all bets for user on open wagers
-                result = await session.execute(
-                    select(Bet)
-                    .join(Wager)
-                    .where(Bet.user_id == interaction.user.id)
-                    .where(Wager.status == WAGER_STATUS_OPEN)
-                    .options(selectinload(Bet.wager))
-                    .order_by(Bet.created_at.desc())
-                )
-                bets = result.scalars().all()
+                bets = await list_user_open_bets(session, interaction.guild_id, interaction.user.id)
                 
                 if not bets:
                     await interaction.response.send_message(
@@ -447,10 +402,9 @@ class BettingCog(commands.Cog):
                 bets_text = ""
                 total_bet = 0
                 for bet in bets:
-                    wager = bet.wager
-                    option_text = wager.options[bet.option_index]
+                    option_text = bet.options[bet.option_index]
                     bets_text += (
-                        f"**Wager #{wager.wager_id}:** {wager.title}\n"
+                        f"**Wager #{bet.wager_id}:** {bet.title}\n"
                         f"Option {bet.option_index + 1}: {option_text} - {format_bits(bet.amount)}\n\n"
                     )
                     total_bet += bet.amount
@@ -470,6 +424,38 @@ class BettingCog(commands.Cog):
                     f"❌ Error retrieving bets: {str(e)}",
                     ephemeral=True
                 )
+    
+    @app_commands.command(name="odds", description="Show a wager's current odds")
+    @app_commands.guild_only()
+    @app_commands.describe(
+        wager_id="The ID of the wager",
+        amount="Preview the payout for a bet of this many bits (optional)"
+    )
+    async def odds(self, interaction: discord.Interaction, wager_id: int, amount: int = None):
+        """Show the current payout per option, from the live pools."""
+        if amount is not None and amount <= 0:
+            await interaction.response.send_message("❌ Amount must be positive.", ephemeral=True)
+            return
+        
+        try:
+            async with get_session(readonly=True) as session:
+                wager = await get_wager(session, wager_id, interaction.guild_id)
+            
+            if not wager:
+                await interaction.response.send_message(
+                    f"❌ Wager with ID {wager_id} not found.",
+                    ephemeral=True
+                )
+                return
+            
+            pools = await get_wager_pools(wager_id, len(wager.options))
+            embed = format_odds_embed(wager, pools, config.HOUSE_RAKE_BPS, amount)
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+        except Exception as e:
+            await interaction.response.send_message(
+                f"❌ Error retrieving odds: {str(e)}",
+                ephemeral=True
+            )
 
 
 async def setup(bot: commands.Bot):
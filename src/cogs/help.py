@@ -42,7 +42,17 @@ class HelpCog(commands.Cog):
             name="🎯 Betting Commands",
             value=(
                 "`/bet <wager_id> <option> <amount>` - Place a bet on a wager\n"
-                "`/mybets` - View your active bets"
+                "`/mybets` - View your active bets\n"
+                "`/odds <wager_id> [amount]` - See current odds and preview a payout"
+            ),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="📊 Statistics Commands",
+            value=(
+                "`/stats [user]` - View lifetime and last-7-days betting stats\n"
+                "`/guildstats` - View this server's stats and most profitable members"
             ),
             inline=False
         )
@@ -52,6 +62,10 @@ class HelpCog(commands.Cog):
             value=(
                 "`/resolve <wager_id> <winning_option>` - Resolve a wager (Admin only)\n"
                 "`/admin_balance <user> <amount>` - Adjust user balance (Admin only)\n"
+                "`/admin_balance_role <role> <amount>` - Adjust balances for a role (Admin only)\n"
+                "`/admin_balance_csv <file>` - Adjust balances from a CSV (Admin only)\n"
+                "`/admin_void <wager_id>` - Void a wager and refund all bets (Admin only)\n"
+                "`/admin_stats` - Show bot performance counters (Admin only)\n"
                 "`/admin_close <wager_id>` - Close a wager (Admin only)"
             ),
             inline=False
@@ -0,0 +1,146 @@
+"""Background job worker cog for Discord Bits Wagering Bot."""
+import asyncio
+import logging
+import discord
+from discord.ext import commands
+from src import config
+from src.database.database import get_session
+from src.database.jobs import JobLeaseLost, claim_job, fail_job, run_resolve_job
+from src.database.models import JOB_TYPE_RESOLVE_WAGER
+from src.utils.formatters import format_job_progress, format_resolution_embed
+from src.utils.odds import odds_book
+from src.utils.rest import rest_scheduler, PRIORITY_LOW
+from src.cogs.betting import schedule_wager_refresh
+
+logger = logging.getLogger(__name__)
+
+
+class JobsCog(commands.Cog):
+    """Cog that runs queued background jobs, such as wager resolutions."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._wake = asyncio.Event()
+        self._worker = None
+
+    async def cog_load(self):
+        self._worker = asyncio.create_task(self._run_worker())
+
+    async def cog_unload(self):
+        if self._worker:
+            self._worker.cancel()
+
+    def wake(self):
+        """Start on newly queued jobs now instead of at the next poll."""
+        self._wake.set()
+
+    async def _run_worker(self):
+        """Drain the job queue, then sleep until woken or the poll interval passes."""
+        # Jobs report progress to channels, which needs the gateway cache
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await self._drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Job worker error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=config.JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _drain(self):
+        """Run claimed jobs until none are left."""
+        while True:
+            async with get_session() as session:
+                job = await claim_job(session)
+            if job is None:
+                return
+            if not await self._run_job(job):
+                # Leave a failed job's retry until the next poll
+                return
+
+    async def _run_job(self, job) -> bool:
+        """Run one claimed job. Returns False if it failed."""
+        if job.job_type != JOB_TYPE_RESOLVE_WAGER:
+            async with get_session() as session:
+                await fail_job(session, job, f"Unknown job type: {job.job_type}")
+            return False
+
+        payload = job.payload
+        channel = self.bot.get_channel(payload.get("channel_id"))
+        progress = {"message": None, "text": None, "update": None}
+
+        def _log_failed_update(future):
+            if not future.cancelled() and future.exception() is not None:
+                logger.warning(f"Failed to update progress for job {job.job_id}: {future.exception()}")
+
+        async def report_progress(done: int, total: int):
+            progress["text"] = format_job_progress(payload["wager_id"], payload.get("title", ""), done, total)
+            if channel is None:
+                return
+            if progress["message"] is None:
+                try:
+                    progress["message"] = await rest_scheduler.call(
+                        ("channel", channel.id),
+                        lambda: channel.send(progress["text"]),
+                        priority=PRIORITY_LOW
+                    )
+                except discord.HTTPException as e:
+                    logger.warning(f"Failed to post progress for job {job.job_id}: {e}")
+                return
+            # Queued edits coalesce and send whatever the latest progress is when they run
+            message = progress["message"]
+            progress["update"] = rest_scheduler.submit(
+                ("channel", channel.id),
+                lambda: message.edit(content=progress["text"]),
+                priority=PRIORITY_LOW,
+                coalesce_key=("job-progress", job.job_id)
+            )
+            progress["update"].add_done_callback(_log_failed_update)
+
+        try:
+            result = await run_resolve_job(job, on_progress=report_progress)
+        except JobLeaseLost as e:
+            logger.warning(str(e))
+            return False
+        except Exception as e:
+            logger.exception(f"Job {job.job_id} failed on attempt {job.attempts}: {e}")
+            try:
+                async with get_session() as session:
+                    given_up = await fail_job(session, job, str(e))
+            except JobLeaseLost:
+                return False
+            if given_up and channel is not None:
+                message = (
+                    f"❌ Resolving wager #{payload['wager_id']} failed after {job.attempts} attempt(s): {e}\n"
+                    f"Run `/resolve` again to resume where it stopped."
+                )
+                try:
+                    await rest_scheduler.call(("channel", channel.id), lambda: channel.send(message))
+                except discord.HTTPException as send_error:
+                    logger.error(f"Failed to report failure of job {job.job_id}: {send_error}")
+            return False
+
+        odds_book.discard(result.wager_id)
+        schedule_wager_refresh(self.bot, result.wager_id)
+        if channel is not None:
+            try:
+                if progress["update"] is not None:
+                    # Let the final progress edit land before the result
+                    await asyncio.wait([progress["update"]])
+                await rest_scheduler.call(
+                    ("channel", channel.id),
+                    lambda: channel.send(embed=format_resolution_embed(result))
+                )
+            except discord.HTTPException as e:
+                logger.error(f"Failed to post the result of job {job.job_id}: {e}")
+        return True
+
+
+async def setup(bot: commands.Bot):
+    """Setup function for the cog."""
+    await bot.add_cog(JobsCog(bot))
@@ -0,0 +1,70 @@
+"""Statistics cog for Discord Bits Wagering Bot."""
+import logging
+from typing import Optional
+import discord
+from discord.ext import commands
+from discord import app_commands
+from src.database.database import get_session
+from src.database.stats import get_user_stats, get_user_recent_stats, get_guild_stats
+from src.utils.formatters import format_user_stats_embed, format_guild_stats_embed
+
+logger = logging.getLogger(__name__)
+
+# Window covered by the "recent" section of /stats
+RECENT_DAYS = 7
+
+
+class StatsCog(commands.Cog):
+    """Cog for betting statistics, read from the incremental rollups."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(name="stats", description="View betting statistics for yourself or another user")
+    @app_commands.guild_only()
+    @app_commands.describe(user="The user to view (defaults to you)")
+    async def stats(self, interaction: discord.Interaction, user: Optional[discord.Member] = None):
+        """Show a user's lifetime and recent betting statistics."""
+        member = user or interaction.user
+        try:
+            async with get_session(readonly=True, user_id=interaction.user.id) as session:
+                lifetime = await get_user_stats(session, interaction.guild_id, member.id)
+                recent = await get_user_recent_stats(session, interaction.guild_id, member.id, RECENT_DAYS)
+
+            if not lifetime.bets_placed and not lifetime.daily_rewards:
+                await interaction.response.send_message(
+                    f"📭 {member.display_name} has no betting history yet.",
+                    ephemeral=True
+                )
+                return
+
+            embed = format_user_stats_embed(member, lifetime, recent, RECENT_DAYS)
+            await interaction.response.send_message(embed=embed)
+        except Exception as e:
+            logger.error(f"Error retrieving stats: {e}")
+            await interaction.response.send_message(
+                f"❌ Error retrieving stats: {str(e)}",
+                ephemeral=True
+            )
+
+    @app_commands.command(name="guildstats", description="View betting statistics for this server")
+    @app_commands.guild_only()
+    async def guildstats(self, interaction: discord.Interaction):
+        """Show the server's combined statistics and most profitable members."""
+        try:
+            async with get_session(readonly=True, user_id=interaction.user.id) as session:
+                totals, leaders = await get_guild_stats(session, interaction.guild_id)
+
+            embed = format_guild_stats_embed(interaction.guild, totals, leaders)
+            await interaction.response.send_message(embed=embed)
+        except Exception as e:
+            logger.error(f"Error retrieving guild stats: {e}")
+            await interaction.response.send_message(
+                f"❌ Error retrieving server stats: {str(e)}",
+                ephemeral=True
+            )
+
+
+async def setup(bot: commands.Bot):
+    """Setup function for the cog."""
+    await bot.add_cog(StatsCog(bot))
@@ -1,20 +1,85 @@
 """Wager management cog for Discord Bits Wagering Bot."""
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
 import discord
 from discord.ext import commands
 from discord import app_commands
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 from src import config
 import logging
-from src.database.database import get_session, get_user
-from src.database.models import Wager, WAGER_STATUS_OPEN, GuildSettings
+from src.database.database import get_session
+from src.database.repository import get_wager, get_wager_options, get_guild_settings, list_open_wager_titles
+from src.database.economy import attach_wager_message, create_wager, discard_wager
+from src.database.models import GuildSettings
 from src.utils.validators import validate_wager_title, validate_wager_options
 from src.utils.formatters import format_wager_embed, format_bits
-from src.cogs.betting import WagerOptionView, update_wager_message
+from src.cogs.betting import WagerOptionView
+from src.utils.events import EVENT_CREATE_WAGER, record_event
+from src.utils.rest import rest_scheduler
+from src.utils.responses import BudgetedResponder
 
 logger = logging.getLogger(__name__)
 
 
+# Stages of creating a wager, timed end to end by creation_stage
+CREATION_STAGES = ("channel", "reserve", "post", "pin", "finalize", "total")
+
+# Stage -> seconds it took in recent wager creations
+creation_timings = {stage: deque(maxlen=500) for stage in CREATION_STAGES}
+
+
+@contextmanager
+def creation_stage(name: str):
+    """Record how long a stage of creating a wager takes."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        creation_timings[name].append(time.perf_counter() - started)
+
+
+def get_creation_timings() -> dict:
+    """Return the count, p50 and p95 seconds of each wager creation stage."""
+    timings = {}
+    for stage, samples in creation_timings.items():
+        ordered = sorted(samples)
+        timings[stage] = {
+            "count": len(ordered),
+            "p50": ordered[len(ordered) // 2] if ordered else 0.0,
+            "p95": ordered[int(len(ordered) * 0.95)] if ordered else 0.0
+        }
+    return timings
+
+
+async def _pin_wager_message(message: discord.Message, channel_id: int) -> bool:
+    """Pin a new wager's message. A failed pin is logged and the wager kept; returns whether it pinned."""
+    # Pins have their own rate limit, so they don't queue behind the channel's next post
+    with creation_stage("pin"):
+        try:
+            await rest_scheduler.call(("pins", channel_id), message.pin)
+        except discord.HTTPException as e:
+            logger.warning(f"Could not pin message {message.id}: {e}")
+            return False
+    return True
+
+
+async def _finalize_wager(session, wager, channel_id: int, message_id: int):
+    """Store where a new wager was posted."""
+    with creation_stage("finalize"):
+        await attach_wager_message(session, wager, channel_id, message_id)
+
+
+async def _withdraw_wager(session, wager, message: discord.Message, view: discord.ui.View):
+    """Take down a wager whose message was posted but couldn't be recorded."""
+    view.stop()
+    try:
+        await rest_scheduler.call(("channel", message.channel.id), message.delete)
+    except discord.HTTPException as e:
+        logger.warning(f"Could not delete message {message.id} of withdrawn wager {wager.wager_id}: {e}")
+    await discard_wager(session, wager)
+
+
 async def get_or_create_wager_channel(bot: commands.Bot, guild: discord.Guild, session) -> discord.TextChannel:
     """Get or create the wager channel for a guild."""
     # First check environment variable (global setting)
@@ -24,10 +89,7 @@ async def get_or_create_wager_channel(bot: commands.Bot, guild: discord.Guild, s
             return channel
     
     # Check database for guild-specific setting
-    result = await session.execute(
-        select(GuildSettings).where(GuildSettings.guild_id == guild.id)
-    )
-    guild_settings = result.scalar_one_or_none()
+    guild_settings = await get_guild_settings(session, guild.id)
     
     if guild_settings and guild_settings.wager_channel_id:
         channel = bot.get_channel(guild_settings.wager_channel_id)
@@ -71,10 +133,13 @@ async def get_or_create_wager_channel(bot: commands.Bot, guild: discord.Guild, s
             )
         }
         
-        channel = await guild.create_text_channel(
-            "wagers",
-            overwrites=overwrites,
-            topic="Wager messages are automatically posted and pinned here. Click the buttons to place bets!"
+        channel = await rest_scheduler.call(
+            ("guild", guild.id),
+            lambda: guild.create_text_channel(
+                "wagers",
+                overwrites=overwrites,
+                topic="Wager messages are automatically posted and pinned here. Click the buttons to place bets!"
+            )
         )
         
         # Store in database
@@ -140,105 +205,107 @@ class CreateWagerModal(discord.ui.Modal, title="Create New Wager"):
             await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
             return
         
-        async with get_session() as session:
-            try:
-                # Ensure user exists
-                user = await get_user(session, interaction.user.id)
-                
-                # Get or create wager channel
+        started = time.perf_counter()
+        async with BudgetedResponder(interaction, "createwager") as responder:
+            async with get_session() as session:
                 try:
-                    target_channel = await get_or_create_wager_channel(self.bot, interaction.guild, session)
-                except PermissionError as e:
-                    await interaction.response.send_message(
-                        f"❌ {str(e)}. Please grant 'Manage Channels' permission or use `/set_wager_channel` to set an existing channel.",
-                        ephemeral=True
-                    )
-                    return
-                except Exception as e:
-                    logger.error(f"Error getting/creating wager channel: {e}", exc_info=True)
-                    await interaction.response.send_message(
-                        f"❌ Failed to get or create wager channel: {str(e)}",
-                        ephemeral=True
-                    )
-                    return
-                
-                # Verify permissions
-                if not target_channel.permissions_for(interaction.guild.me).send_messages:
-                    await interaction.response.send_message(
-                        f"❌ I don't have permission to send messages in {target_channel.mention}. Please grant 'Send Messages' permission.",
-                        ephemeral=True
-                    )
-                    return
-                
-                if not target_channel.permissions_for(interaction.guild.me).manage_messages:
-                    await interaction.response.send_message(
-                        f"❌ I don't have permission to pin messages in {target_channel.mention}. Please grant 'Manage Messages' permission.",
-                        ephemeral=True
-                    )
-                    return
-                
-                # Create wager
-                wager = Wager(
-                    creator_id=interaction.user.id,
-                    title=self.title_input.value,
-                    description=self.description_input.value if self.description_input.value else None,
-                    options=option_list,
-                    status=WAGER_STATUS_OPEN
-                )
-                session.add(wager)
-                await session.commit()
-                await session.refresh(wager)
-                
-                # Create embed
-                embed = format_wager_embed(wager, bets_by_option=None, show_stats=True)
-                
-                # Create view with buttons
-                view = WagerOptionView(wager.wager_id, wager.options, self.bot)
-                
-                # Post message to channel
-                try:
-                    message = await target_channel.send(embed=embed, view=view)
+                    # Get or create wager channel
+                    try:
+                        with creation_stage("channel"):
+                            target_channel = await get_or_create_wager_channel(self.bot, interaction.guild, session)
+                    except PermissionError as e:
+                        await responder.send(
+                            f"❌ {str(e)}. Please grant 'Manage Channels' permission or use `/set_wager_channel` to set an existing channel.",
+                            ephemeral=True
+                        )
+                        return
+                    except Exception as e:
+                        logger.error(f"Error getting/creating wager channel: {e}", exc_info=True)
+                        await responder.send(
+                            f"❌ Failed to get or create wager channel: {str(e)}",
+                            ephemeral=True
+                        )
+                        return
+                    
+                    # Verify permissions
+                    if not target_channel.permissions_for(interaction.guild.me).send_messages:
+                        await responder.send(
+                            f"❌ I don't have permission to send messages in {target_channel.mention}. Please grant 'Send Messages' permission.",
+                            ephemeral=True
+                        )
+                        return
                     
-                    # Pin the message
+                    if not target_channel.permissions_for(interaction.guild.me).manage_messages:
+                        await responder.send(
+                            f"❌ I don't have permission to pin messages in {target_channel.mention}. Please grant 'Manage Messages' permission.",
+                            ephemeral=True
+                        )
+                        return
+                    
+                    # Create the wager, its options and the creator's row in one statement
+                    with creation_stage("reserve"):
+                        wager = await create_wager(
+                            session,
+                            interaction.guild_id,
+                            interaction.user.id,
+                            self.title_input.value,
+                            self.description_input.value if self.description_input.value else None,
+                            option_list
+                        )
+                    
+                    embed = format_wager_embed(wager, show_stats=True)
+                    view = WagerOptionView(wager.wager_id, wager.options, self.bot)
+                    
+                    # Post message to channel
                     try:
-                        await message.pin()
+                        with creation_stage("post"):
+                            message = await rest_scheduler.call(
+                                ("channel", target_channel.id),
+                                lambda: target_channel.send(embed=embed, view=view)
+                            )
                     except discord.HTTPException as e:
-                        logger.warning(f"Could not pin message {message.id}: {e}")
-                        # Continue even if pinning fails
-                    
-                    # Store message and channel IDs
-                    wager.message_id = message.id
-                    wager.channel_id = target_channel.id
-                    await session.commit()
+                        logger.error(f"Error posting wager message: {e}")
+                        # Delete the wager if message posting failed
+                        await discard_wager(session, wager)
+                        await responder.send(
+                            f"❌ Error posting wager message: {str(e)}",
+                            ephemeral=True
+                        )
+                        return
                     
                     # Register the view as persistent
                     self.bot.add_view(view, message_id=message.id)
                     
-                    await interaction.response.send_message(
-                        f"✅ Wager created and pinned in {target_channel.mention}!",
-                        ephemeral=True
+                    # The pin and the stored message IDs don't depend on each other; the reply
+                    # waits for both, so it never announces a wager that gets taken down
+                    pinned, finalized = await asyncio.gather(
+                        _pin_wager_message(message, target_channel.id),
+                        _finalize_wager(session, wager, target_channel.id, message.id),
+                        return_exceptions=True
                     )
-                    
-                except discord.HTTPException as e:
-                    logger.error(f"Error posting wager message: {e}")
-                    await interaction.response.send_message(
-                        f"❌ Error posting wager message: {str(e)}",
+                    if isinstance(finalized, BaseException):
+                        # Bets on a wager with no recorded message would never be shown; take both down
+                        await session.rollback()
+                        await _withdraw_wager(session, wager, message, view)
+                        raise finalized
+                    if isinstance(pinned, BaseException):
+                        logger.warning(f"Could not pin message {message.id}: {pinned}")
+                        pinned = False
+                    await responder.send(
+                        f"✅ Wager created and pinned in {target_channel.mention}!" if pinned
+                        else f"✅ Wager created in {target_channel.mention} (couldn't pin it).",
                         ephemeral=True
                     )
-                    # Delete the wager if message posting failed
-                    await session.delete(wager)
-                    await session.commit()
-                
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"Error creating wager: {e}", exc_info=True)
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(
-                        f"❌ Error creating wager: {str(e)}",
-                        ephemeral=True
+                    record_event(
+                        EVENT_CREATE_WAGER, interaction.guild_id, interaction.user.id,
+                        wager=wager.wager_id, title=wager.title, description=wager.description, options=wager.options
                     )
-                else:
-                    await interaction.followup.send(
+                    creation_timings["total"].append(time.perf_counter() - started)
+                    
+                except Exception as e:
+                    await session.rollback()
+                    logger.error(f"Error creating wager: {e}", exc_info=True)
+                    await responder.send(
                         f"❌ Error creating wager: {str(e)}",
                         ephemeral=True
                     )
@@ -251,24 +318,20 @@ class WagersCog(commands.Cog):
         self.bot = bot
     
     @app_commands.command(name="createwager", description="Create a new wager")
+    @app_commands.guild_only()
     async def createwager(self, interaction: discord.Interaction):
         """Create a new wager using a modal."""
         modal = CreateWagerModal(self.bot)
         await interaction.response.send_modal(modal)
     
     @app_commands.command(name="wagers", description="List all active wagers")
+    @app_commands.guild_only()
     async def wagers(self, interaction: discord.Interaction):
         """List all active wagers."""
-        async with get_session() as session:
+        async with get_session(readonly=True, user_id=interaction.user.id) as session:
             try:
                 # Get all open wagers
-                result = await session.execute(
-                    select(Wager)
-                    .where(Wager.status == WAGER_STATUS_OPEN)
-                    .order_by(Wager.created_at.desc())
-                    .limit(20)
-                )
-                wagers_list = result.scalars().all()
+                wagers_list = await list_open_wager_titles(session, interaction.guild_id, limit=20)
                 
                 if not wagers_list:
                     await interaction.response.send_message(
@@ -298,18 +361,13 @@ class WagersCog(commands.Cog):
                 )
     
     @app_commands.command(name="wagerinfo", description="View details of a specific wager")
+    @app_commands.guild_only()
     @app_commands.describe(wager_id="The ID of the wager to view")
     async def wagerinfo(self, interaction: discord.Interaction, wager_id: int):
         """View details of a specific wager."""
-        async with get_session() as session:
+        async with get_session(readonly=True, user_id=interaction.user.id) as session:
             try:
-                # Get wager with bets
-                result = await session.execute(
-                    select(Wager)
-                    .options(selectinload(Wager.bets))
-                    .where(Wager.wager_id == wager_id)
-                )
-                wager = result.scalar_one_or_none()
+                wager = await get_wager(session, wager_id, interaction.guild_id)
                 
                 if not wager:
                     await interaction.response.send_message(
@@ -318,17 +376,11 @@ class WagersCog(commands.Cog):
                     )
                     return
                 
-                # Organize bets by option
-                bets_by_option = {}
-                for bet in wager.bets:
-                    if bet.option_index not in bets_by_option:
-                        bets_by_option[bet.option_index] = []
-                    bets_by_option[bet.option_index].append(bet)
-                
-                embed = format_wager_embed(wager, bets_by_option)
+                options = await get_wager_options(session, wager_id)
+                embed = format_wager_embed(wager, options)
                 
                 # Add total pool information
-                total_pool = sum(bet.amount for bet in wager.bets)
+                total_pool = sum(option.total for option in options)
                 if total_pool > 0:
                     embed.add_field(
                         name="💰 Total Pool",
@@ -336,8 +388,8 @@ class WagersCog(commands.Cog):
                         inline=True
                     )
                     embed.add_field(
-                        name="📊 Total Bets",
-                        value=str(len(wager.bets)),
+                        name="📊 Positions",
+                        value=str(sum(option.count for option in options)),
                         inline=True
                     )
                 
@@ -4,20 +4,111 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Discord Configuration
+# Discord Configuration (checked when the bot starts, so tools can import config without it)
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN", "")
-if not DISCORD_TOKEN:
-    raise ValueError("DISCORD_TOKEN environment variable is required")
 
 # Database Configuration
-DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost/discord_bits_bot")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is required")
+DATABASE_URL = os.getenv("DATABASE_URL") or "postgresql://localhost/discord_bits_bot"
+
+# Connection pool settings (DB_POOL_SIZE=0 disables pooling)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "500"))
+
+# Optional read replica for read-only commands (falls back to DATABASE_URL)
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+# How long a user's reads stay on the primary after they write
+REPLICA_STICKINESS_SECONDS = float(os.getenv("REPLICA_STICKINESS_SECONDS", "5"))
+# How long to stop using an unreachable replica before trying it again
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
 
 # Bot Configuration
 DAILY_REWARD_AMOUNT = int(os.getenv("DAILY_REWARD_AMOUNT", "100"))
 STARTING_BALANCE = int(os.getenv("STARTING_BALANCE", "1000"))
 MIN_BET_AMOUNT = int(os.getenv("MIN_BET_AMOUNT", "10"))
+# House rake taken from each resolved pool, in basis points (100 = 1%)
+HOUSE_RAKE_BPS = int(os.getenv("HOUSE_RAKE_BPS", "0"))
+
+# Seconds a handler may run before its interaction is deferred automatically
+# (Discord fails interactions that aren't acknowledged within 3 seconds)
+INTERACTION_RESPONSE_BUDGET = float(os.getenv("INTERACTION_RESPONSE_BUDGET", "2.0"))
+
+# Concurrent outbound Discord REST calls
+REST_CONCURRENCY = int(os.getenv("REST_CONCURRENCY", "4"))
+
+# Token-bucket rate limits for commands, buttons and modals:
+# tokens refilled per second and bucket size (0 disables a limit)
+RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "0.5"))
+RATE_LIMIT_USER_BURST = int(os.getenv("RATE_LIMIT_USER_BURST", "5"))
+RATE_LIMIT_GUILD_RATE = float(os.getenv("RATE_LIMIT_GUILD_RATE", "10"))
+RATE_LIMIT_GUILD_BURST = int(os.getenv("RATE_LIMIT_GUILD_BURST", "50"))
+RATE_LIMIT_WAGER_RATE = float(os.getenv("RATE_LIMIT_WAGER_RATE", "5"))
+RATE_LIMIT_WAGER_BURST = int(os.getenv("RATE_LIMIT_WAGER_BURST", "20"))
+
+# Interaction idempotency
+# Recently handled interaction IDs remembered in memory
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# How long handled interaction IDs are kept in the database
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+# Background job worker
+# Seconds between polls of the jobs table when the worker isn't woken directly
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+# Payouts applied per transaction while resolving a wager
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "500"))
+# Seconds without a checkpoint after which a running job is considered abandoned
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+# Attempts before a failing job is given up on
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Archival of settled wagers into summaries and cold tables
+# Days after resolution before a wager is archived (0 disables archival)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+# Wagers moved per transaction
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "50"))
+# Pause between batches, to keep the archiver from crowding out live traffic
+ARCHIVE_BATCH_DELAY_SECONDS = float(os.getenv("ARCHIVE_BATCH_DELAY_SECONDS", "1.0"))
+
+# Statistics rollups behind /stats and /guildstats
+# Seconds between runs folding new transactions into the rollups
+STATS_AGGREGATE_SECONDS = int(os.getenv("STATS_AGGREGATE_SECONDS", "60"))
+# Transactions folded per aggregation transaction
+STATS_BATCH_SIZE = int(os.getenv("STATS_BATCH_SIZE", "5000"))
+# Seconds a run waits for open transactions that may hold lower IDs before skipping
+STATS_SETTLE_TIMEOUT_SECONDS = float(os.getenv("STATS_SETTLE_TIMEOUT_SECONDS", "30"))
+
+# Ledger mode: balance changes are appended to balance_ledger instead of updating the user's row,
+# and a background compactor folds them into users.bits_balance
+BALANCE_LEDGER_MODE = os.getenv("BALANCE_LEDGER_MODE", "false").lower() in ("1", "true", "yes")
+# Seconds between compactor runs
+LEDGER_COMPACT_SECONDS = int(os.getenv("LEDGER_COMPACT_SECONDS", "30"))
+# Ledger entries folded per compaction transaction
+LEDGER_COMPACT_BATCH_SIZE = int(os.getenv("LEDGER_COMPACT_BATCH_SIZE", "10000"))
+# Cached running balances kept in memory
+LEDGER_CACHE_SIZE = int(os.getenv("LEDGER_CACHE_SIZE", "50000"))
+
+# Reconciliation of balances against the transaction log
+# Users checked per aggregate query
+RECONCILE_CHUNK_SIZE = int(os.getenv("RECONCILE_CHUNK_SIZE", "10000"))
+# Chunks checked at once
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "4"))
+# Hours between scheduled runs (0 disables them)
+RECONCILE_INTERVAL_HOURS = int(os.getenv("RECONCILE_INTERVAL_HOURS", "24"))
+# Whether scheduled runs repair the drift they find, rather than only reporting it
+RECONCILE_REPAIR = os.getenv("RECONCILE_REPAIR", "false").lower() in ("1", "true", "yes")
+
+# Start-up readiness
+# Attempts to reach the database before start-up fails, with exponential backoff and jitter between them
+DB_CONNECT_ATTEMPTS = int(os.getenv("DB_CONNECT_ATTEMPTS", "10"))
+# Upper bound of the first retry delay; each later one doubles, up to the maximum
+DB_CONNECT_BACKOFF_SECONDS = float(os.getenv("DB_CONNECT_BACKOFF_SECONDS", "0.5"))
+DB_CONNECT_BACKOFF_MAX_SECONDS = float(os.getenv("DB_CONNECT_BACKOFF_MAX_SECONDS", "15"))
+# Local HTTP server for /healthz and /readyz (HEALTH_PORT=0 disables it)
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
+
+# Recording of command invocations for replay-events.py (empty disables recording)
+EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", "")
 
 # Admin Configuration
 ADMIN_ROLE_IDS = [
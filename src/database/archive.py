@@ -0,0 +1,136 @@
+"""Archival of settled wagers.
+
+Wagers resolved or voided more than ``ARCHIVE_AFTER_DAYS`` ago are moved out
+of the hot tables in batches. Each wager becomes a ``wager_summaries`` row with
+its per-option totals and winners, its positions and legacy bets move to the
+``archived_positions`` and ``archived_bets`` tables, and the wager row is
+deleted. Each batch commits on its own, so an interrupted run simply carries on
+with the wagers that are left the next time it runs.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select
+from src import config
+from src.database.database import get_session
+from src.database.models import (
+    Wager, WagerOption, Position, Bet, WagerSummary, ArchivedPosition, ArchivedBet,
+    WAGER_STATUS_RESOLVED, WAGER_STATUS_VOIDED
+)
+
+logger = logging.getLogger(__name__)
+
+_POSITION_COLUMNS = [
+    "position_id", "guild_id", "wager_id", "user_id", "option_index", "amount",
+    "bet_count", "last_bet_seq", "created_at", "updated_at"
+]
+_BET_COLUMNS = ["bet_id", "guild_id", "wager_id", "user_id", "option_index", "amount", "created_at"]
+
+
+def _summarize(wager, positions) -> dict:
+    """Build a wager_summaries row from a wager and its positions."""
+    option_totals = [0] * len(wager.options)
+    option_counts = [0] * len(wager.options)
+    winners = []
+    for position in positions:
+        if 0 <= position.option_index < len(option_totals):
+            option_totals[position.option_index] += position.amount
+            option_counts[position.option_index] += 1
+        if wager.status == WAGER_STATUS_RESOLVED and position.option_index == wager.winning_option:
+            winners.append([position.user_id, position.amount])
+    return {
+        "wager_id": wager.wager_id,
+        "guild_id": wager.guild_id,
+        "creator_id": wager.creator_id,
+        "title": wager.title,
+        "description": wager.description,
+        "options": wager.options,
+        "status": wager.status,
+        "winning_option": wager.winning_option,
+        "total_pool": sum(option_totals),
+        "option_totals": option_totals,
+        "option_counts": option_counts,
+        "winners": winners,
+        "created_at": wager.created_at,
+        "resolved_at": wager.resolved_at,
+    }
+
+
+async def _move_rows(session, source, target, columns, wager_ids):
+    """Move a wager batch's rows from a hot table to its archive table in one statement."""
+    moved = (
+        delete(source)
+        .where(source.wager_id.in_(wager_ids))
+        .returning(*[getattr(source, column) for column in columns])
+        .cte("moved")
+    )
+    await session.execute(
+        insert(target).from_select(columns, select(*[moved.c[column] for column in columns]))
+    )
+
+
+async def archive_batch(session, cutoff: datetime, batch_size: int) -> int:
+    """Archive up to ``batch_size`` settled wagers older than ``cutoff``. Returns how many were archived."""
+    result = await session.execute(
+        select(Wager)
+        .where(Wager.status.in_([WAGER_STATUS_RESOLVED, WAGER_STATUS_VOIDED]))
+        .where(Wager.resolved_at < cutoff)
+        .order_by(Wager.wager_id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    wagers = result.scalars().all()
+    if not wagers:
+        await session.rollback()
+        return 0
+
+    wager_ids = [wager.wager_id for wager in wagers]
+    positions_result = await session.execute(
+        select(Position.wager_id, Position.user_id, Position.option_index, Position.amount)
+        .where(Position.wager_id.in_(wager_ids))
+        .order_by(Position.position_id)
+    )
+    positions_by_wager = defaultdict(list)
+    for position in positions_result:
+        positions_by_wager[position.wager_id].append(position)
+
+    await session.execute(
+        insert(WagerSummary),
+        [_summarize(wager, positions_by_wager[wager.wager_id]) for wager in wagers]
+    )
+    await _move_rows(session, Position, ArchivedPosition, _POSITION_COLUMNS, wager_ids)
+    await _move_rows(session, Bet, ArchivedBet, _BET_COLUMNS, wager_ids)
+    # The summary keeps the per-option totals, so the option rows go with the wager
+    await session.execute(
+        delete(WagerOption).where(WagerOption.wager_id.in_(wager_ids)).execution_options(synchronize_session=False)
+    )
+    await session.execute(
+        delete(Wager).where(Wager.wager_id.in_(wager_ids)).execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return len(wagers)
+
+
+async def archive_settled_wagers() -> int:
+    """Archive every settled wager past the retention period, batch by batch.
+
+    Batches are separated by ``ARCHIVE_BATCH_DELAY_SECONDS`` so the archiver
+    never holds locks or I/O for long. Returns the number of wagers archived.
+    """
+    if config.ARCHIVE_AFTER_DAYS <= 0:
+        return 0
+
+    cutoff = datetime.utcnow() - timedelta(days=config.ARCHIVE_AFTER_DAYS)
+    archived = 0
+    while True:
+        async with get_session() as session:
+            count = await archive_batch(session, cutoff, config.ARCHIVE_BATCH_SIZE)
+        archived += count
+        if count < config.ARCHIVE_BATCH_SIZE:
+            break
+        await asyncio.sleep(config.ARCHIVE_BATCH_DELAY_SECONDS)
+
+    if archived:
+        logger.info(f"Archived {archived} settled wager(s) resolved before {cutoff:%Y-%m-%d}")
+    return archived
@@ -1,10 +1,17 @@
 """Database connection and setup for the Discord Bits Wagering Bot."""
+import logging
+import time
+from typing import NamedTuple
 from sqlalchemy import create_engine
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 from src import config
-from src.database.models import Base
+from src.database.models import Base, Transaction
+from src.database.repository import track_compile_cache, get_user_by_id
+
+logger = logging.getLogger(__name__)
 
 # Create async engine for PostgreSQL
 # Convert postgresql:// to postgresql+asyncpg:// for async support
@@ -12,17 +19,53 @@ async_database_url = config.DATABASE_URL.replace(
     "postgresql://", "postgresql+asyncpg://"
 )
 
+
+def _engine_options() -> dict:
+    """Build engine options shared by the primary and replica engines."""
+    # Pool size 0 disables pooling, e.g. when running behind PgBouncer
+    if config.DB_POOL_SIZE <= 0:
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        # Prepared statements live per connection, so they survive only on pooled connections
+        "connect_args": {"prepared_statement_cache_size": config.DB_PREPARED_STATEMENT_CACHE_SIZE},
+    }
+
+
 engine = create_async_engine(
     async_database_url,
-    poolclass=NullPool,
-    echo=False
+    echo=False,
+    **_engine_options()
 )
+track_compile_cache(engine)
 
 # Create async session factory
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Optional read replica for read-only sessions
+replica_engine = None
+ReplicaSessionLocal = None
+if config.DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(
+        config.DATABASE_REPLICA_URL.replace("postgresql://", "postgresql+asyncpg://"),
+        echo=False,
+        **_engine_options()
+    )
+    track_compile_cache(replica_engine)
+    ReplicaSessionLocal = sessionmaker(
+        replica_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+# user_id -> monotonic time of that user's last write, for read-your-writes
+_recent_writers = {}
+# Monotonic time until which the replica is considered unreachable
+_replica_down_until = 0.0
+
 
 async def init_db():
     """Initialize the database by creating all tables."""
@@ -30,28 +73,99 @@ async def init_db():
         await conn.run_sync(Base.metadata.create_all)
 
 
+def mark_user_written(user_id: int):
+    """Record that a user just wrote, pinning their reads to the primary for a while."""
+    now = time.monotonic()
+    _recent_writers[user_id] = now
+    if len(_recent_writers) > 10000:
+        # Drop entries whose stickiness window has passed
+        cutoff = now - config.REPLICA_STICKINESS_SECONDS
+        for stale_user_id in [uid for uid, written_at in _recent_writers.items() if written_at < cutoff]:
+            del _recent_writers[stale_user_id]
+
+
+def _use_replica(user_id=None) -> bool:
+    """Check whether a read-only session may be served by the replica."""
+    if ReplicaSessionLocal is None:
+        return False
+    now = time.monotonic()
+    if now < _replica_down_until:
+        return False
+    if user_id is not None:
+        written_at = _recent_writers.get(user_id)
+        if written_at is not None and now - written_at < config.REPLICA_STICKINESS_SECONDS:
+            return False
+    return True
+
+
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
-async def get_session():
-    """Get an async database session."""
-    async with AsyncSessionLocal() as session:
+async def get_session(readonly: bool = False, user_id: int = None):
+    """Get an async database session.
+
+    Read-only sessions go to the replica when one is configured, except for
+    users who wrote recently (read-your-writes) or while the replica is
+    unreachable, in which case they fall back to the primary.
+    """
+    global _replica_down_until
+
+    session = None
+    if readonly and _use_replica(user_id):
+        session = ReplicaSessionLocal()
         try:
-            yield session
-        finally:
+            await session.connection()
+        except (OSError, SQLAlchemyError) as e:
+            logger.warning(f"Read replica unavailable, falling back to primary: {e}")
+            _replica_down_until = time.monotonic() + config.REPLICA_RETRY_SECONDS
             await session.close()
+            session = None
+    if session is None:
+        session = AsyncSessionLocal()
+
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def stream_chunks(session, statement, chunk_size: int, params: dict = None):
+    """Stream a query's rows in lists of up to ``chunk_size``, holding one list at a time.
 
+    Rows come off a server-side cursor with ``yield_per``. ORM objects in the
+    rows are expunged from the session as soon as the consumer asks for the
+    next chunk, so the identity map stays the size of one chunk however many
+    rows the query returns. Consume the stream before committing the session.
+    """
+    entity_columns = [
+        index for index, description in enumerate(statement.column_descriptions)
+        if description["entity"] is not None and description["expr"] is description["entity"]
+    ]
+    result = await session.stream(statement.execution_options(yield_per=max(chunk_size, 1)), params)
+    try:
+        async for chunk in result.partitions():
+            yield chunk
+            for row in chunk:
+                for index in entity_columns:
+                    if row[index] in session:
+                        session.expunge(row[index])
+    finally:
+        await result.close()
 
-async def get_user(session, user_id: int):
-    """Get or create a user."""
+
+async def get_user(session, guild_id: int, user_id: int, create: bool = True):
+    """Get or create a user's row in a guild.
+
+    With ``create=False`` a missing user is returned as None, which keeps the
+    call safe on read-only sessions.
+    """
     from src.database.models import User
-    from sqlalchemy import select
     
-    result = await session.execute(select(User).where(User.user_id == user_id))
-    user = result.scalar_one_or_none()
+    user = await get_user_by_id(session, guild_id, user_id)
     
-    if user is None:
-        user = User(user_id=user_id, bits_balance=config.STARTING_BALANCE)
+    if user is None and create:
+        mark_user_written(user_id)
+        user = User(guild_id=guild_id, user_id=user_id, bits_balance=config.STARTING_BALANCE)
         session.add(user)
         await session.commit()
         await session.refresh(user)
@@ -59,15 +173,82 @@ async def get_user(session, user_id: int):
     return user
 
 
-async def update_balance(session, user_id: int, amount: int, transaction_type, reference_id=None):
-    """Update user balance and create a transaction record."""
-    from src.database.models import User, Transaction
-    from sqlalchemy import select
+async def get_balance(session, guild_id: int, user_id: int, create: bool = True):
+    """Get a user's balance in a guild, creating the user unless ``create=False``.
+
+    In ledger mode this is the cached running total (snapshot plus pending
+    ledger entries). A missing user with ``create=False`` is returned as None.
+    """
+    if config.BALANCE_LEDGER_MODE:
+        from src.database.ledger import get_ledger_balance
+        balance = await get_ledger_balance(guild_id, user_id, session)
+        if balance is not None or not create:
+            return balance
     
-    user = await get_user(session, user_id)
-    user.bits_balance += amount
+    user = await get_user(session, guild_id, user_id, create=create)
+    return user.bits_balance if user is not None else None
+
+
+class BalanceUpdate(NamedTuple):
+    """The audit row a balance change wrote and the balance it left."""
+    transaction: Transaction
+    balance: int
+
+
+class InsufficientFunds(Exception):
+    """Raised by update_balance when a debit that requires funds would overdraw the balance."""
+
+    def __init__(self, balance: int):
+        super().__init__(f"Insufficient balance: {balance}")
+        self.balance = balance
+
+
+async def update_balance(
+    session, guild_id: int, user_id: int, amount: int, transaction_type, reference_id=None,
+    require_funds: bool = False
+) -> BalanceUpdate:
+    """Update a user's balance in a guild and create a transaction record.
+
+    In ledger mode the change is appended to the ledger instead of updating
+    the user's row. With ``require_funds`` the funds check is part of the
+    write itself, so concurrent debits can't take the balance below zero;
+    InsufficientFunds is raised, with nothing written, when they would.
+    Returns the committed transaction, with its ID, and the new balance, so
+    callers need no follow-up query for either.
+    """
+    from src.database.models import User
+    from sqlalchemy import select, update
+    
+    await get_user(session, guild_id, user_id)
+    if config.BALANCE_LEDGER_MODE:
+        from src.database.ledger import append_ledger_entries, append_funded_debit
+        if require_funds and amount < 0:
+            if not await append_funded_debit(session, guild_id, user_id, amount):
+                raise InsufficientFunds(await get_balance(session, guild_id, user_id))
+        else:
+            await append_ledger_entries(session, guild_id, [(user_id, amount)])
+        balance = None
+    else:
+        # Increment in SQL, so concurrent updates to the same user can't overwrite each other
+        statement = (
+            update(User)
+            .where(User.guild_id == guild_id)
+            .where(User.user_id == user_id)
+            .values(bits_balance=User.bits_balance + amount)
+            .returning(User.bits_balance)
+            .execution_options(synchronize_session="fetch")
+        )
+        if require_funds:
+            statement = statement.where(User.bits_balance + amount >= 0)
+        balance = (await session.execute(statement)).scalar_one_or_none()
+        if balance is None:
+            raise InsufficientFunds((await session.execute(
+                select(User.bits_balance).where(User.guild_id == guild_id).where(User.user_id == user_id)
+            )).scalar_one())
+    mark_user_written(user_id)
     
     transaction = Transaction(
+        guild_id=guild_id,
         user_id=user_id,
         amount=amount,
         transaction_type=transaction_type,
@@ -76,5 +257,113 @@ async def update_balance(session, user_id: int, amount: int, transaction_type, r
     session.add(transaction)
     await session.commit()
     
-    return user.bits_balance
+    if config.BALANCE_LEDGER_MODE:
+        return BalanceUpdate(transaction, await get_balance(session, guild_id, user_id))
+    return BalanceUpdate(transaction, balance)
+
+
+
+async def bulk_update_balances(session, guild_id: int, adjustments: dict, transaction_type, reference_id=None):
+    """Apply many balance adjustments in a guild as one set-based transaction.
+
+    ``adjustments`` maps user_id to a signed amount; every audit row gets the
+    same ``reference_id``. Returns the number of users adjusted.
+    """
+    return await apply_balance_changes(
+        session,
+        guild_id,
+        [(user_id, amount, reference_id) for user_id, amount in adjustments.items()],
+        transaction_type
+    )
+
+
+async def apply_balance_changes(session, guild_id: int, changes, transaction_type, commit: bool = True):
+    """Apply (user_id, amount, reference_id) balance changes in a guild with set-based SQL.
+
+    Missing users are created, balances are changed by a single UPDATE joined
+    against the unnest()ed arrays (summed per user) and the audit rows are
+    written with a single INSERT ... SELECT, so the cost is three statements
+    regardless of how many rows are applied. In ledger mode the UPDATE is an
+    INSERT into the ledger instead. With ``commit=False`` the caller can
+    commit the changes together with its own writes.
+
+    Returns the number of changes applied.
+    """
+    from src.database.models import User, Transaction
+    from sqlalchemy import select, update, insert, func, literal, bindparam, BigInteger, Integer, String
+    from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+    changes = [(user_id, amount, reference_id) for user_id, amount, reference_id in changes if amount]
+    if not changes:
+        return 0
+
+    for user_id, _, _ in changes:
+        mark_user_written(user_id)
+
+    params = {
+        "user_ids": [user_id for user_id, _, _ in changes],
+        "amounts": [amount for _, amount, _ in changes],
+        "reference_ids": [reference_id for _, _, reference_id in changes]
+    }
+    rows = select(
+        func.unnest(bindparam("user_ids", type_=ARRAY(BigInteger))).label("user_id"),
+        func.unnest(bindparam("amounts", type_=ARRAY(Integer))).label("amount"),
+        func.unnest(bindparam("reference_ids", type_=ARRAY(Integer))).label("reference_id")
+    ).subquery("changes")
+    deltas = (
+        select(rows.c.user_id, func.sum(rows.c.amount).label("amount"))
+        .group_by(rows.c.user_id)
+        .subquery("deltas")
+    )
+
+    # Create any users that don't exist yet with the starting balance. The
+    # INSERT ... SELECTs go through the tables, since the ORM bulk insert path
+    # rejects from_select
+    await session.execute(
+        pg_insert(User.__table__)
+        .from_select(
+            ["guild_id", "user_id", "bits_balance"],
+            select(literal(guild_id, BigInteger), deltas.c.user_id, literal(config.STARTING_BALANCE, Integer))
+        )
+        .on_conflict_do_nothing(index_elements=[User.guild_id, User.user_id]),
+        params
+    )
+
+    if config.BALANCE_LEDGER_MODE:
+        from src.database.models import LedgerEntry
+        from src.database.ledger import queue_balance_updates
+        await session.execute(
+            insert(LedgerEntry.__table__).from_select(
+                ["guild_id", "user_id", "amount"],
+                select(literal(guild_id, BigInteger), deltas.c.user_id, deltas.c.amount)
+            ),
+            params
+        )
+        queue_balance_updates(session, guild_id, [(user_id, amount) for user_id, amount, _ in changes])
+    else:
+        await session.execute(
+            update(User)
+            .where(User.guild_id == guild_id)
+            .where(User.user_id == deltas.c.user_id)
+            .values(bits_balance=User.bits_balance + deltas.c.amount)
+            .execution_options(synchronize_session=False),
+            params
+        )
+
+    await session.execute(
+        insert(Transaction.__table__).from_select(
+            ["guild_id", "user_id", "amount", "transaction_type", "reference_id"],
+            select(
+                literal(guild_id, BigInteger),
+                rows.c.user_id,
+                rows.c.amount,
+                literal(transaction_type, String(30)),
+                rows.c.reference_id
+            )
+        ),
+        params
+    )
+    if commit:
+        await session.commit()
 
+    return len(changes)
@@ -0,0 +1,239 @@
+"""The economy's commands, without Discord.
+
+Each function here is the database side of one command: it checks the
+request, applies it and commits, and raises ``Rejected`` with the message to
+show when the request is refused. The cogs call these and only add the
+interaction handling around them, and the replay driver calls the same
+functions with recorded events, so a replay exercises exactly the code that
+live traffic does.
+"""
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+from src import config
+from src.database.database import InsufficientFunds, get_user, get_balance, mark_user_written, update_balance
+from src.database.jobs import enqueue_job, get_latest_job, requeue_job
+from src.database.models import (
+    Job, Wager, WAGER_STATUS_OPEN, WAGER_STATUS_CLOSED, WAGER_STATUS_RESOLVING,
+    WAGER_STATUS_RESOLVED, WAGER_STATUS_VOIDED, JOB_TYPE_RESOLVE_WAGER, JOB_STATUS_FAILED,
+    TRANSACTION_TYPE_BET_PLACED, TRANSACTION_TYPE_DAILY_REWARD
+)
+from src.database.repository import (
+    PositionRow, WagerNotOpen, delete_wager, get_wager, get_wager_options, place_bet, reserve_wager, set_wager_message
+)
+from src.utils.formatters import format_bits
+from src.utils.odds import odds_book
+from src.utils.validators import validate_bet_amount
+
+
+class Rejected(Exception):
+    """A command refused for a reason the user should see; the message is shown as it is."""
+
+
+class BetPlaced(NamedTuple):
+    """A bet that went through, with what the reply needs."""
+    wager: Wager
+    position: PositionRow
+    balance: int
+
+
+class ResolutionRequest(NamedTuple):
+    """The job paying out a wager, and whether it resumes an earlier failed one."""
+    wager: Wager
+    job: Job
+    resumed: bool
+
+
+async def _write_bet(session, guild_id: int, wager: Wager, user_id: int, option_index: int, amount: int):
+    """Open or top up the position, then deduct the balance in the same commit."""
+    # The status is checked again under a lock, since a resolve may have landed
+    # since the wager was read. The option's row validates the index.
+    try:
+        position = await place_bet(session, guild_id, wager.wager_id, user_id, option_index, amount)
+    except WagerNotOpen:
+        raise Rejected("❌ This wager is no longer open. You cannot place bets on it.")
+    except ValueError:
+        raise Rejected(f"❌ Invalid option. This wager has {len(wager.options)} option(s).")
+    # The funds are checked again as part of the debit, since concurrent bets
+    # may have spent the balance read before
+    try:
+        debit = await update_balance(
+            session, guild_id, user_id, -amount, TRANSACTION_TYPE_BET_PLACED,
+            reference_id=position.position_id, require_funds=True
+        )
+    except InsufficientFunds as e:
+        raise Rejected(
+            f"❌ Insufficient balance. You have {format_bits(e.balance)}, but need {format_bits(amount)}."
+        )
+    return position, debit
+
+
+async def place_wager_bet(
+    session, guild_id: int, wager_id: int, user_id: int, option_index: int, amount: int
+) -> BetPlaced:
+    """Bet on an option of an open wager and take the stake from the user's balance.
+
+    The caller rolls back when this raises, so a bet refused halfway leaves nothing behind.
+    """
+    is_valid, error_msg = validate_bet_amount(amount)
+    if not is_valid:
+        raise Rejected(f"❌ {error_msg}")
+    if option_index < 0:
+        raise Rejected("❌ Option number must be at least 1.")
+
+    wager = await get_wager(session, wager_id, guild_id)
+    if not wager:
+        raise Rejected(f"❌ Wager with ID {wager_id} not found.")
+    if wager.status != WAGER_STATUS_OPEN:
+        raise Rejected(f"❌ This wager is {wager.status}. You cannot place bets on it.")
+
+    balance = await get_balance(session, guild_id, user_id)
+    if balance < amount:
+        raise Rejected(
+            f"❌ Insufficient balance. You have {format_bits(balance)}, but need {format_bits(amount)}."
+        )
+
+    # Pools loaded while the bet is being written aren't cached, since they
+    # may or may not include it
+    odds_book.begin_bet(wager_id)
+    try:
+        position, debit = await _write_bet(session, guild_id, wager, user_id, option_index, amount)
+    except Rejected:
+        odds_book.cancel_bet(wager_id, committed=False)
+        raise
+    except BaseException:
+        odds_book.cancel_bet(wager_id)
+        raise
+    odds_book.record_bet(wager_id, option_index, amount, new_position=position.bet_count == 1)
+    return BetPlaced(wager, position, debit.balance)
+
+
+async def claim_daily(session, guild_id: int, user_id: int, now: Optional[datetime] = None) -> int:
+    """Pay the daily reward if a day has passed since the last one. Returns the new balance.
+
+    ``now`` defaults to the current time; replays pass the time the claim was recorded.
+    """
+    now = now or datetime.utcnow()
+    user = await get_user(session, guild_id, user_id)
+    if user.last_daily_reward:
+        time_since_last = now - user.last_daily_reward
+        if time_since_last < timedelta(days=1):
+            hours_remaining = 24 - (time_since_last.total_seconds() / 3600)
+            raise Rejected(
+                f"⏰ You've already claimed your daily reward today! "
+                f"Come back in {int(hours_remaining)} hours."
+            )
+
+    user.last_daily_reward = now
+    credit = await update_balance(
+        session, guild_id, user_id, config.DAILY_REWARD_AMOUNT, TRANSACTION_TYPE_DAILY_REWARD
+    )
+    return credit.balance
+
+
+async def create_wager(
+    session, guild_id: int, creator_id: int, title: str, description: Optional[str], options: List[str]
+) -> Wager:
+    """Create an open wager with its option rows. The title and options must already be validated.
+
+    The creator's user row, the wager and its options are written by one
+    statement and committed at once. The returned wager is detached from the
+    session; ``attach_wager_message`` records where it gets posted.
+    """
+    mark_user_written(creator_id)
+    reserved = await reserve_wager(
+        session, guild_id, creator_id, title, description, options, config.STARTING_BALANCE
+    )
+    await session.commit()
+    return Wager(
+        wager_id=reserved.wager_id,
+        guild_id=guild_id,
+        creator_id=creator_id,
+        title=title,
+        description=description,
+        options=options,
+        status=WAGER_STATUS_OPEN,
+        created_at=reserved.created_at
+    )
+
+
+async def attach_wager_message(session, wager: Wager, channel_id: int, message_id: int):
+    """Record the channel and message a new wager was posted as."""
+    await set_wager_message(session, wager.wager_id, channel_id, message_id)
+    await session.commit()
+    wager.channel_id = channel_id
+    wager.message_id = message_id
+
+
+async def discard_wager(session, wager: Wager):
+    """Delete a wager that never got posted, together with its option rows."""
+    await delete_wager(session, wager.wager_id)
+    await session.commit()
+
+
+async def close_wager(session, guild_id: int, wager_id: int) -> Wager:
+    """Stop an open wager taking bets."""
+    # Locked, so a close can't overwrite a resolve or void that commits first
+    wager = await get_wager(session, wager_id, guild_id, for_update=True)
+    if not wager:
+        raise Rejected(f"❌ Wager with ID {wager_id} not found.")
+    if wager.status != WAGER_STATUS_OPEN:
+        raise Rejected(f"❌ This wager is already {wager.status}.")
+
+    wager.status = WAGER_STATUS_CLOSED
+    await session.commit()
+    return wager
+
+
+async def request_resolution(
+    session, guild_id: int, wager_id: int, option_index: int,
+    channel_id: Optional[int] = None, requested_by: Optional[int] = None
+) -> ResolutionRequest:
+    """Freeze a wager and queue the job that pays it out, or requeue a failed one.
+
+    The job worker (or the replay driver) runs the job.
+    """
+    if option_index < 0:
+        raise Rejected("❌ Option number must be at least 1.")
+
+    wager = await get_wager(session, wager_id, guild_id, for_update=True)
+    if not wager:
+        raise Rejected(f"❌ Wager with ID {wager_id} not found.")
+    if wager.status == WAGER_STATUS_RESOLVED:
+        raise Rejected("❌ This wager has already been resolved.")
+    if wager.status == WAGER_STATUS_VOIDED:
+        raise Rejected("❌ This wager has been voided.")
+    if option_index >= len(wager.options):
+        raise Rejected(f"❌ Invalid option. This wager has {len(wager.options)} option(s).")
+
+    if wager.status == WAGER_STATUS_RESOLVING:
+        # Only a resolution that failed for good can be picked up again
+        job = await get_latest_job(session, JOB_TYPE_RESOLVE_WAGER, wager_id)
+        if job is not None and job.status != JOB_STATUS_FAILED:
+            raise Rejected(f"❌ This wager is already being resolved (job #{job.job_id}).")
+        if job is not None and job.payload["winning_option"] != option_index:
+            raise Rejected(
+                f"❌ This wager is partly paid out for option {job.payload['winning_option'] + 1}. "
+                f"Resume it with that option."
+            )
+        if job is not None:
+            requeue_job(job)
+            await session.commit()
+            return ResolutionRequest(wager, job, True)
+
+    # The option rows count the positions, so this needn't load them
+    if not any(option.count for option in await get_wager_options(session, wager_id)):
+        raise Rejected("❌ This wager has no bets. Cannot resolve.")
+
+    # Freeze the wager and hand the payouts to the job worker
+    wager.status = WAGER_STATUS_RESOLVING
+    wager.winning_option = option_index
+    job = await enqueue_job(session, JOB_TYPE_RESOLVE_WAGER, {
+        "wager_id": wager_id,
+        "title": wager.title,
+        "winning_option": option_index,
+        "rake_bps": config.HOUSE_RAKE_BPS,
+        "channel_id": channel_id,
+        "requested_by": requested_by
+    })
+    await session.commit()
+    return ResolutionRequest(wager, job, False)
@@ -0,0 +1,97 @@
+"""Idempotent interaction handling.
+
+Discord can deliver the same interaction more than once. Handlers that move
+bits claim the interaction ID before doing any work: a bounded in-memory ring
+of recent IDs rejects repeats seen by this process in O(1), and a row in
+``processed_interactions`` (inserted in the handler's own transaction)
+rejects repeats across restarts and processes. An ID joins the ring only
+once that transaction commits, so a handler that rolls back leaves the
+interaction free to be retried. Rows older than
+``IDEMPOTENCY_TTL_SECONDS`` are purged on a schedule.
+"""
+from collections import Counter, deque
+from datetime import timedelta
+from sqlalchemy import delete, event, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from src import config
+from src.database.models import ProcessedInteraction
+
+# "claimed", "duplicates_memory", "duplicates_db", "purged"
+idempotency_stats = Counter()
+
+
+class RecentIds:
+    """A fixed-size set of the most recently added IDs."""
+
+    def __init__(self, maxlen: int):
+        self._order = deque(maxlen=maxlen)
+        self._ids = set()
+
+    def __contains__(self, item) -> bool:
+        return item in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, item):
+        """Remember an ID, forgetting the oldest one when full."""
+        if item in self._ids:
+            return
+        if len(self._order) == self._order.maxlen:
+            self._ids.discard(self._order[0])
+        self._order.append(item)
+        self._ids.add(item)
+
+
+_recent_interactions = RecentIds(config.IDEMPOTENCY_CACHE_SIZE)
+
+# session.info key holding interaction IDs claimed in the session, remembered once it commits
+_CLAIMED_KEY = "idempotency_claimed"
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_claimed(session):
+    for interaction_id in session.info.pop(_CLAIMED_KEY, ()):
+        _recent_interactions.add(interaction_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_claimed(session, previous_transaction):
+    session.info.pop(_CLAIMED_KEY, None)
+
+
+async def claim_interaction(session, interaction_id: int, command: str, user_id: int) -> bool:
+    """Claim an interaction for processing. Returns False if it was already handled.
+
+    The claim row is added to the session without committing, so it persists
+    with the handler's first commit and disappears if the handler rolls back.
+    """
+    if interaction_id in _recent_interactions:
+        idempotency_stats["duplicates_memory"] += 1
+        return False
+
+    result = await session.execute(
+        pg_insert(ProcessedInteraction)
+        .values(interaction_id=interaction_id, command=command, user_id=user_id)
+        .on_conflict_do_nothing(index_elements=[ProcessedInteraction.interaction_id])
+        .returning(ProcessedInteraction.interaction_id)
+    )
+    if result.scalar_one_or_none() is None:
+        idempotency_stats["duplicates_db"] += 1
+        return False
+
+    session.info.setdefault(_CLAIMED_KEY, []).append(interaction_id)
+    idempotency_stats["claimed"] += 1
+    return True
+
+
+async def purge_processed_interactions(session) -> int:
+    """Delete claim rows older than the idempotency TTL. Returns the number deleted."""
+    cutoff = func.now() - timedelta(seconds=config.IDEMPOTENCY_TTL_SECONDS)
+    result = await session.execute(
+        delete(ProcessedInteraction).where(ProcessedInteraction.created_at < cutoff)
+    )
+    await session.commit()
+    idempotency_stats["purged"] += result.rowcount
+    return result.rowcount
@@ -0,0 +1,331 @@
+"""Persistent background jobs.
+
+Jobs are rows in the ``jobs`` table, so they survive restarts. Workers claim
+them with ``SELECT ... FOR UPDATE SKIP LOCKED``: concurrent workers never pick
+up the same job, and a running job whose worker stopped checkpointing is
+claimed again once its lease runs out.
+
+Each claim increments ``attempts``, which doubles as a fencing token: every
+checkpoint re-reads the job row under a lock and gives up if another worker
+has claimed the job since, so two workers can never both apply the same chunk.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, bindparam, cast, func, or_, select, update, Numeric
+from src import config
+from src.database.database import get_session, apply_balance_changes, stream_chunks
+from src.database.models import (
+    Job, Wager, Position, JOB_STATUS_QUEUED, JOB_STATUS_RUNNING, JOB_STATUS_DONE,
+    JOB_STATUS_FAILED, WAGER_STATUS_RESOLVED, TRANSACTION_TYPE_BET_WON, TRANSACTION_TYPE_BET_REFUNDED
+)
+from src.database.repository import get_wager
+from src.utils.payouts import apply_rake, stake_payout
+
+logger = logging.getLogger(__name__)
+
+
+# Payouts kept on a ResolutionResult for the results message
+RESULT_PAYOUTS_SHOWN = 10
+
+
+class JobLeaseLost(Exception):
+    """Raised when another worker has claimed a job this worker was running."""
+
+
+class Payout(NamedTuple):
+    """A single credit made while resolving a wager."""
+    position_id: int
+    user_id: int
+    bet_amount: int
+    amount: int
+
+
+class ResolutionResult(NamedTuple):
+    """The outcome of a resolution job, for reporting."""
+    wager_id: int
+    title: str
+    option_index: int
+    option_label: str
+    total_pool: int
+    rake: int
+    refunded: bool
+    winners: int
+    payouts: List[Payout]  # The first RESULT_PAYOUTS_SHOWN, in position order
+
+
+async def enqueue_job(session, job_type: str, payload: dict) -> Job:
+    """Add a queued job to the session. The caller commits."""
+    job = Job(job_type=job_type, payload=payload, status=JOB_STATUS_QUEUED, attempts=0)
+    session.add(job)
+    await session.flush()
+    return job
+
+
+async def claim_job(session) -> Optional[Job]:
+    """Claim the oldest runnable job, or return None if there is none.
+
+    Queued jobs are runnable, and so are running jobs whose lease expired.
+    Jobs that have used up their attempts are marked failed instead.
+    """
+    while True:
+        lease_cutoff = datetime.utcnow() - timedelta(seconds=config.JOB_LEASE_SECONDS)
+        result = await session.execute(
+            select(Job)
+            .where(or_(
+                Job.status == JOB_STATUS_QUEUED,
+                and_(Job.status == JOB_STATUS_RUNNING, Job.locked_at < lease_cutoff)
+            ))
+            .order_by(Job.created_at, Job.job_id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = result.scalar_one_or_none()
+        if job is None:
+            await session.rollback()
+            return None
+
+        if job.attempts >= config.JOB_MAX_ATTEMPTS:
+            job.status = JOB_STATUS_FAILED
+            job.last_error = job.last_error or "Worker stopped without finishing the job."
+            await session.commit()
+            logger.error(f"Job {job.job_id} abandoned after {job.attempts} attempt(s)")
+            continue
+
+        job.status = JOB_STATUS_RUNNING
+        job.attempts += 1
+        job.locked_at = datetime.utcnow()
+        await session.commit()
+        return job
+
+
+async def _lock_job(session, job: Job):
+    """Lock a claimed job's row, checking this worker still holds it."""
+    result = await session.execute(
+        select(Job.status, Job.attempts).where(Job.job_id == job.job_id).with_for_update()
+    )
+    row = result.first()
+    if row is None or row.status != JOB_STATUS_RUNNING or row.attempts != job.attempts:
+        raise JobLeaseLost(f"Job {job.job_id} was claimed by another worker")
+
+
+async def fail_job(session, job: Job, error: str) -> bool:
+    """Record a failed attempt, requeueing the job while it has attempts left.
+
+    Returns True if the job has now failed for good.
+    """
+    await _lock_job(session, job)
+    given_up = job.attempts >= config.JOB_MAX_ATTEMPTS
+    await session.execute(
+        update(Job)
+        .where(Job.job_id == job.job_id)
+        .values(status=JOB_STATUS_FAILED if given_up else JOB_STATUS_QUEUED, last_error=error[:2000])
+    )
+    await session.commit()
+    return given_up
+
+
+async def get_latest_job(session, job_type: str, wager_id: int) -> Optional[Job]:
+    """Get the most recent job of a type for a wager, or None."""
+    result = await session.execute(
+        select(Job)
+        .where(Job.job_type == job_type)
+        .where(Job.payload["wager_id"].as_integer() == wager_id)
+        .order_by(Job.job_id.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+def requeue_job(job: Job):
+    """Queue a failed job again with fresh attempts, keeping its checkpoint. The caller commits."""
+    job.status = JOB_STATUS_QUEUED
+    job.attempts = 0
+    job.last_error = None
+
+
+# Everything a resolution's payouts depend on, in one pass over the wager's positions
+_RESOLUTION_TOTALS = select(
+    func.coalesce(func.sum(Position.amount), 0),
+    func.count(),
+    func.coalesce(func.sum(Position.amount).filter(Position.option_index == bindparam("option_index")), 0),
+    func.count().filter(Position.option_index == bindparam("option_index"))
+).where(Position.wager_id == bindparam("wager_id"))
+
+
+def _remainder():
+    """A winning stake's rounding remainder: stake * pool mod winning total, in numeric to avoid overflow."""
+    return func.mod(
+        cast(Position.amount, Numeric) * bindparam("pool", type_=Numeric),
+        bindparam("winning_total", type_=Numeric)
+    )
+
+
+_WINNING = and_(
+    Position.wager_id == bindparam("wager_id"), Position.option_index == bindparam("option_index")
+)
+
+# Bits handed out before rounding: the sum of every floor(stake * pool / winning total)
+_FLOORED_SHARES = select(func.sum(func.div(
+    cast(Position.amount, Numeric) * bindparam("pool", type_=Numeric),
+    bindparam("winning_total", type_=Numeric)
+))).where(_WINNING)
+
+# The last stake that gets one of the leftover bits, as rounding_cutoff finds it over position IDs
+_ROUNDING_CUTOFF = (
+    select(_remainder(), Position.position_id)
+    .where(_WINNING)
+    .order_by(_remainder().desc(), Position.position_id)
+    .offset(bindparam("skip"))
+    .limit(1)
+)
+
+
+def _payable_stakes(refunded: bool):
+    stmt = select(Position.position_id, Position.user_id, Position.option_index, Position.amount)
+    stmt = stmt.where(Position.wager_id == bindparam("wager_id"))
+    if not refunded:
+        stmt = stmt.where(Position.option_index == bindparam("option_index"))
+    return stmt.order_by(Position.position_id)
+
+
+# refunded -> positions paid out, in position_id order
+_PAYABLE_STAKES = {refunded: _payable_stakes(refunded) for refunded in (False, True)}
+
+
+class PayoutPlan(NamedTuple):
+    """How a resolution splits its pool, worked out from aggregates so payouts can be streamed."""
+    total_pool: int
+    rake: int
+    refunded: bool
+    payouts: int
+    winning_total: int
+    cutoff: Optional[Tuple[int, int]]  # (remainder, position_id) of the last stake given a leftover bit
+
+    def payout(self, position_id: int, amount: int) -> int:
+        """Return what one payable position is paid; the same as allocate_payouts over all of them."""
+        if self.refunded:
+            return amount
+        return stake_payout(amount, position_id, self.total_pool - self.rake, self.winning_total, self.cutoff)
+
+
+async def plan_resolution(session, wager_id: int, option_index: int, rake_bps: int) -> PayoutPlan:
+    """Work out how a resolution pays out without loading the positions.
+
+    Winners split the pool less the rake by the largest-remainder method: the
+    rounding bits go to the stakes with the largest remainders, ties to the
+    earlier position, and the ``cutoff`` found here marks the last of them. The
+    plan depends only on the positions, which can't change once a wager is
+    being resolved: bets hold the wager's row share-locked while it's open, and
+    resolving locks it for update. A resumed job recomputes the same credits.
+    """
+    params = {"wager_id": wager_id, "option_index": option_index}
+    total_pool, positions, winning_total, winners = (await session.execute(_RESOLUTION_TOTALS, params)).one()
+    total_pool, winning_total = int(total_pool), int(winning_total)
+
+    if not winners:
+        # No winners - refund all bets
+        return PayoutPlan(total_pool, 0, True, positions, 0, None)
+
+    rake = apply_rake(total_pool, rake_bps)
+    params.update(pool=total_pool - rake, winning_total=winning_total)
+    floored = int((await session.execute(_FLOORED_SHARES, params)).scalar_one())
+    leftover = total_pool - rake - floored
+    cutoff = None
+    if leftover:
+        remainder, position_id = (await session.execute(_ROUNDING_CUTOFF, {**params, "skip": leftover - 1})).one()
+        cutoff = (int(remainder), position_id)
+    return PayoutPlan(total_pool, rake, False, winners, winning_total, cutoff)
+
+
+async def run_resolve_job(
+    job: Job,
+    on_progress: Optional[Callable[[int, int], Awaitable]] = None
+) -> ResolutionResult:
+    """Pay out a wager in checkpointed chunks, then mark it resolved.
+
+    Each chunk's credits, audit rows and the job checkpoint (the last
+    position_id paid) commit in one transaction, so after a crash the job
+    resumes from the first unpaid position without paying anyone twice.
+    Positions are streamed a chunk at a time, so memory doesn't grow with the
+    size of the wager.
+    """
+    wager_id = job.payload["wager_id"]
+    option_index = job.payload["winning_option"]
+    chunk_size = max(config.JOB_CHUNK_SIZE, 1)
+
+    shown = []
+    done = 0
+    async with get_session() as read_session:
+        wager = await get_wager(read_session, wager_id)
+        if wager is None:
+            raise ValueError(f"Wager with ID {wager_id} not found.")
+        plan = await plan_resolution(
+            read_session, wager_id, option_index, job.payload.get("rake_bps", config.HOUSE_RAKE_BPS)
+        )
+        transaction_type = TRANSACTION_TYPE_BET_REFUNDED if plan.refunded else TRANSACTION_TYPE_BET_WON
+
+        checkpoint = job.checkpoint or 0
+        if checkpoint:
+            logger.info(f"Resuming job {job.job_id} for wager {wager_id} after position {checkpoint}")
+
+        stakes = stream_chunks(
+            read_session, _PAYABLE_STAKES[plan.refunded], chunk_size,
+            {"wager_id": wager_id, "option_index": option_index}
+        )
+        async for stakes_chunk in stakes:
+            chunk = [
+                Payout(stake.position_id, stake.user_id, stake.amount, plan.payout(stake.position_id, stake.amount))
+                for stake in stakes_chunk
+            ]
+            shown.extend(chunk[:RESULT_PAYOUTS_SHOWN - len(shown)])
+            # Positions up to the checkpoint were paid by an earlier attempt
+            paid = sum(1 for payout in chunk if payout.position_id <= checkpoint)
+            done += paid
+            chunk = chunk[paid:]
+            if not chunk:
+                continue
+
+            async with get_session() as session:
+                await _lock_job(session, job)
+                await apply_balance_changes(
+                    session,
+                    wager.guild_id,
+                    [(payout.user_id, payout.amount, payout.position_id) for payout in chunk],
+                    transaction_type,
+                    commit=False
+                )
+                await session.execute(
+                    update(Job)
+                    .where(Job.job_id == job.job_id)
+                    .values(checkpoint=chunk[-1].position_id, locked_at=datetime.utcnow())
+                )
+                await session.commit()
+            job.checkpoint = chunk[-1].position_id
+            done += len(chunk)
+            if on_progress:
+                await on_progress(done, plan.payouts)
+
+    async with get_session() as session:
+        await _lock_job(session, job)
+        await session.execute(
+            update(Wager)
+            .where(Wager.wager_id == wager_id)
+            .values(status=WAGER_STATUS_RESOLVED, winning_option=option_index, resolved_at=datetime.utcnow())
+        )
+        await session.execute(
+            update(Job).where(Job.job_id == job.job_id).values(status=JOB_STATUS_DONE, locked_at=None)
+        )
+        await session.commit()
+
+    return ResolutionResult(
+        wager_id=wager_id,
+        title=wager.title,
+        option_index=option_index,
+        option_label=wager.options[option_index],
+        total_pool=plan.total_pool,
+        rake=plan.rake,
+        refunded=plan.refunded,
+        winners=plan.payouts,
+        payouts=shown
+    )
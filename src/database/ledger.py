@@ -0,0 +1,276 @@
+"""Write-behind balance ledger.
+
+In ledger mode (``BALANCE_LEDGER_MODE``) a balance change doesn't update the
+user's row. It appends a row to ``balance_ledger`` alongside its audit row
+in ``transactions``, and a user's balance is their ``bits_balance`` snapshot
+plus the sum of their pending ledger entries. Appends take no row locks, so
+a busy user's changes stop queueing behind each other on their users row.
+Debits that must not overdraw (bets) are the exception: they lock the row
+and append only if snapshot + ledger covers them.
+
+The compactor folds pending entries into the snapshots in batches. Each
+batch is a single ``DELETE ... RETURNING`` feeding an ``UPDATE``: an entry
+leaves the ledger in the same transaction that adds it to the snapshot, so
+snapshot + ledger never changes under a reader.
+
+Balances are read from ``ledger_balances``, an in-memory cache of running
+totals that is adjusted as ledger changes commit. Only the first read of a
+user's balance goes to the database.
+"""
+import logging
+from collections import Counter, OrderedDict
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import BigInteger, Integer, bindparam, delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+from src import config
+from src.database.database import get_session
+from src.database.models import User, LedgerEntry
+
+logger = logging.getLogger(__name__)
+
+# session.info key holding ledger changes that apply to the cache once the session commits
+_PENDING_KEY = "ledger_pending"
+
+
+class LedgerBalances:
+    """LRU cache of running balances, kept current as ledger changes commit."""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self.stats = Counter()  # "hits", "misses"
+        self._balances = OrderedDict()  # (guild_id, user_id) -> balance
+        self._loading = Counter()  # key -> loads in flight
+        self._dirty = set()  # keys that changed while being loaded
+
+    def get(self, key: Tuple[int, int]) -> Optional[int]:
+        """Return a cached balance, or None if it needs loading."""
+        balance = self._balances.get(key)
+        if balance is None:
+            self.stats["misses"] += 1
+            return None
+        self._balances.move_to_end(key)
+        self.stats["hits"] += 1
+        return balance
+
+    def begin_load(self, key: Tuple[int, int]):
+        """Note that a balance is about to be loaded from the database."""
+        self._loading[key] += 1
+
+    def finish_load(self, key: Tuple[int, int], balance: int) -> int:
+        """Cache a loaded balance, unless a change committed while it was loading."""
+        self._end_load(key, cache=balance)
+        return balance
+
+    def cancel_load(self, key: Tuple[int, int]):
+        """Abandon a load that failed or found no user."""
+        self._end_load(key)
+
+    def _end_load(self, key, cache: Optional[int] = None):
+        self._loading[key] -= 1
+        stale = key in self._dirty
+        if self._loading[key] <= 0:
+            del self._loading[key]
+            self._dirty.discard(key)
+        if cache is not None and not stale:
+            self._balances[key] = cache
+            if len(self._balances) > self.max_users:
+                self._balances.popitem(last=False)
+
+    def apply(self, key: Tuple[int, int], amount: int):
+        """Add a committed change to a cached balance, or spoil a load in flight."""
+        if key in self._balances:
+            self._balances[key] += amount
+        elif key in self._loading:
+            self._dirty.add(key)
+
+    def forget(self, key: Tuple[int, int]):
+        """Drop a cached balance, e.g. after it was set outside the ledger, and spoil a load in flight."""
+        self._balances.pop(key, None)
+        if key in self._loading:
+            self._dirty.add(key)
+
+    def clear(self):
+        """Forget every cached balance."""
+        self._balances.clear()
+
+
+ledger_balances = LedgerBalances(config.LEDGER_CACHE_SIZE)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    for key, amount in session.info.pop(_PENDING_KEY, ()):
+        ledger_balances.apply(key, amount)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def queue_balance_updates(session, guild_id: int, changes: Iterable[Tuple[int, int]]):
+    """Apply (user_id, amount) changes to the cached balances once the session commits."""
+    session.info.setdefault(_PENDING_KEY, []).extend(
+        ((guild_id, user_id), amount) for user_id, amount in changes
+    )
+
+
+async def append_ledger_entries(session, guild_id: int, changes: Iterable[Tuple[int, int]]):
+    """Append (user_id, amount) changes to the ledger. The caller commits."""
+    changes = [(user_id, amount) for user_id, amount in changes if amount]
+    if not changes:
+        return
+    await session.execute(
+        insert(LedgerEntry),
+        [{"guild_id": guild_id, "user_id": user_id, "amount": amount} for user_id, amount in changes]
+    )
+    queue_balance_updates(session, guild_id, changes)
+
+
+_BALANCE = (
+    select(
+        User.bits_balance + func.coalesce(
+            select(func.sum(LedgerEntry.amount))
+            .where(LedgerEntry.guild_id == User.guild_id)
+            .where(LedgerEntry.user_id == User.user_id)
+            .scalar_subquery(),
+            0
+        )
+    )
+    .where(User.guild_id == bindparam("guild_id"))
+    .where(User.user_id == bindparam("user_id"))
+)
+
+
+# Locks the user's row, so funded debits for one user take turns. NO KEY
+# UPDATE, like a row-mode balance UPDATE, so the key-share locks the caller's
+# own foreign keys already hold on the row don't deadlock it
+_LOCK_USER = (
+    select(User.user_id)
+    .where(User.guild_id == bindparam("guild_id"))
+    .where(User.user_id == bindparam("user_id"))
+    .with_for_update(key_share=True)
+)
+
+# Appends a debit only if the balance covers it, returning nothing otherwise
+_FUNDED_DEBIT = (
+    insert(LedgerEntry.__table__)
+    .from_select(
+        ["guild_id", "user_id", "amount"],
+        select(
+            bindparam("guild_id", type_=BigInteger),
+            bindparam("user_id", type_=BigInteger),
+            bindparam("amount", type_=Integer)
+        )
+        .where(_BALANCE.scalar_subquery() + bindparam("amount", type_=Integer) >= 0)
+    )
+    .returning(LedgerEntry.entry_id)
+)
+
+
+async def append_funded_debit(session, guild_id: int, user_id: int, amount: int) -> bool:
+    """Append a debit only if the user's balance covers it. The caller commits.
+
+    The user's row is locked first and the check runs in a statement of its
+    own, so it sees every debit committed before the lock was granted.
+    Credits still append without a lock; they can only raise the balance.
+    """
+    params = {"guild_id": guild_id, "user_id": user_id, "amount": amount}
+    await session.execute(_LOCK_USER, params)
+    appended = (await session.execute(_FUNDED_DEBIT, params)).first()
+    if appended is None:
+        return False
+    queue_balance_updates(session, guild_id, [(user_id, amount)])
+    return True
+
+
+async def get_ledger_balance(guild_id: int, user_id: int, session=None) -> Optional[int]:
+    """Get a user's running balance, or None if they have no row in the guild.
+
+    Misses load from the primary, so the cache only ever holds committed
+    balances, never a lagging replica's or an open transaction's. They go
+    through the caller's ``session`` when it has no ledger changes of its own
+    waiting to commit, so a caller holding a connection never waits on the
+    pool for a second one, and through a session of their own otherwise.
+    """
+    key = (guild_id, user_id)
+    balance = ledger_balances.get(key)
+    if balance is not None:
+        return balance
+
+    ledger_balances.begin_load(key)
+    try:
+        if session is not None and not session.info.get(_PENDING_KEY):
+            result = await session.execute(_BALANCE, {"guild_id": guild_id, "user_id": user_id})
+            balance = result.scalar_one_or_none()
+        else:
+            async with get_session() as own_session:
+                result = await own_session.execute(_BALANCE, {"guild_id": guild_id, "user_id": user_id})
+                balance = result.scalar_one_or_none()
+    except Exception:
+        ledger_balances.cancel_load(key)
+        raise
+    if balance is None:
+        ledger_balances.cancel_load(key)
+        return None
+    return ledger_balances.finish_load(key, int(balance))
+
+
+def _compact_statement():
+    """Fold a batch of the oldest ledger entries into their users' snapshots."""
+    batch = (
+        select(LedgerEntry.entry_id)
+        .order_by(LedgerEntry.entry_id)
+        .limit(bindparam("batch_size"))
+        .with_for_update(skip_locked=True)
+    )
+    moved = (
+        delete(LedgerEntry)
+        .where(LedgerEntry.entry_id.in_(batch.scalar_subquery()))
+        .returning(LedgerEntry.guild_id, LedgerEntry.user_id, LedgerEntry.amount)
+        .cte("moved")
+    )
+    folded = (
+        select(moved.c.guild_id, moved.c.user_id, func.sum(moved.c.amount).label("amount"))
+        .group_by(moved.c.guild_id, moved.c.user_id)
+        .subquery("folded")
+    )
+    return (
+        update(User)
+        .add_cte(moved)
+        .where(User.guild_id == folded.c.guild_id)
+        .where(User.user_id == folded.c.user_id)
+        .values(bits_balance=User.bits_balance + folded.c.amount)
+        .execution_options(synchronize_session=False)
+    )
+
+
+_COMPACT = _compact_statement()
+
+
+async def compact_batch(session, batch_size: int) -> int:
+    """Fold one batch of ledger entries into the snapshots and commit.
+
+    Returns the number of users whose snapshot changed; 0 once the ledger is empty.
+    """
+    result = await session.execute(_COMPACT, {"batch_size": batch_size})
+    await session.commit()
+    return result.rowcount
+
+
+async def run_ledger_compactor() -> int:
+    """Fold every pending ledger entry into the snapshots, batch by batch.
+
+    Returns the number of user snapshots updated.
+    """
+    batch_size = max(config.LEDGER_COMPACT_BATCH_SIZE, 1)
+    folded = 0
+    async with get_session() as session:
+        while True:
+            users = await compact_batch(session, batch_size)
+            if not users:
+                break
+            folded += users
+    if folded:
+        logger.debug(f"Compacted ledger entries into {folded} balance snapshot(s)")
+    return folded
@@ -1,7 +1,7 @@
 """SQLAlchemy models for the Discord Bits Wagering Bot."""
 from sqlalchemy import (
-    BigInteger, Integer, Text, TIMESTAMP, ForeignKey, String,
-    func, CheckConstraint, Column
+    BigInteger, Integer, Text, TIMESTAMP, Date, ForeignKey, String,
+    func, CheckConstraint, Column, ForeignKeyConstraint, Index, Sequence, UniqueConstraint
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
@@ -13,7 +13,9 @@ Base = declarative_base()
 # Wager status constants
 WAGER_STATUS_OPEN = "open"
 WAGER_STATUS_CLOSED = "closed"
+WAGER_STATUS_RESOLVING = "resolving"
 WAGER_STATUS_RESOLVED = "resolved"
+WAGER_STATUS_VOIDED = "voided"
 
 # Transaction type constants
 TRANSACTION_TYPE_DAILY_REWARD = "daily_reward"
@@ -23,7 +25,13 @@ TRANSACTION_TYPE_BET_REFUNDED = "bet_refunded"
 TRANSACTION_TYPE_ADMIN_ADJUSTMENT = "admin_adjustment"
 
 # Valid values for validation
-VALID_WAGER_STATUSES = {WAGER_STATUS_OPEN, WAGER_STATUS_CLOSED, WAGER_STATUS_RESOLVED}
+VALID_WAGER_STATUSES = {
+    WAGER_STATUS_OPEN,
+    WAGER_STATUS_CLOSED,
+    WAGER_STATUS_RESOLVING,
+    WAGER_STATUS_RESOLVED,
+    WAGER_STATUS_VOIDED
+}
 VALID_TRANSACTION_TYPES = {
     TRANSACTION_TYPE_DAILY_REWARD,
     TRANSACTION_TYPE_BET_PLACED,
@@ -32,6 +40,14 @@ VALID_TRANSACTION_TYPES = {
     TRANSACTION_TYPE_ADMIN_ADJUSTMENT
 }
 
+# Background job constants
+JOB_TYPE_RESOLVE_WAGER = "resolve_wager"
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_DONE = "done"
+JOB_STATUS_FAILED = "failed"
+
 
 def validate_wager_status(status: str) -> str:
     """Validate wager status value."""
@@ -47,10 +63,17 @@ def validate_transaction_type(transaction_type: str) -> str:
     return transaction_type
 
 
+def _guild_user_fk(user_column: str, name: str) -> ForeignKeyConstraint:
+    """Foreign key from (guild_id, ``user_column``) to a user's balance row."""
+    return ForeignKeyConstraint(["guild_id", user_column], ["users.guild_id", "users.user_id"], name=name)
+
+
 class User(Base):
-    """User model for storing user balances and daily reward tracking."""
+    """User model for storing a user's balance in one guild and their daily reward tracking."""
     __tablename__ = "users"
 
+    # Balances are per guild; guild_id leads the key so a guild's rows stay together
+    guild_id = Column(BigInteger, primary_key=True)
     user_id = Column(BigInteger, primary_key=True)
     bits_balance = Column(Integer, default=1000, nullable=False)
     last_daily_reward = Column(TIMESTAMP, nullable=True)
@@ -62,7 +85,7 @@ class User(Base):
     transactions = relationship("Transaction", back_populates="user")
 
     def __repr__(self):
-        return f"<User(user_id={self.user_id}, bits_balance={self.bits_balance})>"
+        return f"<User(guild_id={self.guild_id}, user_id={self.user_id}, bits_balance={self.bits_balance})>"
 
 
 class Wager(Base):
@@ -70,7 +93,8 @@ class Wager(Base):
     __tablename__ = "wagers"
 
     wager_id = Column(Integer, primary_key=True, autoincrement=True)
-    creator_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False)
+    guild_id = Column(BigInteger, nullable=False)
+    creator_id = Column(BigInteger, nullable=False)
     title = Column(Text, nullable=False)
     description = Column(Text, nullable=True)
     options = Column(JSONB, nullable=False)  # Array of choice options
@@ -82,20 +106,27 @@ class Wager(Base):
     resolved_at = Column(TIMESTAMP, nullable=True)
 
     # Relationships
-    creator = relationship("User", back_populates="wagers_created", foreign_keys=[creator_id])
+    creator = relationship("User", back_populates="wagers_created", foreign_keys=[guild_id, creator_id])
     bets = relationship("Bet", back_populates="wager", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        _guild_user_fk("creator_id", "fk_wagers_guild_creator"),
+        Index("ix_wagers_guild_status_created_at", "guild_id", "status", "created_at"),
+        Index("ix_wagers_status_resolved_at", "status", "resolved_at"),
+    )
+
     def __repr__(self):
         return f"<Wager(wager_id={self.wager_id}, title={self.title}, status={self.status})>"
 
 
 class Bet(Base):
-    """Bet model for storing individual bets placed on wagers."""
+    """Bet model for individual bets placed before positions were introduced (kept for history)."""
     __tablename__ = "bets"
 
     bet_id = Column(Integer, primary_key=True, autoincrement=True)
+    guild_id = Column(BigInteger, nullable=False)
     wager_id = Column(Integer, ForeignKey("wagers.wager_id"), nullable=False)
-    user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False)
+    user_id = Column(BigInteger, nullable=False)
     option_index = Column(Integer, nullable=False)
     amount = Column(Integer, nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
@@ -105,6 +136,8 @@ class Bet(Base):
     user = relationship("User", back_populates="bets")
 
     __table_args__ = (
+        _guild_user_fk("user_id", "fk_bets_guild_user"),
+        Index("ix_bets_guild_user", "guild_id", "user_id"),
         CheckConstraint("amount > 0", name="check_positive_amount"),
         CheckConstraint("option_index >= 0", name="check_valid_option_index"),
     )
@@ -113,20 +146,81 @@ class Bet(Base):
         return f"<Bet(bet_id={self.bet_id}, wager_id={self.wager_id}, user_id={self.user_id}, amount={self.amount})>"
 
 
+# Stamped on a position by every bet on it, so bets can be ordered across positions
+position_bet_seq = Sequence("position_bet_seq", metadata=Base.metadata)
+
+
+class Position(Base):
+    """A user's combined stake on one option of a wager, topped up by every bet on it."""
+    __tablename__ = "positions"
+
+    position_id = Column(Integer, primary_key=True, autoincrement=True)
+    guild_id = Column(BigInteger, nullable=False)
+    wager_id = Column(Integer, ForeignKey("wagers.wager_id"), nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    option_index = Column(Integer, nullable=False)
+    amount = Column(Integer, nullable=False)
+    bet_count = Column(Integer, default=1, nullable=False)
+    last_bet_seq = Column(BigInteger, nullable=False)  # position_bet_seq value of the latest bet
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        _guild_user_fk("user_id", "fk_positions_guild_user"),
+        UniqueConstraint("wager_id", "user_id", "option_index", name="uq_positions_wager_user_option"),
+        Index("ix_positions_guild_user", "guild_id", "user_id"),
+        CheckConstraint("amount > 0", name="check_position_positive_amount"),
+        CheckConstraint("option_index >= 0", name="check_position_valid_option_index"),
+    )
+
+    def __repr__(self):
+        return f"<Position(position_id={self.position_id}, wager_id={self.wager_id}, user_id={self.user_id}, amount={self.amount})>"
+
+
+class WagerOption(Base):
+    """One option of a wager with running totals of the positions on it, kept current by every bet."""
+    __tablename__ = "wager_options"
+
+    wager_id = Column(Integer, ForeignKey("wagers.wager_id"), primary_key=True)
+    idx = Column(Integer, primary_key=True)  # Position in Wager.options
+    label = Column(Text, nullable=False)
+    total_staked = Column(BigInteger, default=0, nullable=False)
+    position_count = Column(Integer, default=0, nullable=False)
+    last_bet_seq = Column(BigInteger, default=0, nullable=False)  # position_bet_seq value of the latest bet
+
+    __table_args__ = (
+        CheckConstraint("idx >= 0", name="check_wager_option_valid_idx"),
+    )
+
+    def __repr__(self):
+        return f"<WagerOption(wager_id={self.wager_id}, idx={self.idx}, total_staked={self.total_staked})>"
+
+
 class Transaction(Base):
     """Transaction model for audit log of all bit transactions."""
     __tablename__ = "transactions"
 
     transaction_id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False)
+    guild_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
     amount = Column(Integer, nullable=False)  # Positive for credits, negative for debits
     transaction_type = Column(String(30), nullable=False)
-    reference_id = Column(Integer, nullable=True)  # Links to bet_id or wager_id
+    reference_id = Column(Integer, nullable=True)  # Links to position_id or wager_id
     created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
 
     # Relationships
     user = relationship("User", back_populates="transactions")
 
+    __table_args__ = (
+        _guild_user_fk("user_id", "fk_transactions_guild_user"),
+        Index("ix_transactions_guild_user_created_at", "guild_id", "user_id", "created_at"),
+        # Finds a position's earlier bets, to tell the bet that opened it from top-ups
+        Index(
+            "ix_transactions_bet_reference", "reference_id", "transaction_id",
+            postgresql_where=transaction_type == TRANSACTION_TYPE_BET_PLACED
+        ),
+    )
+
     def __repr__(self):
         return f"<Transaction(transaction_id={self.transaction_id}, user_id={self.user_id}, amount={self.amount}, type={self.transaction_type})>"
 
@@ -143,3 +237,173 @@ class GuildSettings(Base):
     def __repr__(self):
         return f"<GuildSettings(guild_id={self.guild_id}, wager_channel_id={self.wager_channel_id})>"
 
+
+
+class Job(Base):
+    """Background job queued for the worker, with its progress checkpoint."""
+    __tablename__ = "jobs"
+
+    job_id = Column(Integer, primary_key=True, autoincrement=True)
+    job_type = Column(String(30), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String(20), default=JOB_STATUS_QUEUED, nullable=False)
+    checkpoint = Column(Integer, nullable=True)  # Last item processed, e.g. position_id for resolutions
+    attempts = Column(Integer, default=0, nullable=False)
+    locked_at = Column(TIMESTAMP, nullable=True)  # Last heartbeat of the worker holding the job
+    last_error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<Job(job_id={self.job_id}, job_type={self.job_type}, status={self.status}, checkpoint={self.checkpoint})>"
+
+
+class ProcessedInteraction(Base):
+    """Discord interaction that has already been handled, for idempotency."""
+    __tablename__ = "processed_interactions"
+
+    interaction_id = Column(BigInteger, primary_key=True)
+    command = Column(String(30), nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_processed_interactions_created_at", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<ProcessedInteraction(interaction_id={self.interaction_id}, command={self.command})>"
+
+
+class WagerSummary(Base):
+    """Compact record of an archived wager: its outcome, per-option totals and winners."""
+    __tablename__ = "wager_summaries"
+
+    wager_id = Column(Integer, primary_key=True, autoincrement=False)
+    guild_id = Column(BigInteger, nullable=False)
+    creator_id = Column(BigInteger, nullable=False)
+    title = Column(Text, nullable=False)
+    description = Column(Text, nullable=True)
+    options = Column(JSONB, nullable=False)
+    status = Column(String(20), nullable=False)
+    winning_option = Column(Integer, nullable=True)
+    total_pool = Column(BigInteger, nullable=False)
+    option_totals = Column(JSONB, nullable=False)  # Staked total per option
+    option_counts = Column(JSONB, nullable=False)  # Positions per option
+    winners = Column(JSONB, nullable=False)  # [[user_id, stake], ...] on the winning option
+    created_at = Column(TIMESTAMP, nullable=False)
+    resolved_at = Column(TIMESTAMP, nullable=True)
+    archived_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<WagerSummary(wager_id={self.wager_id}, title={self.title}, status={self.status})>"
+
+
+class ArchivedPosition(Base):
+    """Position of an archived wager, moved out of the hot positions table."""
+    __tablename__ = "archived_positions"
+
+    position_id = Column(Integer, primary_key=True, autoincrement=False)
+    guild_id = Column(BigInteger, nullable=False)
+    wager_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(BigInteger, nullable=False)
+    option_index = Column(Integer, nullable=False)
+    amount = Column(Integer, nullable=False)
+    bet_count = Column(Integer, nullable=False)
+    last_bet_seq = Column(BigInteger, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False)
+    updated_at = Column(TIMESTAMP, nullable=False)
+
+    def __repr__(self):
+        return f"<ArchivedPosition(position_id={self.position_id}, wager_id={self.wager_id}, user_id={self.user_id})>"
+
+
+class ArchivedBet(Base):
+    """Legacy bet of an archived wager, moved out of the hot bets table."""
+    __tablename__ = "archived_bets"
+
+    bet_id = Column(Integer, primary_key=True, autoincrement=False)
+    guild_id = Column(BigInteger, nullable=False)
+    wager_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(BigInteger, nullable=False)
+    option_index = Column(Integer, nullable=False)
+    amount = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False)
+
+    def __repr__(self):
+        return f"<ArchivedBet(bet_id={self.bet_id}, wager_id={self.wager_id}, user_id={self.user_id})>"
+
+
+class UserStats(Base):
+    """Lifetime betting statistics of a user in a guild, rolled up from transactions."""
+    __tablename__ = "user_stats"
+
+    guild_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    bets_placed = Column(Integer, default=0, nullable=False)
+    positions = Column(Integer, default=0, nullable=False)  # Bets that opened a position, not top-ups
+    total_wagered = Column(BigInteger, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    total_won = Column(BigInteger, default=0, nullable=False)
+    biggest_win = Column(BigInteger, default=0, nullable=False)
+    total_refunded = Column(BigInteger, default=0, nullable=False)
+    daily_rewards = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<UserStats(user_id={self.user_id}, bets_placed={self.bets_placed}, wins={self.wins})>"
+
+
+class DailyUserStats(Base):
+    """A user's betting statistics in a guild for one day, rolled up from transactions."""
+    __tablename__ = "daily_user_stats"
+
+    guild_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    day = Column(Date, primary_key=True)
+    bets_placed = Column(Integer, default=0, nullable=False)
+    positions = Column(Integer, default=0, nullable=False)  # Bets that opened a position, not top-ups
+    total_wagered = Column(BigInteger, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    total_won = Column(BigInteger, default=0, nullable=False)
+    biggest_win = Column(BigInteger, default=0, nullable=False)
+    total_refunded = Column(BigInteger, default=0, nullable=False)
+    daily_rewards = Column(BigInteger, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<DailyUserStats(user_id={self.user_id}, day={self.day})>"
+
+
+class StatsWatermark(Base):
+    """Highest transaction_id already folded into a set of rollup tables."""
+    __tablename__ = "stats_watermarks"
+
+    name = Column(String(30), primary_key=True)
+    last_transaction_id = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<StatsWatermark(name={self.name}, last_transaction_id={self.last_transaction_id})>"
+
+
+class LedgerEntry(Base):
+    """A balance change not yet folded into the user's bits_balance (ledger mode only)."""
+    __tablename__ = "balance_ledger"
+
+    entry_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    guild_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    amount = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        _guild_user_fk("user_id", "fk_balance_ledger_guild_user"),
+        Index("ix_balance_ledger_guild_user", "guild_id", "user_id"),
+    )
+
+    def __repr__(self):
+        return f"<LedgerEntry(entry_id={self.entry_id}, user_id={self.user_id}, amount={self.amount})>"
@@ -0,0 +1,196 @@
+"""Balance reconciliation against the transaction log.
+
+Every balance change writes an audit row to ``transactions``, so a user's
+balance should always equal the starting balance plus the sum of their
+transactions. This module finds the users for whom it doesn't, and can
+repair them.
+
+The users key is split into chunks of ``RECONCILE_CHUNK_SIZE`` users by
+walking the primary key index. The chunks are then checked concurrently:
+each is one aggregate query over a (guild_id, user_id) key range, which the
+users key and the transactions and ledger indexes all serve directly. Each
+check runs as a single statement, so it sees a balance and its transactions
+at the same instant and concurrent bets can't show up as false drift.
+
+A repair moves a balance by the drift it was found with, not to an absolute
+value, so changes that commit in between are kept.
+"""
+import asyncio
+import logging
+import time
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, bindparam, func, literal, select, tuple_, update, BigInteger
+from src import config
+from src.database.database import get_session
+from src.database.models import User, Transaction, LedgerEntry
+
+logger = logging.getLogger(__name__)
+
+
+class Discrepancy(NamedTuple):
+    """A balance that doesn't match its transaction log."""
+    guild_id: int
+    user_id: int
+    balance: int
+    expected: int
+
+    @property
+    def drift(self) -> int:
+        return self.balance - self.expected
+
+
+class ReconciliationReport(NamedTuple):
+    """The outcome of a reconciliation run."""
+    users: int
+    chunks: int
+    discrepancies: List[Discrepancy]
+    repaired: int
+    seconds: float
+
+
+# Lower bound below every real key, for the first chunk
+_FIRST_KEY = (-1, -1)
+
+
+def _in_range(table):
+    """(guild_id, user_id) in the half-open key range (lo, hi]."""
+    key = tuple_(table.guild_id, table.user_id)
+    return and_(
+        key > tuple_(bindparam("lo_guild", type_=BigInteger), bindparam("lo_user", type_=BigInteger)),
+        key <= tuple_(bindparam("hi_guild", type_=BigInteger), bindparam("hi_user", type_=BigInteger))
+    )
+
+
+def _summed(table, name: str):
+    return (
+        select(table.guild_id, table.user_id, func.sum(table.amount).label("amount"))
+        .where(_in_range(table))
+        .group_by(table.guild_id, table.user_id)
+        .subquery(name)
+    )
+
+
+def _chunk_statement():
+    transactions = _summed(Transaction, "logged")
+    pending = _summed(LedgerEntry, "pending")
+    balance = User.bits_balance + func.coalesce(pending.c.amount, 0)
+    expected = bindparam("starting_balance", type_=BigInteger) + func.coalesce(transactions.c.amount, 0)
+    return (
+        select(User.guild_id, User.user_id, balance, expected)
+        .outerjoin(transactions, and_(
+            transactions.c.guild_id == User.guild_id, transactions.c.user_id == User.user_id
+        ))
+        .outerjoin(pending, and_(pending.c.guild_id == User.guild_id, pending.c.user_id == User.user_id))
+        .where(_in_range(User))
+        .where(balance != expected)
+        .order_by(User.guild_id, User.user_id)
+    )
+
+
+_CHUNK_DISCREPANCIES = _chunk_statement()
+
+# The key a chunk of users ends at: the chunk_size-th key after ``lo``
+_CHUNK_END = (
+    select(User.guild_id, User.user_id)
+    .where(tuple_(User.guild_id, User.user_id) > tuple_(
+        bindparam("lo_guild", type_=BigInteger), bindparam("lo_user", type_=BigInteger)
+    ))
+    .order_by(User.guild_id, User.user_id)
+    .offset(bindparam("skip"))
+    .limit(1)
+)
+
+_LAST_KEY = select(User.guild_id, User.user_id).order_by(User.guild_id.desc(), User.user_id.desc()).limit(1)
+
+
+async def plan_chunks(session, chunk_size: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    """Split the users key into (lo, hi] ranges of up to ``chunk_size`` users each."""
+    last = (await session.execute(_LAST_KEY)).first()
+    if last is None:
+        return []
+
+    chunks = []
+    lo = _FIRST_KEY
+    while True:
+        row = (await session.execute(
+            _CHUNK_END, {"lo_guild": lo[0], "lo_user": lo[1], "skip": chunk_size - 1}
+        )).first()
+        hi = tuple(row) if row is not None else tuple(last)
+        chunks.append((lo, hi))
+        if hi == tuple(last):
+            return chunks
+        lo = hi
+
+
+async def check_chunk(session, lo: Tuple[int, int], hi: Tuple[int, int]) -> List[Discrepancy]:
+    """Find the users in a key range whose balance doesn't match their transactions."""
+    result = await session.execute(_CHUNK_DISCREPANCIES, {
+        "lo_guild": lo[0], "lo_user": lo[1],
+        "hi_guild": hi[0], "hi_user": hi[1],
+        "starting_balance": config.STARTING_BALANCE
+    })
+    return [Discrepancy(guild_id, user_id, int(balance), int(expected)) for guild_id, user_id, balance, expected in result]
+
+
+async def repair(session, discrepancies: List[Discrepancy]) -> int:
+    """Move each drifted balance back by its drift and commit. Returns the number repaired."""
+    repaired = 0
+    for discrepancy in discrepancies:
+        result = await session.execute(
+            update(User)
+            .where(User.guild_id == discrepancy.guild_id)
+            .where(User.user_id == discrepancy.user_id)
+            .values(bits_balance=User.bits_balance - literal(discrepancy.drift, BigInteger))
+            .execution_options(synchronize_session=False)
+        )
+        repaired += result.rowcount
+    await session.commit()
+    if config.BALANCE_LEDGER_MODE:
+        # The cached balances may or may not include the drift, so reload them
+        from src.database.ledger import ledger_balances
+        for discrepancy in discrepancies:
+            ledger_balances.forget((discrepancy.guild_id, discrepancy.user_id))
+    return repaired
+
+
+async def reconcile_balances(
+    repair_drift: bool = False, chunk_size: Optional[int] = None, concurrency: Optional[int] = None
+) -> ReconciliationReport:
+    """Check every balance against the transaction log, optionally repairing drift."""
+    chunk_size = max(chunk_size or config.RECONCILE_CHUNK_SIZE, 1)
+    concurrency = max(concurrency or config.RECONCILE_CONCURRENCY, 1)
+    started = time.perf_counter()
+
+    async with get_session() as session:
+        chunks = await plan_chunks(session, chunk_size)
+        users = (await session.execute(select(func.count()).select_from(User))).scalar_one()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_chunk(lo, hi) -> Tuple[List[Discrepancy], int]:
+        async with semaphore:
+            async with get_session() as session:
+                found = await check_chunk(session, lo, hi)
+                repaired = await repair(session, found) if found and repair_drift else 0
+                return found, repaired
+
+    results = await asyncio.gather(*(run_chunk(lo, hi) for lo, hi in chunks))
+    discrepancies = [discrepancy for found, _ in results for discrepancy in found]
+
+    for discrepancy in discrepancies[:20]:
+        logger.warning(
+            f"Balance drift for user {discrepancy.user_id} in guild {discrepancy.guild_id}: "
+            f"balance {discrepancy.balance}, transactions say {discrepancy.expected} ({discrepancy.drift:+d})"
+        )
+    report = ReconciliationReport(
+        users=users,
+        chunks=len(chunks),
+        discrepancies=discrepancies,
+        repaired=sum(repaired for _, repaired in results),
+        seconds=time.perf_counter() - started
+    )
+    logger.info(
+        f"Reconciled {report.users} balance(s) in {report.chunks} chunk(s) in {report.seconds:.1f}s: "
+        f"{len(discrepancies)} mismatched, {report.repaired} repaired"
+    )
+    return report
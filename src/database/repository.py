@@ -0,0 +1,430 @@
+"""Hot queries shared by the cogs.
+
+Each query is built once at import time with bound parameters. Executing it
+then only looks up the already compiled form in SQLAlchemy's compiled cache,
+without rebuilding or re-keying the statement. On pooled connections the
+identical SQL text also lets asyncpg reuse its prepared statements.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import BigInteger, Integer, Text, bindparam, delete, event, func, insert, literal, select, true, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.orm import selectinload
+from src.database.models import (
+    User, Wager, WagerOption, Position, GuildSettings, WAGER_STATUS_OPEN, position_bet_seq
+)
+
+# Compiled-statement cache outcomes ("cache_hit", "cache_miss", ...) across all engines
+compile_cache_stats = Counter()
+
+_USER_BY_ID = (
+    select(User)
+    .where(User.guild_id == bindparam("guild_id"))
+    .where(User.user_id == bindparam("user_id"))
+)
+
+
+def _wager_by_id(guild_scoped: bool, with_bets: bool, for_update: bool):
+    stmt = select(Wager).where(Wager.wager_id == bindparam("wager_id"))
+    if guild_scoped:
+        stmt = stmt.where(Wager.guild_id == bindparam("guild_id"))
+    if with_bets:
+        stmt = stmt.options(selectinload(Wager.bets))
+    if for_update:
+        stmt = stmt.with_for_update()
+    return stmt
+
+
+# (guild_scoped, with_bets, for_update) -> statement
+_WAGER_BY_ID = {
+    (guild_scoped, with_bets, for_update): _wager_by_id(guild_scoped, with_bets, for_update)
+    for guild_scoped in (False, True)
+    for with_bets in (False, True)
+    for for_update in (False, True)
+}
+
+_OPEN_WAGER_MESSAGES = (
+    select(Wager)
+    .where(Wager.status == WAGER_STATUS_OPEN)
+    .where(Wager.message_id.isnot(None))
+    .where(Wager.channel_id.isnot(None))
+)
+
+_GUILD_SETTINGS = select(GuildSettings).where(GuildSettings.guild_id == bindparam("guild_id"))
+
+
+def track_compile_cache(engine):
+    """Count compiled-cache hits and misses for every statement run on an engine."""
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_cache_hit(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            compile_cache_stats[context.cache_hit.name.lower()] += 1
+
+
+def get_compile_cache_stats() -> dict:
+    """Return compiled-cache counters plus the overall hit ratio."""
+    stats = dict(compile_cache_stats)
+    total = sum(stats.values())
+    stats["hit_ratio"] = stats.get("cache_hit", 0) / total if total else 0.0
+    return stats
+
+
+async def get_user_by_id(session, guild_id: int, user_id: int):
+    """Get a user's row in a guild, or None."""
+    result = await session.execute(_USER_BY_ID, {"guild_id": guild_id, "user_id": user_id})
+    return result.scalar_one_or_none()
+
+
+async def get_wager(
+    session, wager_id: int, guild_id: Optional[int] = None, with_bets: bool = False, for_update: bool = False
+):
+    """Get a wager by ID, optionally with its bets loaded or its row locked.
+
+    With a ``guild_id`` a wager belonging to another guild is returned as None.
+    """
+    params = {"wager_id": wager_id}
+    if guild_id is not None:
+        params["guild_id"] = guild_id
+    stmt = _WAGER_BY_ID[(guild_id is not None, with_bets, for_update)]
+    result = await session.execute(stmt, params)
+    return result.scalar_one_or_none()
+
+
+async def list_open_wager_messages(session):
+    """List open wagers that have a posted message."""
+    result = await session.execute(_OPEN_WAGER_MESSAGES)
+    return result.scalars().all()
+
+
+async def get_guild_settings(session, guild_id: int):
+    """Get a guild's settings row, or None."""
+    result = await session.execute(_GUILD_SETTINGS, {"guild_id": guild_id})
+    return result.scalar_one_or_none()
+
+
+class WagerStatusRow(NamedTuple):
+    """Just enough of a wager to check whether it accepts bets."""
+    wager_id: int
+    status: str
+
+
+class WagerTitleRow(NamedTuple):
+    """A wager's ID and title, for listings."""
+    wager_id: int
+    title: str
+
+
+class StakeRow(NamedTuple):
+    """The fields of a position needed to settle it."""
+    position_id: int
+    user_id: int
+    option_index: int
+    amount: int
+
+
+class OptionTotalRow(NamedTuple):
+    """The staked total and position count on one option of a wager."""
+    option_index: int
+    total: int
+    count: int
+    last_bet_seq: int
+
+
+class WagerOptionRow(NamedTuple):
+    """One option of a wager with its running totals, for rendering."""
+    idx: int
+    label: str
+    total: int
+    count: int
+
+
+class PositionRow(NamedTuple):
+    """A position as it stands right after a bet on it."""
+    position_id: int
+    option_index: int
+    amount: int
+    bet_count: int
+    last_bet_seq: int
+
+
+class WagerNotOpen(Exception):
+    """Raised by place_bet when the wager has stopped taking bets."""
+
+
+class ReservedWagerRow(NamedTuple):
+    """The key and creation time of a wager just inserted."""
+    wager_id: int
+    created_at: datetime
+
+
+class UserBetRow(NamedTuple):
+    """A user's position together with the wager fields needed to display it."""
+    wager_id: int
+    title: str
+    options: list
+    option_index: int
+    amount: int
+
+
+_WAGER_STATUS = (
+    select(Wager.wager_id, Wager.status)
+    .where(Wager.wager_id == bindparam("wager_id"))
+    .where(Wager.guild_id == bindparam("guild_id"))
+)
+
+_OPEN_WAGER_TITLES = (
+    select(Wager.wager_id, Wager.title)
+    .where(Wager.guild_id == bindparam("guild_id"))
+    .where(Wager.status == WAGER_STATUS_OPEN)
+    .order_by(Wager.created_at.desc())
+    .limit(bindparam("limit"))
+)
+
+_WAGER_STAKES = (
+    select(Position.position_id, Position.user_id, Position.option_index, Position.amount)
+    .where(Position.wager_id == bindparam("wager_id"))
+    .order_by(Position.position_id)
+)
+
+_WAGER_OPTIONS = (
+    select(WagerOption.idx, WagerOption.label, WagerOption.total_staked, WagerOption.position_count)
+    .where(WagerOption.wager_id == bindparam("wager_id"))
+    .order_by(WagerOption.idx)
+)
+
+_WAGER_OPTION_TOTALS = (
+    select(WagerOption.idx, WagerOption.total_staked, WagerOption.position_count, WagerOption.last_bet_seq)
+    .where(WagerOption.wager_id == bindparam("wager_id"))
+    .order_by(WagerOption.idx)
+)
+
+_OPEN_WAGER_OPTION_TOTALS = (
+    select(
+        WagerOption.wager_id, WagerOption.idx,
+        WagerOption.total_staked, WagerOption.position_count, WagerOption.last_bet_seq
+    )
+    .join(Wager, WagerOption.wager_id == Wager.wager_id)
+    .where(Wager.status == WAGER_STATUS_OPEN)
+    .order_by(WagerOption.wager_id, WagerOption.idx)
+)
+
+_USER_OPEN_BETS = (
+    select(Wager.wager_id, Wager.title, Wager.options, Position.option_index, Position.amount)
+    .join(Wager, Position.wager_id == Wager.wager_id)
+    .where(Position.guild_id == bindparam("guild_id"))
+    .where(Position.user_id == bindparam("user_id"))
+    .where(Wager.status == WAGER_STATUS_OPEN)
+    .order_by(Position.updated_at.desc())
+)
+
+# Holds an open wager's row until the bet commits. Resolve, void and close lock
+# the row FOR UPDATE, so they wait for bets in flight, and a bet arriving after
+# them finds the wager no longer open.
+_LOCK_OPEN_WAGER = (
+    select(Wager.wager_id)
+    .where(Wager.wager_id == bindparam("wager_id"))
+    .where(Wager.status == WAGER_STATUS_OPEN)
+    .with_for_update(read=True)
+)
+
+# A bet is one upsert: the first bet on an option opens the position, later ones top it up
+_PLACE_BET = pg_insert(Position).values(
+    guild_id=bindparam("guild_id"),
+    wager_id=bindparam("wager_id"),
+    user_id=bindparam("user_id"),
+    option_index=bindparam("option_index"),
+    amount=bindparam("amount"),
+    bet_count=1,
+    last_bet_seq=position_bet_seq.next_value()
+)
+_PLACE_BET = _PLACE_BET.on_conflict_do_update(
+    constraint="uq_positions_wager_user_option",
+    set_={
+        "amount": Position.amount + _PLACE_BET.excluded.amount,
+        "bet_count": Position.bet_count + 1,
+        "last_bet_seq": _PLACE_BET.excluded.last_bet_seq,
+        "updated_at": func.now()
+    }
+).returning(
+    Position.position_id, Position.option_index, Position.amount, Position.bet_count, Position.last_bet_seq
+)
+
+# Adds a bet to its option's running totals; no row back means the option doesn't exist.
+# The wager is bound as bet_wager_id because an UPDATE reserves its column names for SET.
+_ADD_TO_OPTION = (
+    update(WagerOption)
+    .where(WagerOption.wager_id == bindparam("bet_wager_id"))
+    .where(WagerOption.idx == bindparam("option_index"))
+    .values(
+        total_staked=WagerOption.total_staked + bindparam("amount"),
+        position_count=WagerOption.position_count + bindparam("opened"),
+        last_bet_seq=func.greatest(WagerOption.last_bet_seq, bindparam("bet_seq"))
+    )
+    .returning(WagerOption.idx)
+    .execution_options(synchronize_session=False)
+)
+
+# Creating a wager is one statement: the creator's user row if it's missing,
+# the wager, and one option row per label. Foreign keys are checked at the
+# end of the statement, so the new rows satisfy each other's.
+_NEW_CREATOR = (
+    pg_insert(User)
+    .values(guild_id=bindparam("guild_id"), user_id=bindparam("creator_id"), bits_balance=bindparam("starting_balance"))
+    .on_conflict_do_nothing(index_elements=[User.guild_id, User.user_id])
+    .cte("new_creator")
+)
+_NEW_WAGER = (
+    insert(Wager)
+    .values(
+        guild_id=bindparam("guild_id"),
+        creator_id=bindparam("creator_id"),
+        title=bindparam("title"),
+        description=bindparam("description"),
+        options=bindparam("options"),
+        status=WAGER_STATUS_OPEN
+    )
+    .returning(Wager.wager_id, Wager.created_at)
+    .cte("new_wager")
+)
+_NEW_LABELS = (
+    func.unnest(bindparam("labels", type_=ARRAY(Text)))
+    .table_valued("label", with_ordinality="ordinality")
+    .render_derived(name="new_labels")
+)
+# Python-side column defaults aren't applied inside a CTE, so the zeroed totals are spelled out
+_NEW_OPTIONS = (
+    insert(WagerOption)
+    .from_select(
+        ["wager_id", "idx", "label", "total_staked", "position_count", "last_bet_seq"],
+        select(
+            _NEW_WAGER.c.wager_id, _NEW_LABELS.c.ordinality - 1, _NEW_LABELS.c.label,
+            literal(0, BigInteger), literal(0, Integer), literal(0, BigInteger)
+        ).select_from(_NEW_WAGER.join(_NEW_LABELS, true())),
+        include_defaults=False
+    )
+    .cte("new_options")
+)
+_RESERVE_WAGER = select(_NEW_WAGER.c.wager_id, _NEW_WAGER.c.created_at).add_cte(_NEW_CREATOR, _NEW_OPTIONS)
+
+# Bound names differ from the columns: an UPDATE reserves column names for its SET clause
+_SET_WAGER_MESSAGE = (
+    update(Wager)
+    .where(Wager.wager_id == bindparam("posted_wager_id"))
+    .values(channel_id=bindparam("posted_channel_id"), message_id=bindparam("posted_message_id"))
+    .execution_options(synchronize_session=False)
+)
+
+_DELETE_WAGER_OPTIONS = delete(WagerOption).where(WagerOption.wager_id == bindparam("wager_id"))
+_DELETE_WAGER = delete(Wager).where(Wager.wager_id == bindparam("wager_id")).execution_options(
+    synchronize_session=False
+)
+
+
+async def get_wager_status(session, guild_id: int, wager_id: int) -> Optional[WagerStatusRow]:
+    """Get the status of a guild's wager without loading the rest of the row."""
+    result = await session.execute(_WAGER_STATUS, {"guild_id": guild_id, "wager_id": wager_id})
+    row = result.first()
+    return WagerStatusRow._make(row) if row else None
+
+
+async def list_open_wager_titles(session, guild_id: int, limit: int = 20) -> List[WagerTitleRow]:
+    """List the IDs and titles of a guild's most recent open wagers."""
+    result = await session.execute(_OPEN_WAGER_TITLES, {"guild_id": guild_id, "limit": limit})
+    return [WagerTitleRow._make(row) for row in result]
+
+
+async def get_wager_stakes(session, wager_id: int) -> List[StakeRow]:
+    """List every position on a wager as settlement rows, oldest first."""
+    result = await session.execute(_WAGER_STAKES, {"wager_id": wager_id})
+    return [StakeRow._make(row) for row in result]
+
+
+async def get_wager_options(session, wager_id: int) -> List[WagerOptionRow]:
+    """List a wager's options with their running totals, in option order."""
+    result = await session.execute(_WAGER_OPTIONS, {"wager_id": wager_id})
+    return [WagerOptionRow(idx, label, int(total), count) for idx, label, total, count in result]
+
+
+async def get_option_totals(session, wager_id: int) -> List[OptionTotalRow]:
+    """Get the running totals of each of a wager's options."""
+    result = await session.execute(_WAGER_OPTION_TOTALS, {"wager_id": wager_id})
+    return [
+        OptionTotalRow(option_index, int(total), count, last_bet_seq)
+        for option_index, total, count, last_bet_seq in result
+    ]
+
+
+async def get_open_option_totals(session) -> Dict[int, List[OptionTotalRow]]:
+    """Get the running totals of every open wager's options, keyed by wager_id."""
+    result = await session.execute(_OPEN_WAGER_OPTION_TOTALS)
+    totals = {}
+    for wager_id, option_index, total, count, last_bet_seq in result:
+        totals.setdefault(wager_id, []).append(OptionTotalRow(option_index, int(total), count, last_bet_seq))
+    return totals
+
+
+async def list_user_open_bets(session, guild_id: int, user_id: int) -> List[UserBetRow]:
+    """List a user's positions on a guild's open wagers, most recently bet first."""
+    result = await session.execute(_USER_OPEN_BETS, {"guild_id": guild_id, "user_id": user_id})
+    return [UserBetRow._make(row) for row in result]
+
+
+async def place_bet(session, guild_id: int, wager_id: int, user_id: int, option_index: int, amount: int) -> PositionRow:
+    """Add a bet to the user's position on an option, opening it if needed. The caller commits.
+
+    The wager's row stays share-locked until then, so it can't be resolved,
+    voided or closed under the bet. The option's running totals are updated in
+    the same transaction. Raises WagerNotOpen if the wager isn't open and
+    ValueError if it has no such option; the caller then rolls back.
+    """
+    if (await session.execute(_LOCK_OPEN_WAGER, {"wager_id": wager_id})).first() is None:
+        raise WagerNotOpen(f"Wager {wager_id} is not open")
+    result = await session.execute(_PLACE_BET, {
+        "guild_id": guild_id,
+        "wager_id": wager_id,
+        "user_id": user_id,
+        "option_index": option_index,
+        "amount": amount
+    })
+    position = PositionRow._make(result.one())
+    result = await session.execute(_ADD_TO_OPTION, {
+        "bet_wager_id": wager_id,
+        "option_index": option_index,
+        "amount": amount,
+        "opened": 1 if position.bet_count == 1 else 0,
+        "bet_seq": position.last_bet_seq
+    })
+    if result.first() is None:
+        raise ValueError(f"Wager {wager_id} has no option {option_index + 1}")
+    return position
+
+
+async def reserve_wager(
+    session, guild_id: int, creator_id: int, title: str, description: Optional[str], options: List[str],
+    starting_balance: int
+) -> ReservedWagerRow:
+    """Insert an open wager with its option rows, creating the creator's user row if needed. The caller commits."""
+    result = await session.execute(_RESERVE_WAGER, {
+        "guild_id": guild_id,
+        "creator_id": creator_id,
+        "starting_balance": starting_balance,
+        "title": title,
+        "description": description,
+        "options": options,
+        "labels": options
+    })
+    return ReservedWagerRow._make(result.one())
+
+
+async def set_wager_message(session, wager_id: int, channel_id: int, message_id: int):
+    """Record where a wager's message was posted. The caller commits."""
+    await session.execute(_SET_WAGER_MESSAGE, {
+        "posted_wager_id": wager_id, "posted_channel_id": channel_id, "posted_message_id": message_id
+    })
+
+
+async def delete_wager(session, wager_id: int):
+    """Delete a wager that has no positions, together with its option rows. The caller commits."""
+    await session.execute(_DELETE_WAGER_OPTIONS, {"wager_id": wager_id})
+    await session.execute(_DELETE_WAGER, {"wager_id": wager_id})
@@ -0,0 +1,273 @@
+"""Incremental statistics rollups.
+
+``user_stats`` (lifetime) and ``daily_user_stats`` (per day) hold each user's
+statistics per guild. They are maintained by
+an aggregator that folds new ``transactions`` rows into them in batches. A
+watermark row records the highest transaction_id already folded in, so each
+run only reads transactions it hasn't seen and ``/stats`` reads a handful of
+rows instead of scanning the ledger.
+
+Transaction IDs are assigned when a row is inserted, not when it commits, so
+a transaction that is still open can hold a lower ID than one already
+committed. Each run first finds the settled frontier: the last ID drawn from
+the sequence, once every transaction that was writing to ``transactions``
+when it was read has ended. Only IDs up to the frontier are folded, so the
+watermark never moves past a row that might still commit. A run that
+waits longer than ``STATS_SETTLE_TIMEOUT_SECONDS`` folds nothing.
+"""
+import asyncio
+import logging
+import time
+from typing import NamedTuple, Optional
+from sqlalchemy import Date, cast, column, exists, func, select, table
+from sqlalchemy.dialects.postgresql import REGCLASS, insert as pg_insert
+from sqlalchemy.orm import aliased
+from src import config
+from src.database.database import get_session
+from src.database.models import (
+    Transaction, UserStats, DailyUserStats, StatsWatermark,
+    TRANSACTION_TYPE_BET_PLACED, TRANSACTION_TYPE_BET_WON, TRANSACTION_TYPE_BET_REFUNDED,
+    TRANSACTION_TYPE_DAILY_REWARD
+)
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "user_stats"
+
+# Seconds between checks for the transactions the settled frontier waits on
+SETTLE_POLL_SECONDS = 0.1
+
+# Counters summed across rows; biggest_win is combined with GREATEST/MAX instead
+_SUMMED_COLUMNS = ["bets_placed", "positions", "total_wagered", "wins", "total_won", "total_refunded", "daily_rewards"]
+_ROLLUP_COLUMNS = _SUMMED_COLUMNS + ["biggest_win"]
+
+
+class StatsRow(NamedTuple):
+    """Betting statistics over some period."""
+    bets_placed: int
+    positions: int
+    total_wagered: int
+    wins: int
+    total_won: int
+    biggest_win: int
+    total_refunded: int
+    daily_rewards: int
+
+    @property
+    def net_profit(self) -> int:
+        """Bits won or refunded minus bits wagered."""
+        return self.total_won + self.total_refunded - self.total_wagered
+
+    @property
+    def win_rate(self) -> float:
+        """Share of positions that paid out; topping up a position doesn't count as another bet."""
+        return self.wins / self.positions if self.positions else 0.0
+
+
+EMPTY_STATS = StatsRow(0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def _transaction_aggregates(key_columns) -> list:
+    """Select list turning transactions into rollup rows, in ``_ROLLUP_COLUMNS`` order."""
+    amount = Transaction.amount
+    kind = Transaction.transaction_type
+    placed = kind == TRANSACTION_TYPE_BET_PLACED
+    won = kind == TRANSACTION_TYPE_BET_WON
+    # A bet opened its position unless an earlier bet was placed on the same position
+    earlier = aliased(Transaction)
+    topped_up = exists().where(
+        earlier.transaction_type == TRANSACTION_TYPE_BET_PLACED,
+        earlier.reference_id == Transaction.reference_id,
+        earlier.transaction_id < Transaction.transaction_id,
+    )
+    aggregates = {
+        # Bets are debits, so their amounts are negative
+        "bets_placed": func.count().filter(placed),
+        "positions": func.count().filter(placed & ~topped_up),
+        "total_wagered": func.coalesce(-func.sum(amount).filter(placed), 0),
+        "wins": func.count().filter(won),
+        "total_won": func.coalesce(func.sum(amount).filter(won), 0),
+        "total_refunded": func.coalesce(func.sum(amount).filter(kind == TRANSACTION_TYPE_BET_REFUNDED), 0),
+        "daily_rewards": func.coalesce(func.sum(amount).filter(kind == TRANSACTION_TYPE_DAILY_REWARD), 0),
+        "biggest_win": func.coalesce(func.max(amount).filter(won), 0),
+    }
+    return key_columns + [aggregates[column] for column in _ROLLUP_COLUMNS]
+
+
+def _upsert_rollup(table, key_columns, source):
+    """INSERT ... SELECT rows into a rollup table, adding onto existing rows."""
+    stmt = pg_insert(table).from_select(key_columns + _ROLLUP_COLUMNS, source)
+    set_ = {column: getattr(table, column) + getattr(stmt.excluded, column) for column in _SUMMED_COLUMNS}
+    set_["biggest_win"] = func.greatest(table.biggest_win, stmt.excluded.biggest_win)
+    if "updated_at" in table.__table__.c:
+        set_["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=key_columns, set_=set_)
+
+
+def _combined_stats(table) -> list:
+    """Select list combining many rollup rows into one, in ``StatsRow`` order."""
+    return [
+        func.coalesce(func.max(table.biggest_win) if field == "biggest_win" else func.sum(getattr(table, field)), 0)
+        for field in StatsRow._fields
+    ]
+
+
+_LAST_TRANSACTION_ID = select(func.coalesce(func.pg_sequence_last_value(
+    cast(func.pg_get_serial_sequence(Transaction.__tablename__, "transaction_id"), REGCLASS)
+), 0))
+
+# Other transactions that can write to the ledger. An INSERT takes this lock before it
+# draws its ID and holds it until the transaction ends.
+_pg_locks = table("pg_locks", column("virtualtransaction"), column("relation"), column("mode"), column("pid"))
+_LEDGER_WRITERS = (
+    select(_pg_locks.c.virtualtransaction)
+    .where(_pg_locks.c.relation == cast(Transaction.__tablename__, REGCLASS))
+    .where(_pg_locks.c.mode == "RowExclusiveLock")
+    .where(_pg_locks.c.pid != func.pg_backend_pid())
+)
+
+
+async def settled_transaction_id(session, timeout: float) -> Optional[int]:
+    """Highest transaction ID at or below which every transaction has ended.
+
+    Returns None if a transaction that may hold such an ID is still open after ``timeout`` seconds.
+    """
+    last_id = (await session.execute(_LAST_TRANSACTION_ID)).scalar_one()
+    # Read after the sequence, so every writer that drew an ID up to last_id and hasn't ended is listed
+    writers = set((await session.execute(_LEDGER_WRITERS)).scalars())
+    deadline = time.monotonic() + timeout
+    while writers:
+        if time.monotonic() >= deadline:
+            return None
+        await asyncio.sleep(SETTLE_POLL_SECONDS)
+        writers &= set((await session.execute(_LEDGER_WRITERS)).scalars())
+    return last_id
+
+
+async def aggregate_batch(session, batch_size: int, settled_through: int) -> int:
+    """Fold the next batch of transactions, up to ``settled_through``, into the rollups.
+
+    Returns how many were folded.
+    """
+    await session.execute(
+        pg_insert(StatsWatermark)
+        .values(name=WATERMARK_NAME, last_transaction_id=0)
+        .on_conflict_do_nothing(index_elements=[StatsWatermark.name])
+    )
+    # Locking the watermark keeps concurrent aggregators from folding the same batch
+    result = await session.execute(
+        select(StatsWatermark.last_transaction_id)
+        .where(StatsWatermark.name == WATERMARK_NAME)
+        .with_for_update()
+    )
+    low = result.scalar_one()
+
+    batch = (
+        select(Transaction.transaction_id)
+        .where(Transaction.transaction_id > low)
+        .where(Transaction.transaction_id <= settled_through)
+        .order_by(Transaction.transaction_id)
+        .limit(batch_size)
+        .subquery()
+    )
+    result = await session.execute(select(func.max(batch.c.transaction_id), func.count()))
+    high, count = result.one()
+    if not count:
+        await session.rollback()
+        return 0
+
+    in_batch = (Transaction.transaction_id > low) & (Transaction.transaction_id <= high)
+    keys = [Transaction.guild_id, Transaction.user_id]
+    await session.execute(_upsert_rollup(
+        UserStats,
+        ["guild_id", "user_id"],
+        select(*_transaction_aggregates(keys)).where(in_batch).group_by(*keys)
+    ))
+    day = cast(Transaction.created_at, Date)
+    await session.execute(_upsert_rollup(
+        DailyUserStats,
+        ["guild_id", "user_id", "day"],
+        select(*_transaction_aggregates(keys + [day])).where(in_batch).group_by(*keys, day)
+    ))
+    await session.execute(
+        StatsWatermark.__table__.update()
+        .where(StatsWatermark.name == WATERMARK_NAME)
+        .values(last_transaction_id=high, updated_at=func.now())
+    )
+    await session.commit()
+    return count
+
+
+async def run_stats_aggregator() -> int:
+    """Fold all settled transactions into the rollups. Returns how many were folded."""
+    async with get_session() as session:
+        settled_through = await settled_transaction_id(session, config.STATS_SETTLE_TIMEOUT_SECONDS)
+    if settled_through is None:
+        logger.warning(
+            f"Transactions were still open after {config.STATS_SETTLE_TIMEOUT_SECONDS}s; "
+            f"leaving the statistics rollups for the next run"
+        )
+        return 0
+
+    folded = 0
+    while True:
+        async with get_session() as session:
+            count = await aggregate_batch(session, config.STATS_BATCH_SIZE, settled_through)
+        folded += count
+        if count < config.STATS_BATCH_SIZE:
+            break
+
+    if folded:
+        logger.debug(f"Folded {folded} transaction(s) into the statistics rollups")
+    return folded
+
+
+async def get_user_stats(session, guild_id: int, user_id: int) -> StatsRow:
+    """Get a user's lifetime statistics in a guild."""
+    result = await session.execute(
+        select(*[getattr(UserStats, field) for field in StatsRow._fields])
+        .where(UserStats.guild_id == guild_id)
+        .where(UserStats.user_id == user_id)
+    )
+    row = result.first()
+    return StatsRow._make(row) if row else EMPTY_STATS
+
+
+async def get_user_recent_stats(session, guild_id: int, user_id: int, days: int) -> StatsRow:
+    """Get a user's statistics in a guild over the last ``days`` days (at most ``days`` rows read)."""
+    result = await session.execute(
+        select(*_combined_stats(DailyUserStats))
+        .where(DailyUserStats.guild_id == guild_id)
+        .where(DailyUserStats.user_id == user_id)
+        # Days are bucketed on the database clock, so count back from its date too
+        .where(DailyUserStats.day > func.current_date() - days)
+    )
+    return StatsRow._make(int(value) for value in result.one())
+
+
+class LeaderRow(NamedTuple):
+    """A user's standing in a leaderboard."""
+    user_id: int
+    net_profit: int
+
+
+async def get_guild_stats(session, guild_id: int, top: int = 5):
+    """Sum a guild's lifetime statistics and rank its most profitable users.
+
+    Returns ``(totals, leaders)``. Reads only the guild's rollup rows.
+    """
+    net_profit = UserStats.total_won + UserStats.total_refunded - UserStats.total_wagered
+    in_guild = UserStats.guild_id == guild_id
+
+    result = await session.execute(select(*_combined_stats(UserStats)).where(in_guild))
+    totals = StatsRow._make(int(value) for value in result.one())
+
+    result = await session.execute(
+        select(UserStats.user_id, net_profit)
+        .where(in_guild)
+        .where(UserStats.bets_placed > 0)
+        .order_by(net_profit.desc())
+        .limit(top)
+    )
+    leaders = [LeaderRow(user_id, int(profit)) for user_id, profit in result]
+    return totals, leaders
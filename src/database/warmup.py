@@ -0,0 +1,119 @@
+"""Database warm-up run before the bot reports ready.
+
+Start-up waits for the database with exponential backoff and full jitter, so
+a fleet of restarting containers doesn't retry in lockstep. It then opens
+the pools' connections up front and runs each hot read once on every one of
+them: that fills SQLAlchemy's compiled cache and asyncpg's per-connection
+prepared statements, so the first commands don't pay for either. Finally the
+odds book is loaded for the open wagers whose buttons people will click.
+"""
+import asyncio
+import logging
+import random
+import time
+from contextlib import AsyncExitStack
+from sqlalchemy import text
+from src import config
+from src.database.database import engine, AsyncSessionLocal, ReplicaSessionLocal, get_session
+from src.database.repository import (
+    get_user_by_id, get_wager, get_wager_status, get_wager_stakes, get_wager_options, get_option_totals,
+    get_guild_settings, list_open_wager_titles, list_user_open_bets,
+    list_open_wager_messages, get_open_option_totals
+)
+from src.utils.health import readiness
+from src.utils.odds import odds_book
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Return a full-jitter delay before retry number ``attempt`` (from 0)."""
+    ceiling = min(config.DB_CONNECT_BACKOFF_MAX_SECONDS, config.DB_CONNECT_BACKOFF_SECONDS * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+async def wait_for_database(attempts: int = None):
+    """Wait until the primary database answers, raising the last error once attempts run out."""
+    attempts = attempts or config.DB_CONNECT_ATTEMPTS
+    for attempt in range(attempts):
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return
+        except Exception as e:
+            if attempt + 1 >= attempts:
+                raise
+            delay = backoff_delay(attempt)
+            readiness.set("database", False, f"unreachable: {e}")
+            logger.warning(f"Database not ready ({attempt + 1}/{attempts}), retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+
+
+async def _run_hot_reads(session):
+    """Run every hot read once with IDs that match nothing."""
+    await get_user_by_id(session, 0, 0)
+    await get_wager(session, 0)
+    await get_wager(session, 0, guild_id=0)
+    await get_wager_status(session, 0, 0)
+    await get_wager_stakes(session, 0)
+    await get_wager_options(session, 0)
+    await get_option_totals(session, 0)
+    await get_guild_settings(session, 0)
+    await list_open_wager_titles(session, 0)
+    await list_user_open_bets(session, 0, 0)
+
+
+async def warm_pool(session_factory, size: int) -> int:
+    """Open ``size`` pooled connections at once and prepare the hot reads on each.
+
+    Returns the number of connections warmed.
+    """
+    # Without pooling (size 0) nothing survives, but the compiled cache still fills
+    size = max(size, 1)
+    async with AsyncExitStack() as stack:
+        sessions = [await stack.enter_async_context(session_factory()) for _ in range(size)]
+        # Holding every session open forces the pool to open that many connections
+        await asyncio.gather(*(session.connection() for session in sessions))
+        await asyncio.gather(*(_run_hot_reads(session) for session in sessions))
+    return size
+
+
+async def warm_odds_book() -> int:
+    """Load the pools of open wagers with posted messages into the odds book.
+
+    Returns the number of wagers warmed.
+    """
+    # From the primary: totals from a lagging replica would miss bets, and the cached
+    # pools are only corrected by later bets on the same wager
+    async with get_session() as session:
+        wagers = await list_open_wager_messages(session)
+        totals = await get_open_option_totals(session)
+
+    warmed = 0
+    for wager in wagers[:odds_book.max_wagers]:
+        odds_book.begin_warm(wager.wager_id)
+        odds_book.finish_warm(wager.wager_id, len(wager.options), totals.get(wager.wager_id, []))
+        warmed += 1
+    return warmed
+
+
+async def warm_up():
+    """Wait for the database, warm the pools and caches, then mark the database ready."""
+    started = time.perf_counter()
+    readiness.set("database", False, "connecting")
+    await wait_for_database()
+
+    connections = await warm_pool(AsyncSessionLocal, config.DB_POOL_SIZE)
+    if ReplicaSessionLocal is not None:
+        try:
+            connections += await warm_pool(ReplicaSessionLocal, config.DB_POOL_SIZE)
+        except Exception as e:
+            # Read-only sessions fall back to the primary, so a cold replica isn't fatal
+            logger.warning(f"Could not warm the read replica: {e}")
+
+    wagers = await warm_odds_book()
+    readiness.set("database", True, f"{connections} connection(s) warmed")
+    logger.info(
+        f"Database warmed in {time.perf_counter() - started:.2f}s: "
+        f"{connections} connection(s), odds for {wagers} open wager(s)"
+    )
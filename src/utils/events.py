@@ -0,0 +1,87 @@
+"""Recording of command invocations for replay.
+
+With ``EVENT_LOG_PATH`` set, the cogs record every bet, daily claim, wager
+creation, close and resolve they handle as one line of JSON in that file.
+An event carries the command's inputs and its wall-clock time, and nothing
+Discord-specific:
+
+    {"ts": 1760832000.123, "type": "bet", "guild": 1, "user": 2, "wager": 7, "option": 0, "amount": 50}
+
+Option indexes are 0-based. ``createwager`` events are recorded once the
+wager exists, so they carry the ID the other events refer to it by. The file
+is appended to, so restarts add to the same log. ``replay-events.py`` feeds
+a log back through ``src.database.economy``.
+"""
+import json
+import logging
+import time
+from typing import Iterator, Optional
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+EVENT_BET = "bet"
+EVENT_DAILY = "daily"
+EVENT_CREATE_WAGER = "createwager"
+EVENT_CLOSE = "close"
+EVENT_RESOLVE = "resolve"
+
+EVENT_TYPES = (EVENT_BET, EVENT_DAILY, EVENT_CREATE_WAGER, EVENT_CLOSE, EVENT_RESOLVE)
+
+
+class EventRecorder:
+    """Appends events to an NDJSON file, opened on the first event."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._file = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, event_type: str, guild_id: int, user_id: int, **fields):
+        """Append one event. Recording never fails the command being recorded."""
+        if not self.path:
+            return
+        event = {"ts": round(time.time(), 3), "type": event_type, "guild": guild_id, "user": user_id, **fields}
+        try:
+            if self._file is None:
+                # Line-buffered, so every event is on disk once recorded
+                self._file = open(self.path, "a", buffering=1, encoding="utf-8")
+            self._file.write(json.dumps(event, separators=(",", ":"), ensure_ascii=False) + "\n")
+            self.recorded += 1
+        except OSError as e:
+            logger.error(f"Could not record {event_type} event to {self.path}, recording stopped: {e}")
+            self.path = ""
+
+    def close(self):
+        """Close the log file, if one is open."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+event_recorder = EventRecorder(config.EVENT_LOG_PATH)
+
+
+def record_event(event_type: str, guild_id: int, user_id: int, **fields):
+    """Record a command invocation, if recording is enabled."""
+    event_recorder.record(event_type, guild_id, user_id, **fields)
+
+
+def read_events(path: str, types: Optional[tuple] = None) -> Iterator[dict]:
+    """Read the events of a log in order, skipping blank lines and unknown types."""
+    types = types or EVENT_TYPES
+    with open(path, encoding="utf-8") as log:
+        for line_number, line in enumerate(log, 1):
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: not a JSON event: {e}") from None
+            if event.get("type") in types:
+                yield event
@@ -1,6 +1,15 @@
 """Message formatting helpers."""
+import copy
+import hashlib
+import json
 import discord
+from collections import Counter
 from datetime import datetime
+from functools import lru_cache
+from typing import Tuple
+
+# Wager embed render counters ("renders", "cache_misses", "edits", "skipped_edits")
+render_stats = Counter()
 
 
 def format_bits(amount: int) -> str:
@@ -8,41 +17,72 @@ def format_bits(amount: int) -> str:
     return f"{amount:,} bits"
 
 
-def format_wager_embed(wager, bets_by_option=None, show_stats=True) -> discord.Embed:
-    """Format a wager as an embed with live betting statistics."""
+def wager_render_state(wager, options=None, show_stats=True) -> tuple:
+    """Reduce a wager to the compact, hashable state its embed is rendered from.
+
+    ``options`` are the wager's typed option rows (see ``get_wager_options``);
+    their running totals become (total, count) pairs, so two wagers whose
+    visible numbers agree produce the same state.
+    """
+    labels = tuple(row.label for row in options) if options else tuple(wager.options)
+    option_stats = None
+    if options and any(row.count for row in options):
+        option_stats = tuple((row.total, row.count) for row in options)
+    return (
+        wager.wager_id,
+        wager.title,
+        wager.description,
+        wager.status,
+        labels,
+        wager.winning_option,
+        int(wager.created_at.timestamp()),
+        wager.creator_id,
+        option_stats,
+        show_stats
+    )
+
+
+@lru_cache(maxsize=1024)
+def render_wager_embed(state: tuple) -> Tuple[dict, str]:
+    """Render a wager state to an embed dict plus a digest of the output.
+
+    Results are cached by state, so re-rendering an unchanged wager is a dict
+    lookup. The digest lets callers tell whether the visible output changed.
+    """
     from src.database.models import WAGER_STATUS_OPEN, WAGER_STATUS_RESOLVED
     
+    (wager_id, title, description, status, options, winning_option,
+     created_ts, creator_id, option_stats, show_stats) = state
+    render_stats["cache_misses"] += 1
+    
     embed = discord.Embed(
-        title=f"🎲 {wager.title}",
-        description=wager.description or "No description provided.",
-        color=discord.Color.blue() if wager.status == WAGER_STATUS_OPEN else discord.Color.greyple()
+        title=f"🎲 {title}",
+        description=description or "No description provided.",
+        color=discord.Color.blue() if status == WAGER_STATUS_OPEN else discord.Color.greyple()
     )
     
-    embed.add_field(name="Wager ID", value=f"`{wager.wager_id}`", inline=True)
-    embed.add_field(name="Status", value=wager.status.upper(), inline=True)
-    embed.add_field(name="Created", value=f"<t:{int(wager.created_at.timestamp())}:R>", inline=True)
+    embed.add_field(name="Wager ID", value=f"`{wager_id}`", inline=True)
+    embed.add_field(name="Status", value=status.upper(), inline=True)
+    embed.add_field(name="Created", value=f"<t:{created_ts}:R>", inline=True)
     
     # Calculate statistics if bets are provided
     total_pool = 0
     total_bets_count = 0
-    if bets_by_option:
-        for bets in bets_by_option.values():
-            total_pool += sum(bet.amount for bet in bets)
-            total_bets_count += len(bets)
+    if option_stats:
+        total_pool = sum(total for total, _ in option_stats)
+        total_bets_count = sum(count for _, count in option_stats)
     
     # Add options with betting statistics
     options_text = ""
-    for idx, option in enumerate(wager.options):
+    for idx, option in enumerate(options):
         option_label = f"**{idx + 1}.** {option}"
-        if bets_by_option:
-            option_bets = bets_by_option.get(idx, [])
-            option_total = sum(bet.amount for bet in option_bets)
-            option_count = len(option_bets)
+        if option_stats:
+            option_total, option_count = option_stats[idx]
             
             if option_total > 0:
                 # Calculate percentage of total pool
                 percentage = (option_total / total_pool * 100) if total_pool > 0 else 0
-                option_label += f"\n   💰 {format_bits(option_total)} ({percentage:.1f}%) • 👥 {option_count} bet{'s' if option_count != 1 else ''}"
+                option_label += f"\n   💰 {format_bits(option_total)} ({percentage:.1f}%) • 👥 {option_count} bettor{'s' if option_count != 1 else ''}"
             else:
                 option_label += "\n   💰 No bets yet"
         options_text += option_label + "\n\n"
@@ -50,51 +90,198 @@ def format_wager_embed(wager, bets_by_option=None, show_stats=True) -> discord.E
     embed.add_field(name="Options", value=options_text or "No options", inline=False)
     
     # Add live statistics if available
-    if show_stats and bets_by_option and total_pool > 0:
+    if show_stats and option_stats and total_pool > 0:
         embed.add_field(
             name="💰 Total Pool",
             value=format_bits(total_pool),
             inline=True
         )
         embed.add_field(
-            name="📊 Total Bets",
+            name="📊 Positions",
             value=str(total_bets_count),
             inline=True
         )
     
-    if wager.status == WAGER_STATUS_RESOLVED and wager.winning_option is not None:
+    if status == WAGER_STATUS_RESOLVED and winning_option is not None:
         embed.add_field(
             name="🏆 Winner",
-            value=f"Option {wager.winning_option + 1}: {wager.options[wager.winning_option]}",
+            value=f"Option {winning_option + 1}: {options[winning_option]}",
             inline=False
         )
         embed.color = discord.Color.gold()
     
-    embed.set_footer(text=f"Created by {wager.creator_id}")
+    embed.set_footer(text=f"Created by {creator_id}")
     
-    return embed
+    embed_dict = embed.to_dict()
+    digest = hashlib.blake2b(
+        json.dumps(embed_dict, sort_keys=True).encode(), digest_size=16
+    ).hexdigest()
+    return embed_dict, digest
 
 
-def format_balance_embed(user, balance: int) -> discord.Embed:
+def format_wager_embed(wager, options=None, show_stats=True) -> discord.Embed:
+    """Format a wager as an embed with live betting statistics."""
+    embed_dict, _ = render_wager_embed(wager_render_state(wager, options, show_stats))
+    render_stats["renders"] += 1
+    # Copy so callers can add fields without touching the cached dict
+    return discord.Embed.from_dict(copy.deepcopy(embed_dict))
+
+
+def format_balance_embed(user_id: int, balance: int) -> discord.Embed:
     """Format user balance as an embed."""
     embed = discord.Embed(
         title="💰 Your Bits Balance",
         color=discord.Color.green()
     )
     embed.add_field(name="Balance", value=format_bits(balance), inline=False)
-    embed.set_footer(text=f"User ID: {user.user_id}")
+    embed.set_footer(text=f"User ID: {user_id}")
     return embed
 
 
-def format_bet_embed(bet, wager) -> discord.Embed:
-    """Format a bet as an embed."""
+def format_bet_embed(position, wager, amount: int) -> discord.Embed:
+    """Format a bet of ``amount`` and the position it went into as an embed."""
     embed = discord.Embed(
         title="🎯 Bet Placed",
         color=discord.Color.blue()
     )
     embed.add_field(name="Wager", value=wager.title, inline=False)
-    embed.add_field(name="Option", value=f"Option {bet.option_index + 1}: {wager.options[bet.option_index]}", inline=False)
-    embed.add_field(name="Amount", value=format_bits(bet.amount), inline=False)
-    embed.set_footer(text=f"Bet ID: {bet.bet_id}")
+    embed.add_field(name="Option", value=f"Option {position.option_index + 1}: {wager.options[position.option_index]}", inline=False)
+    embed.add_field(name="Amount", value=format_bits(amount), inline=False)
+    if position.amount != amount:
+        embed.add_field(
+            name="Total Stake",
+            value=f"{format_bits(position.amount)} across {position.bet_count} bets",
+            inline=False
+        )
+    embed.set_footer(text=f"Position ID: {position.position_id}")
+    return embed
+
+
+def format_odds_embed(wager, pools, rake_bps: int = 0, amount: int = None) -> discord.Embed:
+    """Format a wager's current odds, optionally with a payout preview for ``amount``."""
+    embed = discord.Embed(
+        title=f"📊 Odds: {wager.title}",
+        description=f"Total pool: {format_bits(pools.total)}",
+        color=discord.Color.blue()
+    )
+    for idx, option in enumerate(wager.options):
+        multiplier = pools.multiplier(idx, rake_bps)
+        lines = [
+            f"{format_bits(pools.totals[idx])} from {pools.counts[idx]} bettor(s)",
+            f"Pays {multiplier:.2f}x" if multiplier is not None else "No bets yet"
+        ]
+        if amount:
+            lines.append(f"{format_bits(amount)} bet would win {format_bits(pools.preview(idx, amount, rake_bps))}")
+        embed.add_field(name=f"Option {idx + 1}: {option}", value="\n".join(lines), inline=False)
+    embed.set_footer(text=f"Wager ID: {wager.wager_id} • Odds change as more bets come in")
+    return embed
+
+
+def format_bulk_operation_embed(title: str, rows: int, total_amount: int, elapsed: float) -> discord.Embed:
+    """Format the result of a bulk balance operation as an embed."""
+    embed = discord.Embed(
+        title=title,
+        color=discord.Color.green() if total_amount >= 0 else discord.Color.red()
+    )
+    embed.add_field(name="Users", value=f"{rows:,}", inline=True)
+    embed.add_field(name="Net Change", value=f"{'+' if total_amount > 0 else ''}{format_bits(total_amount)}", inline=True)
+    rate = rows / elapsed if elapsed > 0 else float(rows)
+    embed.add_field(name="Throughput", value=f"{rate:,.0f} rows/sec ({elapsed:.2f}s)", inline=True)
     return embed
 
+
+def format_resolution_embed(result) -> discord.Embed:
+    """Format the outcome of a resolution job as an embed."""
+    option_field = f"Option {result.option_index + 1}: {result.option_label}"
+    if result.refunded:
+        embed = discord.Embed(
+            title="🎲 Wager Resolved",
+            description=f"**{result.title}**\n\nNo one bet on the winning option. All bets have been refunded.",
+            color=discord.Color.orange()
+        )
+        embed.add_field(name="Winning Option", value=option_field, inline=False)
+        return embed
+
+    embed = discord.Embed(
+        title="🎉 Wager Resolved!",
+        description=f"**{result.title}**",
+        color=discord.Color.gold()
+    )
+    embed.add_field(name="🏆 Winning Option", value=option_field, inline=False)
+    embed.add_field(name="💰 Total Pool", value=format_bits(result.total_pool), inline=True)
+    embed.add_field(name="👥 Winners", value=str(result.winners), inline=True)
+    if result.rake:
+        embed.add_field(name="🏦 House Rake", value=format_bits(result.rake), inline=True)
+
+    # Add winner details (limit to first 10)
+    winners_text = ""
+    for payout in result.payouts[:10]:
+        winners_text += (
+            f"<@{payout.user_id}>: {format_bits(payout.bet_amount)} bet → "
+            f"{format_bits(payout.amount)} won\n"
+        )
+    if result.winners > 10:
+        winners_text += f"\n... and {result.winners - 10} more winner(s)"
+    if winners_text:
+        embed.add_field(name="🎯 Winners", value=winners_text, inline=False)
+    return embed
+
+
+def format_job_progress(wager_id: int, title: str, done: int, total: int) -> str:
+    """Format a resolution job's progress line."""
+    percent = done * 100 // total if total else 100
+    return f"⏳ Resolving wager #{wager_id} **{title}**: {done:,}/{total:,} payouts ({percent}%)"
+
+
+def _add_stats_fields(embed: discord.Embed, stats, inline: bool = True):
+    """Add the betting statistics fields shared by the stats embeds."""
+    net = stats.net_profit
+    embed.add_field(name="🎯 Bets Placed", value=f"{stats.bets_placed:,}", inline=inline)
+    embed.add_field(name="💸 Wagered", value=format_bits(stats.total_wagered), inline=inline)
+    embed.add_field(name="🏆 Win Rate", value=f"{stats.win_rate:.0%} ({stats.wins:,} of {stats.positions:,})", inline=inline)
+    embed.add_field(name="💰 Won", value=format_bits(stats.total_won), inline=inline)
+    embed.add_field(name="🔝 Biggest Win", value=format_bits(stats.biggest_win), inline=inline)
+    embed.add_field(name="📈 Net Profit", value=f"{'+' if net > 0 else ''}{format_bits(net)}", inline=inline)
+
+
+def format_user_stats_embed(member, lifetime, recent, days: int) -> discord.Embed:
+    """Format a user's lifetime and recent statistics as an embed."""
+    embed = discord.Embed(
+        title=f"📊 Stats for {member.display_name}",
+        color=discord.Color.blue()
+    )
+    _add_stats_fields(embed, lifetime)
+    if lifetime.total_refunded or lifetime.daily_rewards:
+        embed.add_field(name="↩️ Refunded", value=format_bits(lifetime.total_refunded), inline=True)
+        embed.add_field(name="🎁 Daily Rewards", value=format_bits(lifetime.daily_rewards), inline=True)
+    recent_net = recent.net_profit
+    embed.add_field(
+        name=f"🗓️ Last {days} Days",
+        value=(
+            f"{recent.bets_placed:,} bets, {format_bits(recent.total_wagered)} wagered, "
+            f"{recent.wins:,} wins, {'+' if recent_net > 0 else ''}{format_bits(recent_net)} net"
+        ),
+        inline=False
+    )
+    embed.set_footer(text=f"User ID: {member.id} • Updated every few minutes")
+    return embed
+
+
+def format_guild_stats_embed(guild, totals, leaders) -> discord.Embed:
+    """Format a server's combined statistics and most profitable members as an embed."""
+    embed = discord.Embed(
+        title=f"📊 Stats for {guild.name}",
+        color=discord.Color.blue()
+    )
+    _add_stats_fields(embed, totals)
+    if leaders:
+        embed.add_field(
+            name="🥇 Most Profitable",
+            value="\n".join(
+                f"{rank}. <@{leader.user_id}>: {'+' if leader.net_profit > 0 else ''}{format_bits(leader.net_profit)}"
+                for rank, leader in enumerate(leaders, start=1)
+            ),
+            inline=False
+        )
+    embed.set_footer(text="Updated every few minutes")
+    return embed
@@ -0,0 +1,69 @@
+"""Liveness and readiness endpoints for container health checks.
+
+``/healthz`` answers 200 for as long as the event loop is serving requests.
+``/readyz`` answers 200 only once every readiness check has passed (the
+database is warmed up and the gateway is connected) and 503 otherwise, with
+the state of each check in the JSON body.
+"""
+import logging
+import time
+from typing import Dict, Tuple
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Named readiness checks; the bot is ready when all of them pass."""
+
+    def __init__(self, *checks: str):
+        self.started_at = time.monotonic()
+        self._checks: Dict[str, Tuple[bool, str]] = {name: (False, "pending") for name in checks}
+
+    def set(self, name: str, ok: bool, detail: str = ""):
+        """Record the outcome of a check."""
+        previous = self._checks.get(name)
+        if previous is None or previous[0] != ok:
+            logger.info(f"Readiness check {name} {'passed' if ok else 'failing'}: {detail or '-'}")
+        self._checks[name] = (ok, detail)
+
+    @property
+    def ready(self) -> bool:
+        return all(ok for ok, _ in self._checks.values())
+
+    def snapshot(self) -> dict:
+        """Return the checks and overall state, for the /readyz body."""
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+            "checks": {name: {"ok": ok, "detail": detail} for name, (ok, detail) in self._checks.items()},
+        }
+
+
+readiness = Readiness("database", "gateway")
+
+
+async def start_health_server(host: str = None, port: int = None):
+    """Serve /healthz and /readyz, returning the runner to clean up, or None if disabled."""
+    port = config.HEALTH_PORT if port is None else port
+    if port <= 0:
+        return None
+
+    # aiohttp ships with discord.py; the web server part is only needed here
+    from aiohttp import web
+
+    async def healthz(request):
+        return web.json_response({"alive": True})
+
+    async def readyz(request):
+        return web.json_response(readiness.snapshot(), status=200 if readiness.ready else 503)
+
+    app = web.Application()
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host or config.HEALTH_HOST, port).start()
+    logger.info(f"Health endpoints listening on {host or config.HEALTH_HOST}:{port}")
+    return runner
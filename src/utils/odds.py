@@ -0,0 +1,152 @@
+"""Live pari-mutuel odds.
+
+The ``OddsBook`` keeps each wager's staked total and position count per option in
+memory. A wager's pools are loaded from the database once (warmed) and then
+kept current by recording every bet as it is placed, so previews and odds
+never need a per-request aggregation.
+
+A bet is begun before its transaction commits and recorded once it has.
+Pools loaded while a bet on the wager is between the two may or may not
+include it, so they are used but not cached, and the next read loads them
+again.
+"""
+from collections import Counter, OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from src.utils.payouts import apply_rake
+
+# Wagers whose pools are kept in memory
+MAX_CACHED_WAGERS = 1000
+
+
+class WagerPools:
+    """Staked totals and position counts per option of one wager."""
+    __slots__ = ("totals", "counts", "total")
+
+    def __init__(self, totals: List[int], counts: List[int]):
+        self.totals = totals
+        self.counts = counts
+        self.total = sum(totals)
+
+    @classmethod
+    def from_rows(cls, option_count: int, rows: Iterable[Tuple[int, int, int, int]]) -> "WagerPools":
+        """Build pools from (option_index, total, count, last_bet_seq) rows."""
+        totals = [0] * option_count
+        counts = [0] * option_count
+        for option_index, total, count, _ in rows:
+            if 0 <= option_index < option_count:
+                totals[option_index] = int(total)
+                counts[option_index] = int(count)
+        return cls(totals, counts)
+
+    def add(self, option_index: int, amount: int, new_position: bool = True):
+        """Add a bet to an option, counting it if it opened a new position."""
+        self.totals[option_index] += amount
+        self.total += amount
+        if new_position:
+            self.counts[option_index] += 1
+
+    def preview(self, option_index: int, amount: int, rake_bps: int = 0, included: bool = False) -> int:
+        """Return what a stake of ``amount`` on an option would pay if it won right now.
+
+        With ``included=True`` the stake is taken to be in the pools already.
+        The result is the proportional share before remainder bits are handed
+        out, so the final payout can be up to a bit higher.
+        """
+        extra = 0 if included else amount
+        pool = self.total + extra
+        winning_total = self.totals[option_index] + extra
+        if winning_total <= 0:
+            return 0
+        return amount * (pool - apply_rake(pool, rake_bps)) // winning_total
+
+    def multiplier(self, option_index: int, rake_bps: int = 0) -> Optional[float]:
+        """Return the current payout per bit staked on an option, or None if it has no bets."""
+        if not self.totals[option_index]:
+            return None
+        return (self.total - apply_rake(self.total, rake_bps)) / self.totals[option_index]
+
+
+class OddsBook:
+    """LRU cache of ``WagerPools``, kept current as bets are placed."""
+
+    def __init__(self, max_wagers: int = MAX_CACHED_WAGERS):
+        self.max_wagers = max_wagers
+        self.stats = Counter()  # "hits", "misses", "bets_recorded"
+        self._pools = OrderedDict()
+        self._warming = Counter()  # wager_id -> warms in flight
+        self._betting = Counter()  # wager_id -> bets begun but not yet recorded
+        self._dirty = set()  # wagers that got a bet while being warmed
+
+    def get(self, wager_id: int) -> Optional[WagerPools]:
+        """Return a wager's cached pools, or None if they need warming."""
+        pools = self._pools.get(wager_id)
+        if pools is None:
+            self.stats["misses"] += 1
+            return None
+        self._pools.move_to_end(wager_id)
+        self.stats["hits"] += 1
+        return pools
+
+    def begin_warm(self, wager_id: int):
+        """Note that a wager's pools are about to be loaded from the database."""
+        self._warming[wager_id] += 1
+
+    def finish_warm(self, wager_id: int, option_count: int, rows) -> WagerPools:
+        """Build pools from loaded rows and cache them.
+
+        If a bet was recorded while the rows were loading, or one is still
+        being placed, they may be stale, so they are returned but not cached.
+        """
+        pools = WagerPools.from_rows(option_count, rows)
+        self._warming[wager_id] -= 1
+        stale = wager_id in self._dirty or wager_id in self._betting
+        if self._warming[wager_id] <= 0:
+            del self._warming[wager_id]
+            self._dirty.discard(wager_id)
+        if not stale:
+            self._pools[wager_id] = pools
+            if len(self._pools) > self.max_wagers:
+                self._pools.popitem(last=False)
+        return pools
+
+    def cancel_warm(self, wager_id: int):
+        """Abandon a warm that failed."""
+        self._warming[wager_id] -= 1
+        if self._warming[wager_id] <= 0:
+            del self._warming[wager_id]
+            self._dirty.discard(wager_id)
+
+    def begin_bet(self, wager_id: int):
+        """Note that a bet on a wager is about to be written; record_bet or cancel_bet ends it."""
+        self._betting[wager_id] += 1
+
+    def record_bet(self, wager_id: int, option_index: int, amount: int, new_position: bool = True):
+        """Add a committed bet to the wager's pools."""
+        self.stats["bets_recorded"] += 1
+        self._end_bet(wager_id)
+        pools = self._pools.get(wager_id)
+        if pools is not None:
+            pools.add(option_index, amount, new_position)
+        elif wager_id in self._warming:
+            self._dirty.add(wager_id)
+
+    def cancel_bet(self, wager_id: int, committed: bool = True):
+        """End a bet that failed. Unless it surely didn't commit, drop the pools in case it did."""
+        self._end_bet(wager_id)
+        if committed:
+            self.discard(wager_id)
+            if wager_id in self._warming:
+                self._dirty.add(wager_id)
+
+    def _end_bet(self, wager_id: int):
+        self._betting[wager_id] -= 1
+        if self._betting[wager_id] <= 0:
+            del self._betting[wager_id]
+
+    def discard(self, wager_id: int):
+        """Forget a wager's pools, e.g. once it's settled."""
+        self._pools.pop(wager_id, None)
+
+
+odds_book = OddsBook()
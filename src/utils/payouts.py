@@ -0,0 +1,74 @@
+"""Exact integer payout allocation helpers.
+
+A pool is split across winning stakes by the largest-remainder method: every
+stake gets ``floor(stake * pool / total_stake)``, and the bits lost to
+rounding go one at a time to the stakes with the largest remainders, ties to
+the earlier stake. ``rounding_cutoff`` finds the last stake that gets a bit
+and ``stake_payout`` prices one stake from it, so resolutions can pay
+positions as they stream past without holding them all. ``allocate_payouts``
+prices a whole list the same way.
+"""
+import heapq
+from typing import List, Optional, Sequence, Tuple
+
+
+def apply_rake(total_pool: int, rake_bps: int) -> int:
+    """Return the house rake (in bits) taken from a pool, rounded down."""
+    if not 0 <= rake_bps <= 10000:
+        raise ValueError(f"Rake must be between 0 and 10000 basis points, got {rake_bps}")
+    return int(total_pool) * rake_bps // 10000
+
+
+def rounding_cutoff(stakes: Sequence[int], pool: int) -> Optional[Tuple[int, int]]:
+    """Return (remainder, index) of the last stake given a leftover bit, or None if none is left over."""
+    total_stake = sum(stakes)
+    floored = 0
+    remainders = []
+    for stake in stakes:
+        share, remainder = divmod(stake * pool, total_stake)
+        floored += share
+        remainders.append(remainder)
+
+    leftover = pool - floored
+    if not leftover:
+        return None
+    # A heap only pays off while few stakes get a bit; past that a full sort is
+    # several times faster. Both keep ties in stake order.
+    if leftover < len(stakes) // 64:
+        last = heapq.nlargest(leftover, range(len(stakes)), key=remainders.__getitem__)[-1]
+    else:
+        last = sorted(range(len(stakes)), key=remainders.__getitem__, reverse=True)[leftover - 1]
+    return remainders[last], last
+
+
+def stake_payout(stake: int, order: int, pool: int, total_stake: int, cutoff: Optional[Tuple[int, int]]) -> int:
+    """Return one stake's share of ``pool``, given the ``rounding_cutoff`` of all the stakes.
+
+    ``order`` places the stake among the others (its index, or anything sorting
+    the same way, such as a position ID) and must be what the cutoff was found with.
+    """
+    share, remainder = divmod(stake * pool, total_stake)
+    if cutoff is not None and (-remainder, order) <= (-cutoff[0], cutoff[1]):
+        share += 1
+    return share
+
+
+def allocate_payouts(winning_stakes: Sequence[int], pool: int) -> List[int]:
+    """Split ``pool`` across ``winning_stakes`` proportionally, in exact integers.
+
+    The result always sums to exactly ``pool``. Any sequence of integers is
+    accepted, including numpy arrays; values are converted to Python ints so
+    that ``stake * pool`` can't overflow.
+    """
+    stakes = [int(stake) for stake in winning_stakes]
+    pool = int(pool)
+    if pool < 0:
+        raise ValueError("Pool cannot be negative.")
+    if not stakes:
+        return []
+    if any(stake <= 0 for stake in stakes):
+        raise ValueError("Winning stakes must be positive.")
+
+    total_stake = sum(stakes)
+    cutoff = rounding_cutoff(stakes, pool)
+    return [stake_payout(stake, index, pool, total_stake, cutoff) for index, stake in enumerate(stakes)]
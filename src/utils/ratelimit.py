@@ -0,0 +1,134 @@
+"""In-memory token-bucket rate limiting for interactions.
+
+Every slash command and button press draws a token from its user's bucket,
+its guild's bucket and, when it targets a wager, that wager's bucket. A bet
+is charged once, when its button is pressed: the amount modal that press
+opens is submitted for free. An interaction is rejected if any bucket is empty, without
+draining the others. Rejections cost a dict lookup and an ephemeral reply,
+so they happen before any database work.
+"""
+import time
+from collections import Counter
+from typing import Hashable, Optional, Tuple
+
+import discord
+from discord import app_commands
+
+from src import config
+
+# "allowed", "rejected_user", "rejected_guild", "rejected_wager"
+rate_limit_stats = Counter()
+
+# Buckets kept per limiter before full (idle) buckets are first pruned
+MAX_TRACKED_KEYS = 10000
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by ID, all sharing one refill rate and burst size.
+
+    A bucket holds up to ``burst`` tokens and refills at ``rate`` tokens per
+    second. A rate or burst of 0 disables the limiter.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # key -> (tokens, monotonic time of last update)
+        self._prune_at = MAX_TRACKED_KEYS  # Bucket count that triggers the next prune
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.burst > 0
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def retry_after(self, key: Hashable, now: float) -> float:
+        """Return how long until the bucket has a token (0 if it has one now)."""
+        tokens = self._tokens(key, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, key: Hashable, now: float):
+        """Take a token from the bucket."""
+        self._buckets[key] = (self._tokens(key, now) - 1, now)
+        if len(self._buckets) > self._prune_at:
+            self._prune(now)
+
+    def _prune(self, now: float):
+        """Drop the buckets that have refilled completely."""
+        # A bucket that has refilled completely is the same as a missing one
+        full_after = self.burst / self.rate
+        for idle_key in [k for k, (_, updated_at) in self._buckets.items() if now - updated_at >= full_after]:
+            del self._buckets[idle_key]
+        # Wait for as many new buckets as survived, so the scans cost O(1) per take
+        self._prune_at = max(MAX_TRACKED_KEYS, 2 * len(self._buckets))
+
+
+user_limiter = TokenBucketLimiter(config.RATE_LIMIT_USER_RATE, config.RATE_LIMIT_USER_BURST)
+guild_limiter = TokenBucketLimiter(config.RATE_LIMIT_GUILD_RATE, config.RATE_LIMIT_GUILD_BURST)
+wager_limiter = TokenBucketLimiter(config.RATE_LIMIT_WAGER_RATE, config.RATE_LIMIT_WAGER_BURST)
+
+REJECTION_MESSAGES = {
+    "user": "⏳ You're going too fast. Try again in {wait:.0f}s.",
+    "guild": "⏳ This server is sending too many requests right now. Try again in {wait:.0f}s.",
+    "wager": "⏳ This wager is getting too many requests right now. Try again in {wait:.0f}s.",
+}
+
+
+def acquire(user_id: int, guild_id: Optional[int] = None, wager_id: Optional[int] = None) -> Optional[Tuple[str, float]]:
+    """Draw a token from each applicable bucket.
+
+    Returns None if the interaction may proceed, or the rejecting scope and
+    the seconds until it would be allowed. Tokens are only taken when every
+    bucket has one.
+    """
+    now = time.monotonic()
+    checks = [("user", user_limiter, user_id)]
+    if guild_id is not None:
+        checks.append(("guild", guild_limiter, guild_id))
+    if wager_id is not None:
+        checks.append(("wager", wager_limiter, wager_id))
+    checks = [check for check in checks if check[1].enabled]
+
+    for scope, limiter, key in checks:
+        wait = limiter.retry_after(key, now)
+        if wait > 0:
+            rate_limit_stats[f"rejected_{scope}"] += 1
+            return scope, wait
+
+    for _, limiter, key in checks:
+        limiter.take(key, now)
+    rate_limit_stats["allowed"] += 1
+    return None
+
+
+async def check_rate_limit(interaction: discord.Interaction, wager_id: Optional[int] = None) -> bool:
+    """Rate-limit an interaction, replying to it if it is rejected.
+
+    Used as the ``interaction_check`` of the command tree, views and modals.
+    """
+    rejection = acquire(interaction.user.id, interaction.guild_id, wager_id)
+    if rejection is None:
+        return True
+
+    scope, wait = rejection
+    try:
+        await interaction.response.send_message(
+            REJECTION_MESSAGES[scope].format(wait=max(wait, 1)),
+            ephemeral=True
+        )
+    except discord.HTTPException:
+        pass
+    return False
+
+
+class RateLimitedCommandTree(app_commands.CommandTree):
+    """Command tree that rate-limits every slash command before it runs."""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Autocomplete requests can't be answered with a message and don't run commands
+        if interaction.type is discord.InteractionType.autocomplete:
+            return True
+        wager_id = interaction.namespace.wager_id
+        return await check_rate_limit(interaction, wager_id if isinstance(wager_id, int) else None)
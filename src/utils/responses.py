@@ -0,0 +1,93 @@
+"""Interaction response pipeline with a latency budget.
+
+Discord fails an interaction that isn't acknowledged within 3 seconds. A
+``BudgetedResponder`` watches the clock while a handler runs: if the handler
+hasn't responded when its budget runs out, the interaction is deferred
+automatically and the eventual response is sent as a follow-up instead.
+
+The first follow-up after a defer replaces its "thinking" placeholder and
+takes the placeholder's visibility, whatever it asks for. So the automatic
+defer is ephemeral by default, and a public reply that follows it deletes
+the placeholder and goes out as a new message.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+
+import discord
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+# Discord's hard deadline for acknowledging an interaction
+INTERACTION_DEADLINE_SECONDS = 3.0
+
+# Per-command counters: "<command>.responses", "<command>.deferred", "<command>.overruns"
+response_stats = Counter()
+
+
+class BudgetedResponder:
+    """Acknowledge an interaction within a latency budget.
+
+    Use as ``async with BudgetedResponder(interaction, "bet") as responder:``
+    and reply with ``responder.send(...)``. ``ephemeral`` sets the visibility
+    of the automatic defer; only turn it off for a command that never sends
+    an ephemeral message, errors included.
+    """
+
+    def __init__(self, interaction: discord.Interaction, command: str, ephemeral: bool = True, budget: float = None):
+        self.interaction = interaction
+        self.command = command
+        self.ephemeral = ephemeral
+        self.budget = config.INTERACTION_RESPONSE_BUDGET if budget is None else budget
+        self.deferred = False
+        self._placeholder = False  # The automatic defer's "thinking" message is still showing
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._started_at = None
+
+    async def __aenter__(self):
+        self._started_at = time.monotonic()
+        self._timer = asyncio.create_task(self._defer_when_due())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._timer.cancel()
+        elapsed = time.monotonic() - self._started_at
+        response_stats[f"{self.command}.responses"] += 1
+        if elapsed > self.budget:
+            response_stats[f"{self.command}.overruns"] += 1
+            logger.warning(
+                f"/{self.command} took {elapsed:.2f}s against a {self.budget:.2f}s response budget"
+                f"{' (deferred)' if self.deferred else ''}"
+            )
+        return False
+
+    async def _defer_when_due(self):
+        """Defer the interaction if nothing has been sent when the budget runs out."""
+        await asyncio.sleep(self.budget)
+        async with self._lock:
+            if self.interaction.response.is_done():
+                return
+            try:
+                await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+                self.deferred = True
+                self._placeholder = True
+                response_stats[f"{self.command}.deferred"] += 1
+            except discord.HTTPException as e:
+                logger.error(f"Failed to defer /{self.command}: {e}")
+
+    async def send(self, content: str = None, **kwargs):
+        """Send the response, or a follow-up if the interaction was already acknowledged."""
+        if content is not None:
+            kwargs["content"] = content
+        async with self._lock:
+            if not self.interaction.response.is_done():
+                return await self.interaction.response.send_message(**kwargs)
+            if self._placeholder and kwargs.get("ephemeral", False) != self.ephemeral:
+                # Replacing the placeholder would show this reply with the wrong visibility
+                await self.interaction.delete_original_response()
+            self._placeholder = False
+            return await self.interaction.followup.send(**kwargs)
@@ -0,0 +1,188 @@
+"""Outbound Discord REST scheduling.
+
+Calls are queued in two lanes: the high-priority lane for anything a user is
+waiting on and the low-priority lane for background work such as refreshing
+pinned wager embeds. Each call names the rate-limit route it belongs to (for
+example ``("channel", channel_id)``); calls on the same route run one at a
+time, and a 429 on a route pauses that route for its Retry-After. A call
+whose route is busy or paused is parked with that route and queued again,
+ahead of later calls, once the route frees up.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter, defaultdict, deque
+from typing import Awaitable, Callable, Hashable, Optional
+
+import discord
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_LOW = 1
+
+LANE_NAMES = {PRIORITY_HIGH: "high", PRIORITY_LOW: "low"}
+
+# How many times a call that hits a 429 is retried before giving up
+MAX_RATE_LIMIT_RETRIES = 3
+
+
+class _Request:
+    """A queued REST call."""
+    __slots__ = ("route", "call", "priority", "coalesce_key", "future", "enqueued_at", "attempts")
+
+    def __init__(self, route, call, priority, coalesce_key, future):
+        self.route = route
+        self.call = call
+        self.priority = priority
+        self.coalesce_key = coalesce_key
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class RestScheduler:
+    """Priority queue and worker pool for outbound Discord REST calls."""
+
+    def __init__(self, concurrency: int = 4):
+        self.concurrency = concurrency
+        self.stats = Counter()
+        self._queue = None
+        self._sequence = itertools.count()
+        self._workers = []
+        self._pending = Counter()  # lane -> queued requests
+        self._coalesced = {}  # coalesce key -> queued request
+        self._busy_routes = set()  # Routes running a call or paused by a 429
+        self._parked = defaultdict(list)  # route -> heap of queue items waiting for it
+        self._wait_times = {lane: deque(maxlen=500) for lane in LANE_NAMES}
+
+    def _ensure_started(self):
+        """Start the workers on the running event loop the first time they're needed."""
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    def submit(
+        self,
+        route: Hashable,
+        call: Callable[[], Awaitable],
+        priority: int = PRIORITY_LOW,
+        coalesce_key: Optional[Hashable] = None
+    ) -> asyncio.Future:
+        """Queue a REST call and return a future for its result.
+
+        ``call`` is a zero-argument function returning the coroutine to run. If
+        ``coalesce_key`` matches a call that is still queued, that call's future
+        is returned instead of queueing a duplicate.
+        """
+        self._ensure_started()
+        if coalesce_key is not None and coalesce_key in self._coalesced:
+            self.stats["coalesced"] += 1
+            return self._coalesced[coalesce_key].future
+
+        request = _Request(route, call, priority, coalesce_key, asyncio.get_running_loop().create_future())
+        if coalesce_key is not None:
+            self._coalesced[coalesce_key] = request
+        self._pending[priority] += 1
+        self.stats[f"submitted_{LANE_NAMES[priority]}"] += 1
+        self._queue.put_nowait((priority, next(self._sequence), request))
+        return request.future
+
+    async def call(
+        self,
+        route: Hashable,
+        call: Callable[[], Awaitable],
+        priority: int = PRIORITY_HIGH,
+        coalesce_key: Optional[Hashable] = None
+    ):
+        """Queue a REST call and wait for its result."""
+        return await self.submit(route, call, priority, coalesce_key)
+
+    def _release_route(self, route: Hashable):
+        """Free a route and queue the first request parked on it."""
+        self._busy_routes.discard(route)
+        parked = self._parked.get(route)
+        if parked:
+            self._queue.put_nowait(heapq.heappop(parked))
+            if not parked:
+                del self._parked[route]
+
+    async def _worker(self):
+        """Run queued calls, respecting route buckets."""
+        while True:
+            item = await self._queue.get()
+            priority, _, request = item
+
+            if request.route in self._busy_routes:
+                # Wait with the route rather than polling it; queue order sorts the parked calls
+                heapq.heappush(self._parked[request.route], item)
+                self.stats["parked"] += 1
+                continue
+
+            now = time.monotonic()
+
+            if request.coalesce_key is not None:
+                self._coalesced.pop(request.coalesce_key, None)
+            self._pending[priority] -= 1
+            self._wait_times[priority].append(now - request.enqueued_at)
+
+            self._busy_routes.add(request.route)
+            paused_for = 0.0
+            try:
+                result = await request.call()
+            except discord.HTTPException as e:
+                if e.status == 429 and request.attempts < MAX_RATE_LIMIT_RETRIES:
+                    paused_for = float(e.response.headers.get("Retry-After", 1.0))
+                    self.stats["rate_limited"] += 1
+                    logger.warning(f"Rate limited on route {request.route}, retrying in {paused_for:.2f}s")
+                    request.attempts += 1
+                    if request.coalesce_key is not None:
+                        self._coalesced.setdefault(request.coalesce_key, request)
+                    self._pending[priority] += 1
+                    # First in line once the pause is over
+                    heapq.heappush(self._parked[request.route], item)
+                else:
+                    self.stats["failed"] += 1
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            except Exception as e:
+                self.stats["failed"] += 1
+                if not request.future.done():
+                    request.future.set_exception(e)
+            else:
+                self.stats[f"completed_{LANE_NAMES[priority]}"] += 1
+                if not request.future.done():
+                    request.future.set_result(result)
+            finally:
+                if paused_for:
+                    asyncio.get_running_loop().call_later(paused_for, self._release_route, request.route)
+                else:
+                    self._release_route(request.route)
+
+    def get_metrics(self) -> dict:
+        """Return queue depth, wait latency and counters per lane."""
+        metrics = dict(self.stats)
+        for priority, lane in LANE_NAMES.items():
+            waits = sorted(self._wait_times[priority])
+            metrics[f"depth_{lane}"] = self._pending[priority]
+            metrics[f"wait_avg_{lane}"] = sum(waits) / len(waits) if waits else 0.0
+            metrics[f"wait_p95_{lane}"] = waits[int(len(waits) * 0.95)] if waits else 0.0
+        return metrics
+
+
+rest_scheduler = RestScheduler(concurrency=config.REST_CONCURRENCY)
+
+
+async def send_followup(interaction: discord.Interaction, *args, **kwargs):
+    """Send an interaction follow-up through the high-priority lane."""
+    return await rest_scheduler.call(
+        ("interaction", interaction.id),
+        lambda: interaction.followup.send(*args, **kwargs),
+        priority=PRIORITY_HIGH
+    )
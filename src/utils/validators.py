@@ -1,5 +1,7 @@
 """Input validation helpers."""
-from typing import Tuple
+import csv
+import io
+from typing import Dict, List, Tuple
 from src import config
 
 
@@ -31,3 +33,26 @@ def validate_wager_title(title: str) -> Tuple[bool, str]:
         return False, "Wager title cannot exceed 200 characters."
     return True, ""
 
+
+
+def parse_balance_csv(content: str) -> Tuple[Dict[int, int], List[str]]:
+    """Parse a user_id,amount CSV into summed adjustments and per-line errors."""
+    adjustments: Dict[int, int] = {}
+    errors: List[str] = []
+    for line_number, row in enumerate(csv.reader(io.StringIO(content)), start=1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if len(row) < 2:
+            errors.append(f"Line {line_number}: expected user_id,amount")
+            continue
+        try:
+            user_id = int(row[0].strip())
+            amount = int(row[1].strip())
+        except ValueError:
+            # Allow a header row
+            if line_number == 1:
+                continue
+            errors.append(f"Line {line_number}: user_id and amount must be integers")
+            continue
+        adjustments[user_id] = adjustments.get(user_id, 0) + amount
+    return adjustments, errors
@@ -0,0 +1,56 @@
+"""Shared fixtures.
+
+Tests marked ``database`` run against the PostgreSQL database named by
+TEST_DATABASE_URL and are skipped without it. They create the schema there
+and empty every table before each test, so never point it at a database
+you want to keep:
+
+    TEST_DATABASE_URL=postgresql://localhost/discord_bits_test python -m pytest
+"""
+import asyncio
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+if TEST_DATABASE_URL:
+    # src.config reads the URL once, at import time
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ.setdefault("DISCORD_TOKEN", "test")
+os.environ["EVENT_LOG_PATH"] = ""
+
+
+def run(coroutine):
+    """Run a coroutine on a fresh event loop, closing the pooled connections it opened."""
+    from src.database.database import engine
+
+    async def _run():
+        try:
+            return await coroutine
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(_run())
+
+
+async def _reset_schema():
+    from sqlalchemy import text
+    from src.database.database import engine
+    from src.database.models import Base
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+        await connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+
+@pytest.fixture
+def db():
+    """An empty schema in the test database, and the in-memory caches emptied to match."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from src.database.ledger import ledger_balances
+
+    run(_reset_schema())
+    ledger_balances.clear()
+    return run
@@ -0,0 +1,202 @@
+"""Placing bets, and bets racing the commands that settle a wager."""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from src import config
+from src.database.database import get_balance, get_session
+from src.database.economy import Rejected, create_wager, place_wager_bet, request_resolution
+from src.database.jobs import claim_job, run_resolve_job
+from src.database.ledger import run_ledger_compactor
+from src.database.models import Position, Transaction, User, TRANSACTION_TYPE_BET_PLACED
+from src.database.repository import get_wager_options, place_bet
+
+pytestmark = pytest.mark.database
+
+GUILD = 1
+
+
+async def _new_wager(options=("Yes", "No")):
+    async with get_session() as session:
+        return await create_wager(session, GUILD, 100, "Race", None, list(options))
+
+
+async def _bet(wager_id: int, user_id: int, option_index: int, amount: int):
+    async with get_session() as session:
+        try:
+            return await place_wager_bet(session, GUILD, wager_id, user_id, option_index, amount)
+        except Rejected:
+            await session.rollback()
+            raise
+
+
+async def _resolve(wager_id: int, option_index: int):
+    async with get_session() as session:
+        await request_resolution(session, GUILD, wager_id, option_index)
+    async with get_session() as session:
+        job = await claim_job(session)
+    return await run_resolve_job(job)
+
+
+async def _users_and_bits():
+    if config.BALANCE_LEDGER_MODE:
+        await run_ledger_compactor()
+    async with get_session() as session:
+        return tuple((await session.execute(
+            select(func.count(), func.sum(User.bits_balance)).where(User.guild_id == GUILD)
+        )).one())
+
+
+def test_bets_keep_option_totals_and_take_the_stake(db):
+    async def scenario():
+        wager = await _new_wager()
+        await _bet(wager.wager_id, 1, 0, 100)
+        topped_up = await _bet(wager.wager_id, 1, 0, 50)
+        await _bet(wager.wager_id, 2, 1, 30)
+        async with get_session() as session:
+            options = await get_wager_options(session, wager.wager_id)
+            balance = await get_balance(session, GUILD, 1)
+        return topped_up, options, balance
+
+    topped_up, options, balance = db(scenario())
+    assert (topped_up.position.amount, topped_up.position.bet_count) == (150, 2)
+    assert [(option.total, option.count) for option in options] == [(150, 1), (30, 1)]
+    assert balance == topped_up.balance == config.STARTING_BALANCE - 150
+
+
+def test_bet_on_a_missing_option_is_rejected_and_takes_nothing(db):
+    async def scenario():
+        wager = await _new_wager()
+        with pytest.raises(Rejected, match="Invalid option"):
+            await _bet(wager.wager_id, 1, 5, 100)
+        async with get_session() as session:
+            return await get_wager_options(session, wager.wager_id), await get_balance(session, GUILD, 1)
+
+    options, balance = db(scenario())
+    assert all(option.total == 0 for option in options)
+    assert balance == config.STARTING_BALANCE
+
+
+def test_bet_after_resolve_is_rejected(db):
+    async def scenario():
+        wager = await _new_wager()
+        await _bet(wager.wager_id, 1, 0, 100)
+        await _bet(wager.wager_id, 2, 1, 50)
+        async with get_session() as session:
+            await request_resolution(session, GUILD, wager.wager_id, 0)
+        with pytest.raises(Rejected):
+            await _bet(wager.wager_id, 3, 0, 200)
+        async with get_session() as session:
+            return (await session.execute(select(func.count()).select_from(Position))).scalar_one()
+
+    assert db(scenario()) == 2
+
+
+def test_resolve_waits_for_a_bet_in_flight_and_pays_it(db):
+    async def scenario():
+        wager = await _new_wager()
+        await _bet(wager.wager_id, 1, 0, 100)
+        await _bet(wager.wager_id, 2, 1, 100)
+
+        # A bet that has placed its position but not yet committed
+        betting = get_session()
+        session = await betting.__aenter__()
+        await get_balance(session, GUILD, 3)
+        await place_bet(session, GUILD, wager.wager_id, 3, 0, 300)
+
+        resolving = asyncio.create_task(_resolve(wager.wager_id, 0))
+        await asyncio.sleep(0.5)
+        blocked = not resolving.done()
+
+        await session.commit()
+        await betting.__aexit__(None, None, None)
+        result = await resolving
+        return blocked, result
+
+    blocked, result = db(scenario())
+    assert blocked
+    # The late stake is in the pool the plan split, so the pool is paid out exactly
+    assert result.winners == 2
+    assert sum(payout.amount for payout in result.payouts) == 500
+
+
+def test_concurrent_bets_and_resolve_conserve_bits(db):
+    users = range(1, 41)
+
+    async def scenario():
+        wager = await _new_wager()
+        await _bet(wager.wager_id, 1, 0, 10)
+
+        async def bet(user_id):
+            await asyncio.sleep(user_id / 1000)
+            try:
+                await _bet(wager.wager_id, user_id, user_id % 2, 10 + user_id)
+            except Rejected:
+                pass
+
+        bets = [asyncio.create_task(bet(user_id)) for user_id in users]
+        await asyncio.sleep(0.02)
+        await _resolve(wager.wager_id, 0)
+        await asyncio.gather(*bets)
+        return await _users_and_bits()
+
+    # Every stake that was taken was paid back out: no bits created or lost.
+    # Bettors turned away after the resolve never got a row.
+    user_count, total = db(scenario())
+    assert total == user_count * config.STARTING_BALANCE
+
+
+def test_concurrent_bets_never_overdraw(db):
+    async def scenario():
+        wager = await _new_wager()
+        async with get_session() as session:
+            await get_balance(session, GUILD, 1)
+
+        async def bet(option_index):
+            try:
+                await _bet(wager.wager_id, 1, option_index, 300)
+                return True
+            except Rejected:
+                return False
+
+        placed = await asyncio.gather(*(bet(index % 2) for index in range(12)))
+        if config.BALANCE_LEDGER_MODE:
+            await run_ledger_compactor()
+        async with get_session() as session:
+            staked = (await session.execute(select(func.sum(Position.amount)))).scalar_one()
+            balance = (await session.execute(
+                select(User.bits_balance).where(User.guild_id == GUILD).where(User.user_id == 1)
+            )).scalar_one()
+        return sum(placed), staked, balance
+
+    placed, staked, balance = db(scenario())
+    # 1000 covers three 300-bit bets; the rest are refused by the debit itself
+    assert placed == config.STARTING_BALANCE // 300
+    assert staked == placed * 300
+    assert balance == config.STARTING_BALANCE - staked >= 0
+
+
+def test_concurrent_bets_link_each_debit_to_its_own_position(db):
+    amounts = range(11, 31)
+
+    async def scenario():
+        wagers = [await _new_wager() for _ in amounts]
+        async with get_session() as session:
+            await get_balance(session, GUILD, 1)
+        placed = await asyncio.gather(*(
+            _bet(wager.wager_id, 1, 0, amount) for wager, amount in zip(wagers, amounts)
+        ))
+        async with get_session() as session:
+            debits = (await session.execute(
+                select(Transaction.reference_id, Transaction.amount)
+                .where(Transaction.transaction_type == TRANSACTION_TYPE_BET_PLACED)
+            )).all()
+            positions = (await session.execute(select(Position.position_id, Position.amount))).all()
+        return placed, dict(debits), dict(positions)
+
+    placed, debits, positions = db(scenario())
+    # Each debit references the position its own bet created, whatever order they committed in
+    assert debits == {position_id: -amount for position_id, amount in positions.items()}
+    assert {bet.position.position_id: bet.position.amount for bet in placed} == positions
+    assert min(bet.balance for bet in placed) == config.STARTING_BALANCE - sum(amounts)
@@ -0,0 +1,33 @@
+"""Claiming interactions so a redelivered one is handled once."""
+import pytest
+
+from src.database.database import get_session
+from src.database.idempotency import claim_interaction, idempotency_stats
+
+pytestmark = pytest.mark.database
+
+
+def test_a_claim_rolled_back_leaves_the_interaction_free(db):
+    async def scenario():
+        async with get_session() as session:
+            first = await claim_interaction(session, 501, "daily", 1)
+            await session.rollback()
+        async with get_session() as session:
+            retried = await claim_interaction(session, 501, "daily", 1)
+            await session.commit()
+        return first, retried
+
+    assert db(scenario()) == (True, True)
+
+
+def test_a_committed_claim_turns_repeats_away_from_memory(db):
+    async def scenario():
+        async with get_session() as session:
+            claimed = await claim_interaction(session, 502, "daily", 1)
+            await session.commit()
+        before = idempotency_stats["duplicates_memory"]
+        async with get_session() as session:
+            repeated = await claim_interaction(session, 502, "daily", 1)
+        return claimed, repeated, idempotency_stats["duplicates_memory"] - before
+
+    assert db(scenario()) == (True, False, 1)
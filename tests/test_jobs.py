@@ -0,0 +1,148 @@
+"""Resolve jobs: what they pay, and recovering from a worker that dies mid-payout."""
+import pytest
+from sqlalchemy import func, select
+
+from src import config
+from src.database.database import get_session
+from src.database.economy import create_wager, place_wager_bet, request_resolution
+from src.database.jobs import JobLeaseLost, claim_job, run_resolve_job
+from src.database.ledger import run_ledger_compactor
+from src.database.models import (
+    Job, Position, Transaction, User, Wager,
+    JOB_STATUS_DONE, JOB_STATUS_FAILED, WAGER_STATUS_RESOLVED, TRANSACTION_TYPE_BET_WON
+)
+from src.utils.payouts import allocate_payouts, apply_rake
+
+pytestmark = pytest.mark.database
+
+GUILD = 1
+WINNERS = 10
+
+
+class WorkerCrashed(Exception):
+    """Stands in for the worker process dying."""
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Three positions per chunk, and leases that expire at once, so a second
+    # worker can take over a job the first one left running
+    monkeypatch.setattr(config, "JOB_CHUNK_SIZE", 3)
+    monkeypatch.setattr(config, "JOB_LEASE_SECONDS", 0)
+
+
+async def _resolvable_wager() -> int:
+    async with get_session() as session:
+        wager = await create_wager(session, GUILD, 100, "Crash", None, ["Yes", "No"])
+    for user_id in range(1, WINNERS + 1):
+        async with get_session() as session:
+            await place_wager_bet(session, GUILD, wager.wager_id, user_id, 0, 10 * user_id)
+    async with get_session() as session:
+        await place_wager_bet(session, GUILD, wager.wager_id, 50, 1, 500)
+    async with get_session() as session:
+        await request_resolution(session, GUILD, wager.wager_id, 0)
+    return wager.wager_id
+
+
+async def _claim():
+    async with get_session() as session:
+        return await claim_job(session)
+
+
+async def _crash_after_first_chunk(done, total):
+    raise WorkerCrashed()
+
+
+async def _state(wager_id: int):
+    if config.BALANCE_LEDGER_MODE:
+        await run_ledger_compactor()
+    async with get_session() as session:
+        job = (await session.execute(select(Job))).scalar_one()
+        wager = await session.get(Wager, wager_id)
+        paid = (await session.execute(
+            select(Transaction.reference_id, func.count())
+            .where(Transaction.transaction_type == TRANSACTION_TYPE_BET_WON)
+            .group_by(Transaction.reference_id)
+        )).all()
+        total = (await session.execute(select(func.sum(User.bits_balance)))).scalar_one()
+        users = (await session.execute(select(func.count()).select_from(User))).scalar_one()
+        return job, wager, dict(paid), total, users
+
+
+def test_a_job_abandoned_mid_payout_resumes_without_paying_twice(db, small_chunks):
+    async def scenario():
+        wager_id = await _resolvable_wager()
+        first = await _claim()
+        with pytest.raises(WorkerCrashed):
+            await run_resolve_job(first, on_progress=_crash_after_first_chunk)
+
+        # The lease has expired, so the next worker takes the job over from its checkpoint
+        second = await _claim()
+        resumed_from = second.checkpoint
+        result = await run_resolve_job(second)
+        # The first worker can't write anything more once the job is taken from it
+        with pytest.raises(JobLeaseLost):
+            await run_resolve_job(first)
+        return first, second, resumed_from, result, await _state(wager_id)
+
+    first, second, resumed_from, result, (job, wager, paid, total, users) = db(scenario())
+    assert second.job_id == first.job_id
+    assert resumed_from == first.checkpoint == config.JOB_CHUNK_SIZE
+    assert (job.status, job.attempts) == (JOB_STATUS_DONE, 2)
+    assert wager.status == WAGER_STATUS_RESOLVED
+    # Every winning position was paid exactly once, and the pool was paid out in full
+    assert result.winners == len(paid) == WINNERS
+    assert set(paid.values()) == {1}
+    assert total == users * config.STARTING_BALANCE - result.rake
+
+
+def test_a_job_that_keeps_crashing_fails_for_good(db, small_chunks):
+    async def scenario():
+        wager_id = await _resolvable_wager()
+        for _ in range(config.JOB_MAX_ATTEMPTS):
+            job = await _claim()
+            with pytest.raises(WorkerCrashed):
+                await run_resolve_job(job, on_progress=_crash_after_first_chunk)
+        abandoned = await _claim()
+        return abandoned, await _state(wager_id)
+
+    abandoned, (job, wager, paid, total, users) = db(scenario())
+    assert abandoned is None
+    assert (job.status, job.attempts) == (JOB_STATUS_FAILED, config.JOB_MAX_ATTEMPTS)
+    assert job.last_error
+    # Each attempt resumed from the last one's checkpoint, so nobody was paid twice
+    assert set(paid.values()) == {1}
+
+
+def test_resolution_credits_what_the_allocator_pays(db, monkeypatch):
+    monkeypatch.setattr(config, "HOUSE_RAKE_BPS", 250)
+    # Equal stakes tie on their rounding remainders; the odd ones out break the pattern
+    winning = [30, 30, 30, 20, 45, 30, 20, 30]
+    losing = [17, 23, 11]
+
+    async def scenario():
+        async with get_session() as session:
+            wager = await create_wager(session, GUILD, 100, "Ties", None, ["Yes", "No"])
+        bets = [(0, stake) for stake in winning] + [(1, stake) for stake in losing]
+        for user_id, (option_index, stake) in enumerate(bets, 1):
+            async with get_session() as session:
+                await place_wager_bet(session, GUILD, wager.wager_id, user_id, option_index, stake)
+        async with get_session() as session:
+            await request_resolution(session, GUILD, wager.wager_id, 0)
+        await run_resolve_job(await _claim())
+        async with get_session() as session:
+            result = await session.execute(
+                select(Transaction.amount)
+                .join(Position, Position.position_id == Transaction.reference_id)
+                .where(Transaction.transaction_type == TRANSACTION_TYPE_BET_WON)
+                .order_by(Position.position_id)
+            )
+            return list(result.scalars())
+
+    credited = db(scenario())
+    total_pool = sum(winning) + sum(losing)
+    pool = total_pool - apply_rake(total_pool, config.HOUSE_RAKE_BPS)
+    expected = allocate_payouts(winning, pool)
+    # The case under test: rounding bits left over, to be split among tied stakes
+    assert sum(stake * pool // sum(winning) for stake in winning) < pool
+    assert credited == expected
@@ -0,0 +1,55 @@
+"""Keeping cached pools in step with bets that commit while they load."""
+from src.utils.odds import OddsBook
+
+WAGER = 1
+
+
+def _warm(book: OddsBook, rows):
+    book.begin_warm(WAGER)
+    return book.finish_warm(WAGER, 2, rows)
+
+
+def test_recorded_bets_add_to_cached_pools():
+    book = OddsBook()
+    _warm(book, [(0, 100, 1, 5), (1, 50, 1, 6)])
+    book.begin_bet(WAGER)
+    book.record_bet(WAGER, 1, 30, new_position=True)
+    pools = book.get(WAGER)
+    assert (pools.totals, pools.counts, pools.total) == ([100, 80], [1, 2], 180)
+
+
+def test_pools_loaded_while_a_bet_is_in_flight_are_not_cached():
+    book = OddsBook()
+    # A bet with an older sequence number commits after the load read a newer one
+    book.begin_bet(WAGER)
+    loaded = _warm(book, [(0, 100, 1, 9)])
+    assert loaded.totals == [100, 0]
+    assert book.get(WAGER) is None
+
+    book.record_bet(WAGER, 0, 40, new_position=True)
+    pools = _warm(book, [(0, 140, 2, 9)])
+    assert book.get(WAGER) is pools and pools.totals == [140, 0]
+
+
+def test_a_bet_recorded_while_loading_spoils_the_load():
+    book = OddsBook()
+    book.begin_warm(WAGER)
+    book.begin_bet(WAGER)
+    book.record_bet(WAGER, 0, 40)
+    book.finish_warm(WAGER, 2, [(0, 100, 1, 3)])
+    assert book.get(WAGER) is None
+
+
+def test_a_failed_bet_drops_the_pools_unless_it_surely_did_not_commit():
+    book = OddsBook()
+    _warm(book, [(0, 100, 1, 5)])
+    book.begin_bet(WAGER)
+    book.cancel_bet(WAGER, committed=False)
+    assert book.get(WAGER) is not None
+
+    book.begin_bet(WAGER)
+    book.cancel_bet(WAGER)
+    assert book.get(WAGER) is None
+    # Nothing is left in flight, so the next load is cached
+    _warm(book, [(0, 100, 1, 5)])
+    assert book.get(WAGER) is not None
@@ -0,0 +1,130 @@
+"""Property tests for the exact-integer payout allocator and the streamed payouts that must match it."""
+import pytest
+from hypothesis import given, strategies as st
+
+from src.database.jobs import PayoutPlan
+from src.utils.payouts import allocate_payouts, apply_rake, rounding_cutoff
+
+stakes_lists = st.lists(st.integers(min_value=1, max_value=10**12), min_size=1, max_size=200)
+pools = st.integers(min_value=0, max_value=10**15)
+rakes = st.integers(min_value=0, max_value=10000)
+
+
+@given(stakes_lists, pools)
+def test_allocation_conserves_the_pool(stakes, pool):
+    assert sum(allocate_payouts(stakes, pool)) == pool
+
+
+@given(stakes_lists, pools)
+def test_each_payout_is_its_floored_share_or_one_more(stakes, pool):
+    total = sum(stakes)
+    for stake, payout in zip(stakes, allocate_payouts(stakes, pool)):
+        assert payout - stake * pool // total in (0, 1)
+
+
+@given(stakes_lists, pools)
+def test_rounding_bits_go_to_the_largest_remainders_then_the_earliest_stakes(stakes, pool):
+    total = sum(stakes)
+    payouts = allocate_payouts(stakes, pool)
+    # Rank every stake as the allocator should: largest remainder first, then earliest
+    ranked = sorted(range(len(stakes)), key=lambda i: (-(stakes[i] * pool % total), i))
+    bumped = [payouts[i] > stakes[i] * pool // total for i in ranked]
+    assert bumped == sorted(bumped, reverse=True)
+
+
+@given(
+    st.lists(st.integers(min_value=1, max_value=10**6), min_size=128, max_size=600),
+    st.integers(min_value=0, max_value=50),
+    st.integers(min_value=0, max_value=10**9)
+)
+def test_few_rounding_bits_are_handed_out_like_many(stakes, multiple, remainder_bits):
+    # Pools just past a multiple of the total stake leave few bits to round, which takes the heap path
+    total = sum(stakes)
+    pool = total * multiple + remainder_bits % max(len(stakes) // 64, 1)
+    payouts = allocate_payouts(stakes, pool)
+    ranked = sorted(range(len(stakes)), key=lambda i: (-(stakes[i] * pool % total), i))
+    expected = [stake * pool // total for stake in stakes]
+    for index in ranked[:pool - sum(expected)]:
+        expected[index] += 1
+    assert payouts == expected
+
+
+@given(st.integers(min_value=1, max_value=10**9), st.integers(min_value=1, max_value=500), pools)
+def test_equal_stakes_are_paid_within_a_bit_of_each_other(stake, count, pool):
+    payouts = allocate_payouts([stake] * count, pool)
+    assert max(payouts) - min(payouts) <= 1
+
+
+@given(stakes_lists, pools, rakes)
+def test_rake_and_payouts_add_up_to_the_pool(stakes, pool, rake_bps):
+    rake = apply_rake(pool, rake_bps)
+    assert 0 <= rake <= pool
+    assert rake == pool * rake_bps // 10000
+    assert rake + sum(allocate_payouts(stakes, pool - rake)) == pool
+
+
+@given(st.lists(st.integers(min_value=1, max_value=10**6), min_size=1, max_size=50), pools)
+def test_any_integer_sequence_is_accepted(stakes, pool):
+    assert allocate_payouts(tuple(stakes), pool) == allocate_payouts(stakes, pool)
+    assert allocate_payouts(range(1, len(stakes) + 1), pool) == allocate_payouts(list(range(1, len(stakes) + 1)), pool)
+
+
+def _plan(winning_stakes, losing_total: int, rake_bps: int) -> PayoutPlan:
+    """The plan plan_resolution builds from its aggregates, with position IDs counting up from 1."""
+    winning_total = sum(winning_stakes)
+    total_pool = winning_total + losing_total
+    rake = apply_rake(total_pool, rake_bps)
+    pool = total_pool - rake
+    leftover = pool - sum(stake * pool // winning_total for stake in winning_stakes)
+    cutoff = None
+    if leftover:
+        ranked = sorted(
+            ((stake * pool % winning_total, position_id) for position_id, stake in enumerate(winning_stakes, 1)),
+            key=lambda ranked_stake: (-ranked_stake[0], ranked_stake[1])
+        )
+        cutoff = ranked[leftover - 1]
+    return PayoutPlan(total_pool, rake, False, len(winning_stakes), winning_total, cutoff)
+
+
+@given(stakes_lists, st.integers(min_value=0, max_value=10**13), rakes)
+def test_streamed_payouts_match_the_allocator(stakes, losing_total, rake_bps):
+    plan = _plan(stakes, losing_total, rake_bps)
+    streamed = [plan.payout(position_id, stake) for position_id, stake in enumerate(stakes, 1)]
+    assert streamed == allocate_payouts(stakes, plan.total_pool - plan.rake)
+
+
+@given(st.integers(min_value=1, max_value=10**6), st.integers(min_value=2, max_value=100), rakes)
+def test_streamed_payouts_match_the_allocator_on_tied_stakes(stake, count, rake_bps):
+    stakes = [stake] * count
+    plan = _plan(stakes, stake * count // 3 + 1, rake_bps)
+    streamed = [plan.payout(position_id, stake) for position_id, stake in enumerate(stakes, 1)]
+    assert streamed == allocate_payouts(stakes, plan.total_pool - plan.rake)
+
+
+@given(stakes_lists, pools)
+def test_the_cutoff_is_the_last_stake_rounded_up(stakes, pool):
+    total = sum(stakes)
+    payouts = allocate_payouts(stakes, pool)
+    rounded_up = [index for index, stake in enumerate(stakes) if payouts[index] > stake * pool // total]
+    cutoff = rounding_cutoff(stakes, pool)
+    if not rounded_up:
+        assert cutoff is None
+    else:
+        last = max(rounded_up, key=lambda index: (-(stakes[index] * pool % total), index))
+        assert cutoff == (stakes[last] * pool % total, last)
+
+
+def test_no_winning_stakes_pay_nothing():
+    assert allocate_payouts([], 100) == []
+
+
+@pytest.mark.parametrize("stakes, pool", [([10, 0], 100), ([10, -5], 100), ([10], -1)])
+def test_invalid_stakes_and_pools_are_rejected(stakes, pool):
+    with pytest.raises(ValueError):
+        allocate_payouts(stakes, pool)
+
+
+@pytest.mark.parametrize("rake_bps", [-1, 10001])
+def test_rake_outside_zero_to_ten_thousand_bps_is_rejected(rake_bps):
+    with pytest.raises(ValueError):
+        apply_rake(100, rake_bps)
@@ -0,0 +1,36 @@
+"""Token buckets and how they forget idle keys."""
+from src.utils import ratelimit
+from src.utils.ratelimit import TokenBucketLimiter
+
+
+def test_a_burst_is_allowed_then_refills_at_the_rate():
+    limiter = TokenBucketLimiter(rate=2, burst=3)
+    for _ in range(3):
+        assert limiter.retry_after("user", 0.0) == 0
+        limiter.take("user", 0.0)
+    assert limiter.retry_after("user", 0.0) == 0.5
+    assert limiter.retry_after("user", 0.5) == 0
+
+
+def test_active_keys_past_the_limit_are_not_rescanned_on_every_take(monkeypatch):
+    monkeypatch.setattr(ratelimit, "MAX_TRACKED_KEYS", 100)
+    limiter = TokenBucketLimiter(rate=1, burst=10)
+    scans = 0
+    prune = limiter._prune
+
+    def counting_prune(now):
+        nonlocal scans
+        scans += 1
+        prune(now)
+
+    monkeypatch.setattr(limiter, "_prune", counting_prune)
+    # Every key stays active, so no prune can drop any of them
+    for key in range(1000):
+        limiter.take(key, 0.0)
+    assert scans <= 4
+
+    # Once they have all refilled, the next prune forgets them
+    for key in range(1000, 2001):
+        limiter.take(key, 100.0)
+    assert len(limiter._buckets) <= 2 * 1001
+    assert all(key >= 1000 for key in limiter._buckets)
@@ -0,0 +1,37 @@
+"""Finding and repairing balances that drifted from their transactions."""
+import pytest
+from sqlalchemy import update
+
+from src import config
+from src.database.database import get_balance, get_session, update_balance
+from src.database.models import User, TRANSACTION_TYPE_ADMIN_ADJUSTMENT
+from src.database.reconcile import reconcile_balances
+
+pytestmark = pytest.mark.database
+
+GUILD = 1
+
+
+def test_repair_moves_drifted_balances_back_and_the_cached_ones_with_them(db):
+    async def scenario():
+        async with get_session() as session:
+            for user_id in (1, 2, 3):
+                await update_balance(session, GUILD, user_id, 10 * user_id, TRANSACTION_TYPE_ADMIN_ADJUSTMENT)
+            # Drift two balances behind the transaction log's back
+            await session.execute(
+                update(User).where(User.user_id.in_([1, 3])).values(bits_balance=User.bits_balance + 7)
+            )
+            await session.commit()
+
+        report = await reconcile_balances(repair_drift=True, chunk_size=2)
+        after = await reconcile_balances()
+        async with get_session() as session:
+            balances = [await get_balance(session, GUILD, user_id) for user_id in (1, 2, 3)]
+        return report, after, balances
+
+    report, after, balances = db(scenario())
+    assert [(d.user_id, d.drift) for d in report.discrepancies] == [(1, 7), (3, 7)]
+    assert report.repaired == 2
+    assert after.discrepancies == []
+    # In ledger mode these come from the bot's cache, which the repair kept current
+    assert balances == [config.STARTING_BALANCE + 10 * user_id for user_id in (1, 2, 3)]
@@ -0,0 +1,94 @@
+"""Replaying a recorded event log with replay-events.py."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src import config
+from src.database.database import get_balance, get_session
+from src.utils.events import (
+    EVENT_BET, EVENT_CLOSE, EVENT_CREATE_WAGER, EVENT_DAILY, EVENT_RESOLVE, EventRecorder
+)
+
+pytestmark = pytest.mark.database
+
+ROOT = Path(__file__).resolve().parent.parent
+GUILD = 5
+BETTORS = range(1, 21)
+# Equal winning stakes on a second wager, in the order they're logged: 80 bits
+# split over 70 staked leaves 3 rounding bits for the first three positions
+TIED_WINNERS = range(46, 39, -1)
+TIED_LOSER = 47
+TIED_STAKE = 10
+
+
+def _write_log(path: Path):
+    """A day of traffic on one wager, with the log's own wager ID, plus events replay must turn away."""
+    recorder = EventRecorder(str(path))
+    events = [
+        (EVENT_CREATE_WAGER, 100, {"wager": 70, "title": "Replay", "description": None, "options": ["Yes", "No"]}),
+        *((EVENT_DAILY, user, {}) for user in BETTORS),
+        *((EVENT_BET, user, {"wager": 70, "option": user % 2, "amount": 10 * user}) for user in BETTORS),
+        (EVENT_DAILY, 1, {}),  # A second claim the same day is refused
+        (EVENT_BET, 1, {"wager": 71, "option": 0, "amount": 5}),  # Created before recording started
+        (EVENT_CLOSE, 100, {"wager": 70}),
+        (EVENT_BET, 2, {"wager": 70, "option": 0, "amount": 5}),  # Refused: the wager is closed
+        (EVENT_RESOLVE, 100, {"wager": 70, "option": 0}),
+        (EVENT_CREATE_WAGER, 100, {"wager": 72, "title": "Ties", "description": None, "options": ["Yes", "No"]}),
+        *((EVENT_BET, user, {"wager": 72, "option": 0, "amount": TIED_STAKE}) for user in TIED_WINNERS),
+        (EVENT_BET, TIED_LOSER, {"wager": 72, "option": 1, "amount": TIED_STAKE}),
+        (EVENT_CLOSE, 100, {"wager": 72}),
+        (EVENT_RESOLVE, 100, {"wager": 72, "option": 0}),
+    ]
+    for event_type, user_id, fields in events:
+        recorder.record(event_type, GUILD, user_id, **fields)
+    recorder.close()
+
+    # Spread the events a second apart, as recorded traffic would be
+    lines = path.read_text().splitlines()
+    path.write_text("".join(
+        json.dumps({**json.loads(line), "ts": 1_760_000_000 + index}) + "\n" for index, line in enumerate(lines)
+    ))
+
+
+def _replay(log: Path) -> dict:
+    result = subprocess.run(
+        [sys.executable, "replay-events.py", str(log), "--speed", "0", "--reset", "--json"],
+        cwd=ROOT, capture_output=True, text=True, timeout=120, env=os.environ.copy()
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    return json.loads(result.stdout[result.stdout.index("{"):])
+
+
+async def _tied_balances():
+    async with get_session() as session:
+        return [await get_balance(session, GUILD, user) for user in TIED_WINNERS]
+
+
+def test_replaying_a_log_twice_gives_the_same_balances(db, tmp_path):
+    log = tmp_path / "events.ndjson"
+    _write_log(log)
+
+    first = _replay(log)
+    second = _replay(log)
+
+    commands = first["commands"]
+    assert commands[EVENT_CREATE_WAGER]["ok"] == 2
+    assert (commands[EVENT_DAILY]["ok"], commands[EVENT_DAILY]["rejected"]) == (len(BETTORS), 1)
+    assert commands[EVENT_BET]["ok"] == len(BETTORS) + len(TIED_WINNERS) + 1
+    assert (commands[EVENT_BET]["skipped"], commands[EVENT_BET]["rejected"]) == (1, 1)
+    assert commands[EVENT_CLOSE]["ok"] == commands[EVENT_RESOLVE]["ok"] == 2
+    assert first["errors"] == []
+
+    # Stakes only move between users, so the guild holds its starting bits plus the daily rewards
+    balances = first["balances"]
+    assert balances["users"] == len(BETTORS) + len(TIED_WINNERS) + 2
+    assert balances["total_bits"] == balances["users"] * config.STARTING_BALANCE + len(BETTORS) * config.DAILY_REWARD_AMOUNT
+    assert second["balances"] == balances
+
+    # The rounding bits went to the tied winners who bet first in the log
+    won = [balance - config.STARTING_BALANCE + TIED_STAKE for balance in db(_tied_balances())]
+    assert won == [12, 12, 12, 11, 11, 11, 11]
@@ -0,0 +1,81 @@
+"""Replies through a BudgetedResponder, with and without the automatic defer."""
+import asyncio
+
+from src.utils.responses import BudgetedResponder
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, ephemeral=False, **kwargs):
+        self.done = True
+        self.interaction.shown.append((content, ephemeral))
+
+    async def defer(self, ephemeral=False, thinking=False):
+        self.done = True
+        self.interaction.placeholder = ephemeral
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, ephemeral=False, **kwargs):
+        interaction = self.interaction
+        if interaction.placeholder is not None:
+            # Discord edits the placeholder in place, keeping its visibility
+            ephemeral, interaction.placeholder = interaction.placeholder, None
+        interaction.shown.append((content, ephemeral))
+
+
+class FakeInteraction:
+    """Records each message shown as (content, ephemeral)."""
+
+    def __init__(self):
+        self.shown = []
+        self.placeholder = None  # Visibility of the deferred "thinking" message, while it shows
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def delete_original_response(self):
+        self.placeholder = None
+
+
+def _reply_late(*replies, **options):
+    """Send ``(content, ephemeral)`` replies after the responder's budget has run out."""
+    async def scenario():
+        interaction = FakeInteraction()
+        async with BudgetedResponder(interaction, "test", budget=0.01, **options) as responder:
+            await asyncio.sleep(0.05)
+            for content, ephemeral in replies:
+                await responder.send(content, ephemeral=ephemeral)
+        return interaction.shown, responder.deferred
+
+    return asyncio.run(scenario())
+
+
+def test_an_error_after_the_automatic_defer_stays_ephemeral():
+    shown, deferred = _reply_late(("❌ Insufficient balance", True))
+    assert deferred
+    assert shown == [("❌ Insufficient balance", True)]
+
+
+def test_a_public_reply_after_the_automatic_defer_stays_public():
+    shown, deferred = _reply_late(("✅ Bet placed", False), ("Odds updated", True))
+    assert deferred
+    assert shown == [("✅ Bet placed", False), ("Odds updated", True)]
+
+
+def test_a_reply_within_the_budget_is_not_deferred():
+    async def scenario():
+        interaction = FakeInteraction()
+        async with BudgetedResponder(interaction, "test", budget=1.0) as responder:
+            await responder.send("✅ Bet placed")
+        return interaction.shown, responder.deferred
+
+    assert asyncio.run(scenario()) == ([("✅ Bet placed", False)], False)
@@ -0,0 +1,172 @@
+"""The outbound REST scheduler, driven against a fake Discord HTTP layer."""
+import asyncio
+import time
+
+import discord
+import pytest
+
+from src.utils.rest import MAX_RATE_LIMIT_RETRIES, PRIORITY_HIGH, PRIORITY_LOW, RestScheduler
+
+
+class FakeResponse:
+    """The parts of an aiohttp response discord.HTTPException reads."""
+
+    def __init__(self, status: int, headers: dict):
+        self.status = status
+        self.reason = "Too Many Requests" if status == 429 else "Error"
+        self.headers = headers
+
+
+class FakeDiscord:
+    """Records every call it serves, and answers 429 to the first ``limited`` calls on a route."""
+
+    def __init__(self, limited=None, retry_after: float = 0.05):
+        self.calls = []  # (route, name, start, end)
+        self.limited = dict(limited or {})
+        self.retry_after = retry_after
+
+    def request(self, route, name, duration: float = 0.0):
+        async def call():
+            started = time.monotonic()
+            await asyncio.sleep(duration)
+            self.calls.append((route, name, started, time.monotonic()))
+            if self.limited.get(route, 0) > 0:
+                self.limited[route] -= 1
+                raise discord.HTTPException(
+                    FakeResponse(429, {"Retry-After": str(self.retry_after)}), "You are being rate limited."
+                )
+            return name
+        return call
+
+    def names(self):
+        return [name for _, name, _, _ in self.calls]
+
+
+def test_the_high_lane_overtakes_queued_background_work():
+    async def scenario():
+        http = FakeDiscord()
+        scheduler = RestScheduler(concurrency=1)
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        busy = scheduler.submit(("channel", 0), blocker)
+        await asyncio.sleep(0)
+        refreshes = [scheduler.submit(("channel", n), http.request(("channel", n), f"edit {n}")) for n in (1, 2, 3)]
+        reply = scheduler.submit(("interaction", 9), http.request(("interaction", 9), "reply"), PRIORITY_HIGH)
+        depth = scheduler.get_metrics()
+        gate.set()
+        await asyncio.gather(busy, reply, *refreshes)
+        return http.names(), depth, scheduler.get_metrics()
+
+    names, depth, metrics = asyncio.run(scenario())
+    assert names == ["reply", "edit 1", "edit 2", "edit 3"]
+    assert (depth["depth_high"], depth["depth_low"]) == (1, 3)
+    assert (metrics["depth_high"], metrics["depth_low"]) == (0, 0)
+    assert (metrics["completed_high"], metrics["completed_low"]) == (1, 4)
+
+
+def test_calls_on_one_route_never_overlap():
+    async def scenario():
+        http = FakeDiscord()
+        scheduler = RestScheduler(concurrency=4)
+        route = ("channel", 1)
+        await asyncio.gather(*(
+            scheduler.submit(route, http.request(route, f"edit {n}", duration=0.01)) for n in range(5)
+        ))
+        return http.calls
+
+    calls = asyncio.run(scenario())
+    spans = sorted((start, end) for _, _, start, end in calls)
+    assert len(spans) == 5
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(spans, spans[1:]))
+
+
+def test_calls_waiting_on_a_busy_route_run_in_order_without_polling():
+    async def scenario():
+        http = FakeDiscord()
+        scheduler = RestScheduler(concurrency=4)
+        route = ("channel", 1)
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        busy = scheduler.submit(route, blocker)
+        await asyncio.sleep(0)
+        edits = [scheduler.submit(route, http.request(route, f"edit {n}")) for n in range(5)]
+        # Long enough for polling workers to spin through the queue many times over
+        await asyncio.sleep(0.1)
+        parked = scheduler.get_metrics()["parked"]
+        gate.set()
+        await asyncio.gather(busy, *edits)
+        return http.names(), parked, scheduler.get_metrics()["parked"]
+
+    names, parked_while_busy, parked = asyncio.run(scenario())
+    assert names == [f"edit {n}" for n in range(5)]
+    # Each call was set aside once, then handed back when the route freed up
+    assert parked_while_busy == parked == 5
+
+
+def test_a_429_pauses_its_route_and_retries_while_other_routes_run():
+    async def scenario():
+        limited, free = ("channel", 1), ("channel", 2)
+        http = FakeDiscord(limited={limited: 1}, retry_after=0.1)
+        scheduler = RestScheduler(concurrency=2)
+        started = time.monotonic()
+        results = await asyncio.gather(
+            scheduler.call(limited, http.request(limited, "pin")),
+            scheduler.call(free, http.request(free, "edit")),
+        )
+        return results, http.calls, started, scheduler.get_metrics()
+
+    results, calls, started, metrics = asyncio.run(scenario())
+    assert results == ["pin", "edit"]
+    pins = [start for _, name, start, _ in calls if name == "pin"]
+    edit = next(end for _, name, _, end in calls if name == "edit")
+    assert len(pins) == 2 and pins[1] - pins[0] >= 0.1
+    # The other route didn't wait out the rate limit
+    assert edit - started < 0.1
+    assert metrics["rate_limited"] == 1 and "failed" not in metrics
+
+
+def test_a_call_still_limited_after_its_retries_fails():
+    async def scenario():
+        route = ("channel", 1)
+        http = FakeDiscord(limited={route: MAX_RATE_LIMIT_RETRIES + 1}, retry_after=0.01)
+        scheduler = RestScheduler(concurrency=1)
+        with pytest.raises(discord.HTTPException) as raised:
+            await scheduler.call(route, http.request(route, "pin"))
+        return raised.value, len(http.calls), scheduler.get_metrics()
+
+    error, attempts, metrics = asyncio.run(scenario())
+    assert error.status == 429
+    assert attempts == MAX_RATE_LIMIT_RETRIES + 1
+    assert (metrics["rate_limited"], metrics["failed"]) == (MAX_RATE_LIMIT_RETRIES, 1)
+
+
+def test_queued_refreshes_of_one_message_coalesce():
+    async def scenario():
+        http = FakeDiscord()
+        scheduler = RestScheduler(concurrency=1)
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        busy = scheduler.submit(("channel", 0), blocker)
+        await asyncio.sleep(0)
+        route = ("channel", 1)
+        futures = [
+            scheduler.submit(route, http.request(route, f"edit {n}"), PRIORITY_LOW, coalesce_key=("wager", 7))
+            for n in range(3)
+        ]
+        gate.set()
+        await asyncio.gather(busy, *futures)
+        return futures, http.names(), scheduler.get_metrics()
+
+    futures, names, metrics = asyncio.run(scenario())
+    assert futures[0] is futures[1] is futures[2]
+    assert names == ["edit 0"]
+    assert metrics["coalesced"] == 2
@@ -0,0 +1,37 @@
+"""Cold start: how long loading the bot takes, and what it leaves for later."""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Seconds a cold start may take to import the bot and load every cog. About
+# 1.1s on a laptop; the slack absorbs slow CI machines, not new eager imports.
+STARTUP_BUDGET = 3.0
+
+# Loaded once the bot is ready, never on the way to answering the first command
+DEFERRED_MODULES = ("apscheduler", "src.database.archive")
+
+
+def _python(*args):
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+
+
+def test_cold_start_fits_the_budget():
+    result = _python("-m", "src.bot", "--profile-startup", "--max-seconds", str(STARTUP_BUDGET))
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_cold_start_defers_the_maintenance_modules():
+    result = _python("-c", (
+        "import asyncio, sys\n"
+        "from src.bot import profile_startup\n"
+        "asyncio.run(profile_startup())\n"
+        "print(' '.join(sys.modules))\n"
+    ))
+    assert result.returncode == 0, result.stderr
+    loaded = result.stdout.strip().splitlines()[-1].split()
+    for module in DEFERRED_MODULES:
+        assert not [name for name in loaded if name == module or name.startswith(module + ".")]
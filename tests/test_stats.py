@@ -0,0 +1,79 @@
+"""Folding transactions into the statistics rollups."""
+import pytest
+
+from src import config
+from src.database.database import get_session
+from src.database.economy import claim_daily, create_wager, place_wager_bet, request_resolution
+from src.database.jobs import claim_job, run_resolve_job
+from src.database.models import Transaction, TRANSACTION_TYPE_DAILY_REWARD
+from src.database.stats import get_user_recent_stats, get_user_stats, run_stats_aggregator
+
+pytestmark = pytest.mark.database
+
+GUILD = 1
+
+
+async def _settled_wager(bets, winning_option: int):
+    """Place (user_id, option_index, amount) bets on a new wager and resolve it."""
+    async with get_session() as session:
+        wager = await create_wager(session, GUILD, 100, "Stats", None, ["Yes", "No"])
+    for user_id, option_index, amount in bets:
+        async with get_session() as session:
+            await place_wager_bet(session, GUILD, wager.wager_id, user_id, option_index, amount)
+    async with get_session() as session:
+        await request_resolution(session, GUILD, wager.wager_id, winning_option)
+    async with get_session() as session:
+        job = await claim_job(session)
+    await run_resolve_job(job)
+
+
+def test_topping_up_a_position_does_not_lower_the_win_rate(db):
+    async def scenario():
+        await _settled_wager([(1, 0, 100), (1, 0, 50), (1, 0, 25), (2, 1, 30)], winning_option=0)
+        await _settled_wager([(1, 1, 10), (2, 1, 10)], winning_option=0)
+        await run_stats_aggregator()
+        async with get_session() as session:
+            return (
+                await get_user_stats(session, GUILD, 1),
+                await get_user_stats(session, GUILD, 2),
+                await get_user_recent_stats(session, GUILD, 1, 7),
+            )
+
+    topped_up, single, recent = db(scenario())
+    assert (topped_up.bets_placed, topped_up.positions, topped_up.wins) == (4, 2, 1)
+    assert topped_up.win_rate == recent.win_rate == 0.5
+    assert (single.bets_placed, single.positions, single.wins, single.win_rate) == (2, 2, 0, 0.0)
+
+
+def test_a_transaction_committing_after_a_higher_id_is_still_folded(db, monkeypatch):
+    monkeypatch.setattr(config, "STATS_SETTLE_TIMEOUT_SECONDS", 0.2)
+
+    async def reward(session, user_id: int, amount: int):
+        session.add(Transaction(
+            guild_id=GUILD, user_id=user_id, amount=amount, transaction_type=TRANSACTION_TYPE_DAILY_REWARD
+        ))
+        await session.flush()
+
+    async def scenario():
+        for user_id in (1, 2):
+            async with get_session() as session:
+                await claim_daily(session, GUILD, user_id)
+                await session.commit()
+
+        async with get_session() as slow:
+            # Draws the lower ID, then stays open while a later transaction commits
+            await reward(slow, 1, 5)
+            async with get_session() as session:
+                await reward(session, 2, 7)
+                await session.commit()
+            while_open = await run_stats_aggregator()
+            await slow.commit()
+
+        after_commit = await run_stats_aggregator()
+        async with get_session() as session:
+            return while_open, after_commit, await get_user_stats(session, GUILD, 1)
+
+    while_open, after_commit, stats = db(scenario())
+    assert while_open == 0
+    assert after_commit == 4
+    assert stats.daily_rewards == config.DAILY_REWARD_AMOUNT + 5
@@ -0,0 +1,183 @@
+"""Creating, posting and discarding wagers."""
+from types import SimpleNamespace
+
+import discord
+import pytest
+from sqlalchemy import func, select, update
+
+from src import config
+from src.database.database import get_session
+from src.database.economy import attach_wager_message, create_wager, discard_wager
+from src.database.models import User, Wager, WagerOption, WAGER_STATUS_OPEN
+from src.database.repository import get_wager, get_wager_options
+from src.cogs import wagers
+from src.utils.rest import RestScheduler
+
+pytestmark = pytest.mark.database
+
+GUILD = 1
+
+
+def test_create_wager_writes_the_creator_wager_and_options_at_once(db):
+    async def scenario():
+        async with get_session() as session:
+            wager = await create_wager(session, GUILD, 7, "Who wins?", None, ["Red", "Blue", "Green"])
+        async with get_session() as session:
+            stored = await get_wager(session, wager.wager_id, GUILD)
+            options = await get_wager_options(session, wager.wager_id)
+            creator = await session.get(User, (GUILD, 7))
+            return wager, stored, options, creator
+
+    wager, stored, options, creator = db(scenario())
+    assert stored.status == WAGER_STATUS_OPEN and stored.options == ["Red", "Blue", "Green"]
+    assert stored.created_at == wager.created_at
+    assert [(option.idx, option.label, option.total, option.count) for option in options] == [
+        (0, "Red", 0, 0), (1, "Blue", 0, 0), (2, "Green", 0, 0)
+    ]
+    assert creator.bits_balance == config.STARTING_BALANCE
+
+
+def test_create_wager_leaves_an_existing_creator_alone(db):
+    async def scenario():
+        async with get_session() as session:
+            await create_wager(session, GUILD, 7, "First", None, ["A", "B"])
+            await session.execute(update(User).where(User.user_id == 7).values(bits_balance=42))
+            await session.commit()
+            await create_wager(session, GUILD, 7, "Second", "More", ["A", "B"])
+        async with get_session() as session:
+            return (await session.get(User, (GUILD, 7))).bits_balance
+
+    assert db(scenario()) == 42
+
+
+def test_posted_wager_records_its_message_and_discarded_wager_leaves_nothing(db):
+    async def scenario():
+        async with get_session() as session:
+            posted = await create_wager(session, GUILD, 7, "Posted", None, ["A", "B"])
+            await attach_wager_message(session, posted, channel_id=11, message_id=12)
+            dropped = await create_wager(session, GUILD, 7, "Dropped", None, ["A", "B"])
+            await discard_wager(session, dropped)
+        async with get_session() as session:
+            stored = await get_wager(session, posted.wager_id, GUILD)
+            wagers = (await session.execute(select(func.count()).select_from(Wager))).scalar_one()
+            options = (await session.execute(select(func.count()).select_from(WagerOption))).scalar_one()
+            return stored, wagers, options
+
+    stored, wagers, options = db(scenario())
+    assert (stored.channel_id, stored.message_id) == (11, 12)
+    assert (wagers, options) == (1, 2)
+
+
+class FakeMessage:
+    """A posted wager message that records whether it was pinned or deleted."""
+
+    def __init__(self, channel_id: int, message_id: int, pin_fails: bool = False):
+        self.channel = discord.Object(channel_id)
+        self.id = message_id
+        self.pin_fails = pin_fails
+        self.pinned = False
+        self.deleted = False
+
+    async def pin(self):
+        if self.pin_fails:
+            raise discord.HTTPException(SimpleNamespace(status=403, reason="Forbidden"), "Missing Permissions")
+        self.pinned = True
+
+    async def delete(self):
+        self.deleted = True
+
+
+class FakeChannel:
+    """The wager channel, with the bot allowed to post and pin."""
+
+    def __init__(self, channel_id: int, pin_fails: bool = False):
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+        self.pin_fails = pin_fails
+        self.posted = []
+
+    def permissions_for(self, member):
+        return discord.Permissions(send_messages=True, manage_messages=True)
+
+    async def send(self, embed=None, view=None):
+        message = FakeMessage(self.id, 900 + len(self.posted), self.pin_fails)
+        self.posted.append(message)
+        return message
+
+
+class FakeInteraction:
+    """A /createwager modal submission that records the replies it was sent."""
+
+    def __init__(self):
+        self.id = 1
+        self.guild = SimpleNamespace(id=GUILD, me=None)
+        self.guild_id = GUILD
+        self.user = SimpleNamespace(id=7)
+        self.replies = []
+        self.response = SimpleNamespace(is_done=lambda: bool(self.replies), send_message=self._reply)
+        self.followup = SimpleNamespace(send=self._reply)
+
+    async def _reply(self, content=None, **kwargs):
+        self.replies.append(content)
+
+
+def _submit_wager(monkeypatch, channel: FakeChannel):
+    """Submit the create-wager modal against ``channel``; returns the replies and the wager count."""
+    monkeypatch.setattr(wagers, "rest_scheduler", RestScheduler(concurrency=2))
+
+    async def wager_channel(bot, guild, session):
+        return channel
+
+    monkeypatch.setattr(wagers, "get_or_create_wager_channel", wager_channel)
+
+    async def scenario():
+        interaction = FakeInteraction()
+        modal = wagers.CreateWagerModal(SimpleNamespace(add_view=lambda view, message_id=None: None))
+        modal.title_input._value = "Who wins?"
+        modal.options_input._value = "Red, Blue"
+        await modal.on_submit(interaction)
+        async with get_session() as session:
+            count = (await session.execute(select(func.count()).select_from(Wager))).scalar_one()
+        return interaction.replies, count
+
+    return scenario()
+
+
+def test_withdrawn_wager_takes_its_message_down(db, monkeypatch):
+    monkeypatch.setattr(wagers, "rest_scheduler", RestScheduler(concurrency=1))
+
+    async def scenario():
+        message = FakeMessage(channel_id=11, message_id=12)
+        view = discord.ui.View(timeout=None)
+        async with get_session() as session:
+            wager = await create_wager(session, GUILD, 7, "Unrecorded", None, ["A", "B"])
+            await wagers._withdraw_wager(session, wager, message, view)
+        async with get_session() as session:
+            stored = await get_wager(session, wager.wager_id, GUILD)
+        return message, view, stored
+
+    message, view, stored = db(scenario())
+    assert message.deleted and view.is_finished()
+    assert stored is None
+
+
+def test_a_wager_whose_message_cant_be_recorded_gets_only_the_error_reply(db, monkeypatch):
+    async def fail_to_record(session, wager, channel_id, message_id):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(wagers, "_finalize_wager", fail_to_record)
+    channel = FakeChannel(11)
+
+    replies, count = db(_submit_wager(monkeypatch, channel))
+    assert replies == ["❌ Error creating wager: connection lost"]
+    assert channel.posted[0].deleted and count == 0
+
+
+def test_the_reply_says_when_the_pin_failed(db, monkeypatch):
+    pinned = FakeChannel(11)
+    assert db(_submit_wager(monkeypatch, pinned)) == (["✅ Wager created and pinned in <#11>!"], 1)
+
+    unpinned = FakeChannel(12, pin_fails=True)
+    replies, count = db(_submit_wager(monkeypatch, unpinned))
+    assert replies == ["✅ Wager created in <#12> (couldn't pin it)."]
+    assert count == 2 and not unpinned.posted[0].deleted
@@ -1,36 +1,23 @@
-"""Wait for database to be ready."""
+"""Wait for the database to be ready, retrying with exponential backoff and jitter."""
 import asyncio
 import sys
-from sqlalchemy import text
-from database.database import engine
+from src.database.database import engine
+from src.database.warmup import wait_for_database
 
 
-async def check_db():
-    """Check if database is ready."""
+async def main() -> bool:
+    """Wait for the database, returning whether it became reachable."""
     try:
-        async with engine.connect() as conn:
-            result = await conn.execute(text("SELECT 1"))
-            result.fetchone()
+        await wait_for_database()
+        print("Database is ready!")
         return True
     except Exception as e:
-        print(f"Database check failed: {e}")
+        print(f"Database connection timeout: {e}")
         return False
-
-
-async def wait_for_db():
-    """Wait for database to be ready."""
-    max_attempts = 30
-    for attempt in range(max_attempts):
-        if await check_db():
-            print("Database is ready!")
-            return True
-        print(f"Waiting for database... ({attempt + 1}/{max_attempts})")
-        await asyncio.sleep(1)
-    print("Database connection timeout!")
-    return False
+    finally:
+        await engine.dispose()
 
 
 if __name__ == "__main__":
-    success = asyncio.run(wait_for_db())
+    success = asyncio.run(main())
     sys.exit(0 if success else 1)
-